@@ -7,24 +7,34 @@ load_dotenv()
 _pool: aiomysql.Pool | None = None
 
 
+def _parametros() -> dict:
+    return dict(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=int(os.getenv("DB_PORT", 3306)),
+        user=os.getenv("DB_USER", "root"),
+        password=os.getenv("DB_PASSWORD", ""),
+        db=os.getenv("DB_NAME", "inventory_system"),
+        autocommit=True,
+        charset="utf8mb4",
+        cursorclass=aiomysql.DictCursor,
+    )
+
+
 async def get_pool() -> aiomysql.Pool:
     global _pool
     if _pool is None:
-        _pool = await aiomysql.create_pool(
-            host=os.getenv("DB_HOST", "localhost"),
-            port=int(os.getenv("DB_PORT", 3306)),
-            user=os.getenv("DB_USER", "root"),
-            password=os.getenv("DB_PASSWORD", ""),
-            db=os.getenv("DB_NAME", "inventory_system"),
-            minsize=1,
-            maxsize=10,
-            autocommit=True,
-            charset="utf8mb4",
-            cursorclass=aiomysql.DictCursor,
-        )
+        _pool = await aiomysql.create_pool(minsize=1, maxsize=10, **_parametros())
     return _pool
 
 
+async def conectar_dedicada() -> aiomysql.Connection:
+    """Conexión propia, fuera del pool (p. ej. cursores de servidor de larga duración).
+
+    Quien la abre la cierra; no cuenta contra ``maxsize`` del pool.
+    """
+    return await aiomysql.connect(**_parametros())
+
+
 async def close_pool():
     global _pool
     if _pool is not None:
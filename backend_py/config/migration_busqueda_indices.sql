@@ -0,0 +1,13 @@
+-- =========================================================
+-- MIGRACIÓN: Índices de clasificaciones usadas por los buscadores
+-- Con FULLTEXT, tipo de documento y tipo de equipo se buscan con LIKE en
+-- su propia subconsulta (ver utils/busqueda.py); el índice (tipo, id) la
+-- cubre y se recorre en vez de la tabla completa.
+-- Ejecutar en phpMyAdmin o consola MySQL
+-- =========================================================
+
+USE inventory_system;
+
+CREATE INDEX IF NOT EXISTS idx_documentos_tipo ON documentos(tipo);
+
+CREATE INDEX IF NOT EXISTS idx_equipos_tipo_equipo ON equipos(tipo_equipo);
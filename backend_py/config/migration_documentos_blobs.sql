@@ -0,0 +1,36 @@
+-- =========================================================
+-- MIGRACIÓN: Archivos de documentos fuera de MySQL
+-- Los bytes pasan a un almacén direccionado por contenido (SHA-256,
+-- ALMACEN_DOCUMENTOS_DIR); la BD guarda solo hash, tamaño y metadatos.
+-- documentos_blobs lleva el conteo de referencias de cada hash.
+-- Después de esta migración ejecutar scripts/migrar_blobs.py para mover
+-- los LONGBLOB existentes al almacén.
+-- Ejecutar en phpMyAdmin o consola MySQL
+-- =========================================================
+
+USE inventory_system;
+
+CREATE TABLE IF NOT EXISTS documentos_blobs (
+  sha256      CHAR(64)  NOT NULL PRIMARY KEY,
+  tamano      BIGINT    NOT NULL,
+  referencias INT       NOT NULL DEFAULT 0,
+  created_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS documentos_archivos (
+  documento_id VARCHAR(36)  NOT NULL PRIMARY KEY,
+  filename     VARCHAR(255) NOT NULL,
+  mime_type    VARCHAR(100) NOT NULL,
+  contenido    LONGBLOB     NULL,
+  created_at   TIMESTAMP    DEFAULT CURRENT_TIMESTAMP,
+  updated_at   TIMESTAMP    DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  CONSTRAINT fk_doc_archivo_documento FOREIGN KEY (documento_id) REFERENCES documentos(id)
+    ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+ALTER TABLE documentos_archivos
+  ADD COLUMN IF NOT EXISTS sha256 CHAR(64) NULL AFTER mime_type,
+  ADD COLUMN IF NOT EXISTS tamano BIGINT   NULL AFTER sha256,
+  MODIFY contenido LONGBLOB NULL;
+
+CREATE INDEX IF NOT EXISTS idx_documentos_archivos_sha ON documentos_archivos(sha256);
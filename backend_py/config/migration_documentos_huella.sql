@@ -0,0 +1,10 @@
+-- =========================================================
+-- MIGRACIÓN: Huella de renderizado de documentos generados
+-- Permite reutilizar el PDF de un acta cuando sus datos no cambiaron
+-- Ejecutar en phpMyAdmin o consola MySQL si la BD ya existe
+-- =========================================================
+
+USE inventory_system;
+
+ALTER TABLE documentos
+  ADD COLUMN IF NOT EXISTS huella_render CHAR(64) DEFAULT NULL AFTER version;
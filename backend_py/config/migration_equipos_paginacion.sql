@@ -0,0 +1,9 @@
+-- =========================================================
+-- MIGRACIÓN: Índice para paginación por keyset de equipos
+-- GET /api/equipos?limit=...&cursor=... ordena por (fecha_registro, id)
+-- Ejecutar en phpMyAdmin o consola MySQL si la BD ya existe
+-- =========================================================
+
+USE inventory_system;
+
+CREATE INDEX IF NOT EXISTS idx_equipos_fecha_registro_id ON equipos(fecha_registro, id);
@@ -0,0 +1,31 @@
+-- =========================================================
+-- MIGRACIÓN: Índices FULLTEXT (parser ngram) para los buscadores
+-- Reemplazan los LIKE '%texto%' de los listados (ver utils/busqueda.py).
+-- Requiere MySQL 5.7.6+ (parser ngram). En MariaDB estas sentencias
+-- fallan y los listados siguen usando LIKE automáticamente.
+-- Tamaño de token: ngram_token_size (por defecto 2) en my.cnf.
+-- Ejecutar en phpMyAdmin o consola MySQL
+-- =========================================================
+
+USE inventory_system;
+
+ALTER TABLE equipos
+  ADD FULLTEXT INDEX ft_equipos_busqueda (placa, marca, modelo, serial) WITH PARSER ngram;
+
+ALTER TABLE equipos
+  ADD FULLTEXT INDEX ft_equipos_placa (placa) WITH PARSER ngram;
+
+ALTER TABLE usuarios
+  ADD FULLTEXT INDEX ft_usuarios_busqueda (nombre, correo, area, proceso) WITH PARSER ngram;
+
+ALTER TABLE usuarios
+  ADD FULLTEXT INDEX ft_usuarios_nombre (nombre) WITH PARSER ngram;
+
+ALTER TABLE suministros
+  ADD FULLTEXT INDEX ft_suministros_busqueda (nombre, referencia, marca, modelo, proveedor) WITH PARSER ngram;
+
+ALTER TABLE accesorios
+  ADD FULLTEXT INDEX ft_accesorios_busqueda (nombre, placa, serial) WITH PARSER ngram;
+
+ALTER TABLE documentos
+  ADD FULLTEXT INDEX ft_documentos_nombre (nombre) WITH PARSER ngram;
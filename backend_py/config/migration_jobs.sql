@@ -0,0 +1,25 @@
+-- =========================================================
+-- MIGRACIÓN: Tabla jobs (trabajos en segundo plano)
+-- Regeneración de actas y otros procesos que no deben bloquear la respuesta
+-- Ejecutar en phpMyAdmin o consola MySQL
+-- =========================================================
+
+USE inventory_system;
+
+CREATE TABLE IF NOT EXISTS jobs (
+  id           VARCHAR(36)   NOT NULL PRIMARY KEY,
+  tipo         VARCHAR(50)   NOT NULL,
+  clave        VARCHAR(100)  NOT NULL,
+  payload      LONGTEXT      DEFAULT NULL,
+  estado       ENUM('pendiente','en_proceso','completado','error') NOT NULL DEFAULT 'pendiente',
+  resultado    LONGTEXT      DEFAULT NULL,
+  error        TEXT          DEFAULT NULL,
+  intentos     INT           NOT NULL DEFAULT 0,
+  created_at   TIMESTAMP     DEFAULT CURRENT_TIMESTAMP,
+  updated_at   TIMESTAMP     DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  started_at   TIMESTAMP     NULL,
+  finished_at  TIMESTAMP     NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE INDEX IF NOT EXISTS idx_jobs_tipo_clave_estado ON jobs(tipo, clave, estado);
+CREATE INDEX IF NOT EXISTS idx_jobs_estado            ON jobs(estado);
@@ -0,0 +1,18 @@
+-- =========================================================
+-- MIGRACIÓN: Errores de trabajos en segundo plano
+-- Las importaciones agregan aquí sus errores por fila (solo inserciones) en
+-- la misma transacción que el bloque; jobs.progreso guarda solo contadores
+-- Ejecutar en phpMyAdmin o consola MySQL
+-- =========================================================
+
+USE inventory_system;
+
+CREATE TABLE IF NOT EXISTS jobs_errores (
+  id        BIGINT        NOT NULL AUTO_INCREMENT PRIMARY KEY,
+  job_id    VARCHAR(36)   NOT NULL,
+  fila      INT           NOT NULL,
+  error     TEXT          NOT NULL,
+  campos    TEXT          DEFAULT NULL,
+  KEY idx_jobs_errores_job_fila (job_id, fila),
+  CONSTRAINT fk_jobs_errores_job FOREIGN KEY (job_id) REFERENCES jobs(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,16 @@
+-- =========================================================
+-- MIGRACIÓN: Lease de trabajos en segundo plano
+-- Cada trabajo en proceso registra qué proceso lo ejecuta (propietario) y
+-- hasta cuándo es válido su lease; el proceso lo renueva mientras trabaja.
+-- Al arrancar (y periódicamente) solo se recuperan los trabajos cuyo lease
+-- venció: los de otros procesos vivos no se reencolan ni se ejecutan dos veces.
+-- Ejecutar en phpMyAdmin o consola MySQL
+-- =========================================================
+
+USE inventory_system;
+
+ALTER TABLE jobs
+  ADD COLUMN IF NOT EXISTS propietario VARCHAR(100) NULL AFTER intentos,
+  ADD COLUMN IF NOT EXISTS lease_hasta TIMESTAMP NULL AFTER propietario;
+
+CREATE INDEX IF NOT EXISTS idx_jobs_estado_lease ON jobs(estado, lease_hasta);
@@ -0,0 +1,10 @@
+-- =========================================================
+-- MIGRACIÓN: Progreso de trabajos en segundo plano
+-- Las importaciones guardan aquí su avance (filas procesadas, insertadas,
+-- errores y último bloque confirmado) para consultarlo y reanudarlas
+-- Ejecutar en phpMyAdmin o consola MySQL
+-- =========================================================
+
+USE inventory_system;
+
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS progreso LONGTEXT DEFAULT NULL AFTER resultado;
@@ -0,0 +1,11 @@
+-- =========================================================
+-- MIGRACIÓN: Índice para el kárdex de suministros
+-- El saldo acumulado se calcula con SUM(...) OVER (ORDER BY fecha, id)
+-- por suministro; este índice cubre el filtro y el orden de la ventana
+-- Ejecutar en phpMyAdmin o consola MySQL
+-- =========================================================
+
+USE inventory_system;
+
+CREATE INDEX IF NOT EXISTS idx_movimientos_suministro_fecha_id
+    ON movimientos_suministros (suministro_id, fecha, id);
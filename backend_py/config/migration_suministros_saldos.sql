@@ -0,0 +1,33 @@
+-- =========================================================
+-- MIGRACIÓN: Snapshots de saldo del kárdex de suministros
+-- Un cierre por suministro y día con movimientos (entradas − salidas
+-- acumuladas hasta el final del día). El saldo histórico se responde con
+-- el último cierre + los movimientos posteriores, sin recorrer todo el
+-- historial. Se mantiene al registrar/editar/eliminar movimientos;
+-- scripts/verificar_saldos.py lo compara y reconstruye.
+-- El INSERT del final hace la carga inicial desde el historial existente
+-- (sin comentario propio: run_migrations.py salta bloques que empiezan con --).
+-- Ejecutar en phpMyAdmin o consola MySQL
+-- =========================================================
+
+USE inventory_system;
+
+CREATE TABLE IF NOT EXISTS suministros_saldos_snapshot (
+  suministro_id  VARCHAR(36) NOT NULL,
+  periodo        DATE        NOT NULL,
+  saldo          INT         NOT NULL,
+  actualizado_en TIMESTAMP   DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (suministro_id, periodo),
+  CONSTRAINT fk_saldo_suministro FOREIGN KEY (suministro_id) REFERENCES suministros(id)
+    ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+INSERT IGNORE INTO suministros_saldos_snapshot (suministro_id, periodo, saldo)
+SELECT suministro_id, periodo,
+       CAST(SUM(delta) OVER (PARTITION BY suministro_id ORDER BY periodo) AS SIGNED)
+FROM (
+  SELECT suministro_id, DATE(fecha) AS periodo,
+         SUM(CASE WHEN tipo_movimiento = 'entrada' THEN cantidad ELSE -cantidad END) AS delta
+  FROM movimientos_suministros
+  GROUP BY suministro_id, DATE(fecha)
+) d;
@@ -11,12 +11,19 @@ from config.db import test_connection, close_pool
 from routes import (
     usuarios, equipos, asignaciones, accesorios,
     documentos, dashboard, susuarios, suministros,
-    auth, licencias, importar, movimientos_suministros, solicitantes, mantenimientos,firmas
+    auth, licencias, importar, movimientos_suministros, solicitantes, mantenimientos,firmas,
+    jobs, search
 )
 from dependencies  import get_current_user
 from routes import audit
 
 from utils.email_service import send_email, render_template
+from utils.pdf_renderer import renderer as pdf_renderer
+from utils.jobs import job_queue
+from utils.audit import auditoria
+from utils.search_index import search_index
+from utils.serializer import FastJSONResponse
+from utils.limite_cuerpo import LimiteCuerpoMiddleware
 
 
 
@@ -36,11 +43,36 @@ os.makedirs(UPLOADS_DIR, exist_ok=True)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await test_connection()
+    await auditoria.start()
+    pdf_renderer.start()
+    await job_queue.start()
+    try:
+        await search_index.reconstruir()
+    except Exception as e:
+        logger.error("No se pudo construir el índice de búsqueda: %s", e)
     yield
+    await job_queue.stop()
+    pdf_renderer.shutdown()
+    # Después de los trabajos (que también auditan) y antes de cerrar el pool
+    await auditoria.stop()
     await close_pool()
 
 
-app = FastAPI(title="Inventory System API", version="1.0.0", lifespan=lifespan)
+app = FastAPI(
+    title="Inventory System API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
+
+# ─── Límite de subidas ────────────────────────────────────────────────────────
+# Corta el multipart de documentos antes de que se reciba completo; se registra
+# antes que CORS para que el 413 también lleve los encabezados CORS
+app.add_middleware(
+    LimiteCuerpoMiddleware,
+    limite=documentos.MAX_REQUEST_SIZE,
+    prefijos=("/api/documentos",),
+)
 
 # ─── CORS ─────────────────────────────────────────────────────────────────────
 app.add_middleware(
@@ -48,9 +80,9 @@ app.add_middleware(
     allow_origins=[os.getenv("FRONTEND_URL", "http://localhost:5173")],
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["Content-Type", "Authorization"],
+    allow_headers=["Content-Type", "Authorization", "Range", "If-None-Match", "If-Range"],
     
-    expose_headers=["Content-Disposition"],
+    expose_headers=["Content-Disposition", "X-Acta-Cache", "ETag", "Content-Range", "Accept-Ranges"],
 )
 
 
@@ -73,6 +105,8 @@ app.include_router(importar.router,     prefix="/api/importar",     tags=["Impor
 app.include_router(audit.router, prefix="/api/audit", tags=["Auditoría"], dependencies=protected)
 app.include_router(mantenimientos.router, prefix="/api", tags=["Mantenimientos"], dependencies=protected)
 app.include_router(firmas.router, prefix="/api", tags=["Firmas"], dependencies=protected)
+app.include_router(jobs.router,         prefix="/api/jobs",         tags=["Jobs"],            dependencies=protected)
+app.include_router(search.router,       prefix="/api/search",       tags=["Búsqueda"],        dependencies=protected)
 # Endpoints públicos: login/token + health
 app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
 
@@ -84,6 +118,11 @@ async def health():
     return {"status": "ok", "timestamp": datetime.now(timezone.utc).isoformat()}
 
 
+@app.get("/api/health/pdf", dependencies=protected)
+async def health_pdf():
+    return {"data": pdf_renderer.metrics()}
+
+
 # ─── Error handler global ─────────────────────────────────────────────────────
 
 @app.exception_handler(Exception)
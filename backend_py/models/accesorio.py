@@ -1,6 +1,28 @@
 import uuid
 from datetime import date
 from config.db import get_pool
+from utils.busqueda import IndiceBusqueda, condicion_busqueda
+from utils.search_index import search_index
+from utils.sql import insert_many
+
+BUSQUEDA_ACCESORIOS = IndiceBusqueda("accesorios", "ft_accesorios_busqueda", ("ac.nombre", "ac.placa", "ac.serial"))
+
+
+def _columnas_insert(data: dict, new_id: str, fecha_registro: str) -> tuple[list[str], list]:
+    columns = ["id", "nombre", "placa", "serial", "equipo_principal_id", "cantidad",
+               "estado", "observaciones", "fecha_registro"]
+    values = [
+        new_id,
+        data["nombre"],
+        data.get("placa"),
+        data.get("serial"),
+        data.get("equipo_principal_id"),
+        data.get("cantidad", 1),
+        data.get("estado", "Disponible"),
+        data.get("observaciones"),
+        fecha_registro,
+    ]
+    return columns, values
 
 
 class AccesorioModel:
@@ -13,12 +35,8 @@ class AccesorioModel:
             LEFT JOIN equipos e ON ac.equipo_principal_id = e.id
             WHERE 1=1
         """
-        params = []
-
-        if busqueda:
-            sql += " AND (ac.nombre LIKE %s OR ac.placa LIKE %s OR ac.serial LIKE %s)"
-            q = f"%{busqueda}%"
-            params.extend([q, q, q])
+        where, params = await condicion_busqueda(busqueda, BUSQUEDA_ACCESORIOS)
+        sql += where
         if estado:
             sql += " AND ac.estado = %s"
             params.append(estado)
@@ -48,25 +66,29 @@ class AccesorioModel:
         new_id = str(uuid.uuid4())
         fecha_registro = date.today().isoformat()
         pool = await get_pool()
+        columns, values = _columnas_insert(data, new_id, fecha_registro)
+        placeholders = ", ".join(["%s"] * len(values))
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
                 await cur.execute(
-                    """INSERT INTO accesorios
-                       (id, nombre, placa, serial, equipo_principal_id, cantidad, estado, observaciones, fecha_registro)
-                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                    [
-                        new_id,
-                        data["nombre"],
-                        data.get("placa"),
-                        data.get("serial"),
-                        data.get("equipo_principal_id"),
-                        data.get("cantidad", 1),
-                        data.get("estado", "Disponible"),
-                        data.get("observaciones"),
-                        fecha_registro,
-                    ],
+                    f"INSERT INTO accesorios ({', '.join(columns)}) VALUES ({placeholders})", values
                 )
-        return await AccesorioModel.find_by_id(new_id)
+        row = await AccesorioModel.find_by_id(new_id)
+        search_index.actualizar("accesorios", row)
+        return row
+
+    @staticmethod
+    async def insert_many(cur, datos: list[dict]) -> list[str]:
+        """INSERT por lotes dentro de la transacción de ``cur``; devuelve los ids.
+
+        A diferencia de create no relee las filas ni hace commit (carga masiva).
+        """
+        fecha_registro = date.today().isoformat()
+        ids = [str(uuid.uuid4()) for _ in datos]
+        await insert_many(cur, "accesorios", [
+            _columnas_insert(data, new_id, fecha_registro) for data, new_id in zip(datos, ids)
+        ])
+        return ids
 
     @staticmethod
     async def update(id: str, data: dict) -> dict | None:
@@ -87,7 +109,9 @@ class AccesorioModel:
                 await cur.execute(
                     f"UPDATE accesorios SET {', '.join(fields)} WHERE id = %s", values
                 )
-        return await AccesorioModel.find_by_id(id)
+        row = await AccesorioModel.find_by_id(id)
+        search_index.actualizar("accesorios", row)
+        return row
 
     @staticmethod
     async def delete(id: str):
@@ -95,3 +119,4 @@ class AccesorioModel:
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
                 await cur.execute("DELETE FROM accesorios WHERE id = %s", [id])
+        search_index.eliminar("accesorios", id)
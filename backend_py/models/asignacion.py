@@ -6,6 +6,14 @@ from typing import Optional, List
 from config.db import get_pool
 from models.asignacion_usuario import AsignacionUsuarioModel
 from models.usuario import UsuarioModel
+from utils.busqueda import IndiceBusqueda, condicion_busqueda
+from utils.streaming import iter_lotes
+
+# La búsqueda cruza dos tablas: un índice FULLTEXT por cada una
+BUSQUEDA_ASIGNACIONES = (
+    IndiceBusqueda("usuarios", "ft_usuarios_nombre", ("u.nombre",), enlace="usuario_id"),
+    IndiceBusqueda("equipos", "ft_equipos_placa", ("e.placa",), columnas_like=("e.tipo_equipo",), enlace="equipo_id"),
+)
 
 
 def _parse_accesorios_entregados(row: dict) -> list:
@@ -68,43 +76,60 @@ def _map_asignacion(row: dict) -> dict:
     return row
 
 
+async def _consulta_asignaciones(busqueda: str = "", estado: str = "") -> tuple[str, list]:
+    sql = """
+        SELECT a.*,
+               u.nombre AS usuario_nombre, u.cargo, u.area,
+               e.placa, e.serial, e.marca, e.modelo, e.tipo_equipo, e.estado AS equipo_estado
+        FROM asignaciones a
+        JOIN usuarios u ON a.usuario_id = u.id
+        JOIN equipos  e ON a.equipo_id = e.id
+        WHERE 1=1
+    """
+    where, params = await condicion_busqueda(
+        busqueda, *BUSQUEDA_ASIGNACIONES, base=("asignaciones", "a.id")
+    )
+    sql += where
+    if estado:
+        sql += " AND a.estado = %s"
+        params.append(estado)
+    sql += " ORDER BY a.fecha_asignacion DESC"
+    return sql, params
+
+
+async def _completar_asignaciones(rows: list[dict]) -> List[dict]:
+    ids = [row["id"] for row in rows]
+    usuarios_por_asignacion = await AsignacionUsuarioModel.get_by_asignaciones(ids)
+    result = []
+    for row in rows:
+        item = _map_asignacion(row)
+        item["usuarios_ids"] = usuarios_por_asignacion.get(item["id"], [])
+        result.append(item)
+    return result
+
+
 class AsignacionModel:
     @staticmethod
     async def find_all(busqueda: str = "", estado: str = "") -> List[dict]:
         pool = await get_pool()
-        sql = """
-            SELECT a.*,
-                   u.nombre AS usuario_nombre, u.cargo, u.area,
-                   e.placa, e.serial, e.marca, e.modelo, e.tipo_equipo, e.estado AS equipo_estado
-            FROM asignaciones a
-            JOIN usuarios u ON a.usuario_id = u.id
-            JOIN equipos  e ON a.equipo_id = e.id
-            WHERE 1=1
-        """
-        params = []
-        if busqueda:
-            sql += " AND (u.nombre LIKE %s OR e.placa LIKE %s OR e.tipo_equipo LIKE %s)"
-            q = f"%{busqueda}%"
-            params.extend([q, q, q])
-        if estado:
-            sql += " AND a.estado = %s"
-            params.append(estado)
-        sql += " ORDER BY a.fecha_asignacion DESC"
-
+        sql, params = await _consulta_asignaciones(busqueda, estado)
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
                 await cur.execute(sql, params)
                 rows = await cur.fetchall()
                 if not rows:
                     return []
-                ids = [row["id"] for row in rows]
-                usuarios_por_asignacion = await AsignacionUsuarioModel.get_by_asignaciones(ids)
-                result = []
-                for row in rows:
-                    item = _map_asignacion(row)
-                    item["usuarios_ids"] = usuarios_por_asignacion.get(item["id"], [])
-                    result.append(item)
-                return result
+                return await _completar_asignaciones(rows)
+
+    @staticmethod
+    async def stream_all(busqueda: str = "", estado: str = ""):
+        """Igual que find_all, pero por lotes con cursor de servidor.
+
+        Los usuarios adicionales se cargan con una consulta IN por lote.
+        """
+        sql, params = await _consulta_asignaciones(busqueda, estado)
+        async for rows in iter_lotes(sql, params):
+            yield await _completar_asignaciones(rows)
 
     @staticmethod
     async def find_by_id(id: str) -> Optional[dict]:
@@ -288,17 +313,20 @@ class AsignacionModel:
     @staticmethod
     async def enrich_with_extra_users(asignacion: dict) -> dict:
         """Agrega a la asignación la lista 'usuarios_adicionales' con los nombres de los usuarios secundarios."""
-        usuario_principal = await UsuarioModel.find_by_id(asignacion["usuario_id"])
+        usuarios_ids = asignacion.get("usuarios_ids", [])
+        # Principal + secundarios en una sola consulta
+        usuarios = await UsuarioModel.find_by_ids([asignacion["usuario_id"], *usuarios_ids])
+
+        usuario_principal = usuarios.get(asignacion["usuario_id"])
         if not usuario_principal:
             asignacion["usuario_principal_nombre"] = asignacion.get("usuario_nombre", "")
         else:
             asignacion["usuario_principal_nombre"] = usuario_principal.get("nombre", "")
 
-        usuarios_ids = asignacion.get("usuarios_ids", [])
         usuarios_extra = []
         for uid in usuarios_ids:
-            u = await UsuarioModel.find_by_id(uid)
+            u = usuarios.get(uid)
             if u:
                 usuarios_extra.append({"nombre": u.get("nombre", "")})
         asignacion["usuarios_adicionales"] = usuarios_extra
-        return asignacion
\ No newline at end of file
+        return asignacion
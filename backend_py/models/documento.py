@@ -1,9 +1,80 @@
 import uuid
 from datetime import date
+from pathlib import Path
 
 import aiomysql
 
 from config.db import get_pool
+from utils.almacen_documentos import BlobPreparado, almacen
+from utils.busqueda import IndiceBusqueda, condicion_busqueda
+from utils.streaming import iter_lotes
+from utils.search_index import search_index
+
+BUSQUEDA_DOCUMENTOS = IndiceBusqueda(
+    "documentos", "ft_documentos_nombre", ("d.nombre",), columnas_like=("d.tipo",)
+)
+
+
+async def _consulta_documentos(
+    busqueda: str = "",
+    tipo: str = "",
+    equipo_id: str = "",
+    asignacion_id: str = "",
+    usuario_id: str = "",
+    sede: str = "",
+    fecha_desde: str = "",
+    fecha_hasta: str = "",
+) -> tuple[str, list]:
+    sql = """
+        SELECT d.*,
+               e.placa AS equipo_placa,
+               u.nombre AS usuario_nombre
+        FROM documentos d
+        LEFT JOIN equipos  e ON d.equipo_id  = e.id
+        LEFT JOIN usuarios u ON d.usuario_id = u.id
+        WHERE 1=1
+    """
+    where, params = await condicion_busqueda(busqueda, BUSQUEDA_DOCUMENTOS, base=("documentos", "d.id"))
+    sql += where
+
+    if tipo:
+        sql += " AND d.tipo = %s"
+        params.append(tipo)
+    if equipo_id:
+        sql += " AND d.equipo_id = %s"
+        params.append(equipo_id)
+    if asignacion_id:
+        sql += " AND d.asignacion_id = %s"
+        params.append(asignacion_id)
+    if usuario_id:
+        sql += " AND d.usuario_id = %s"
+        params.append(usuario_id)
+    if sede:
+        sql += " AND d.sede = %s"
+        params.append(sede)
+    if fecha_desde:
+        sql += " AND d.fecha_carga >= %s"
+        params.append(fecha_desde)
+    if fecha_hasta:
+        sql += " AND d.fecha_carga <= %s"
+        params.append(fecha_hasta)
+
+    sql += " ORDER BY d.fecha_carga DESC"
+    return sql, params
+
+
+def _meta_archivo(row: dict | None) -> dict | None:
+    if not row or row.get("tamano") is None:
+        return None
+    sha = row.get("sha256")
+    return {
+        "filename": row.get("filename") or "documento",
+        "mime_type": row.get("mime_type") or "application/octet-stream",
+        "sha256": sha,
+        "tamano": int(row["tamano"]),
+        "version": row.get("version"),
+        "ruta": almacen.ruta(sha) if sha else None,
+    }
 
 
 class DocumentoModel:
@@ -11,20 +82,36 @@ class DocumentoModel:
 
     @staticmethod
     async def _ensure_archivos_table():
-        """Crea la tabla de blobs si no existe (idempotente)."""
+        """Crea las tablas de archivos si no existen (idempotente).
+
+        ``documentos_archivos`` solo guarda metadatos y el hash; los bytes van
+        al almacén (``utils.almacen_documentos``). ``contenido`` queda para
+        filas anteriores aún no migradas (scripts/migrar_blobs.py).
+        """
         if DocumentoModel._archivos_table_ready:
             return
         pool = await get_pool()
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
+                await cur.execute(
+                    """CREATE TABLE IF NOT EXISTS documentos_blobs (
+                        sha256      CHAR(64)  NOT NULL PRIMARY KEY,
+                        tamano      BIGINT    NOT NULL,
+                        referencias INT       NOT NULL DEFAULT 0,
+                        created_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"""
+                )
                 await cur.execute(
                     """CREATE TABLE IF NOT EXISTS documentos_archivos (
                         documento_id VARCHAR(36)  NOT NULL PRIMARY KEY,
                         filename     VARCHAR(255) NOT NULL,
                         mime_type    VARCHAR(100) NOT NULL,
-                        contenido    LONGBLOB     NOT NULL,
+                        sha256       CHAR(64)     NULL,
+                        tamano       BIGINT       NULL,
+                        contenido    LONGBLOB     NULL,
                         created_at   TIMESTAMP    DEFAULT CURRENT_TIMESTAMP,
                         updated_at   TIMESTAMP    DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                        INDEX idx_documentos_archivos_sha (sha256),
                         CONSTRAINT fk_doc_archivo_documento
                             FOREIGN KEY (documento_id) REFERENCES documentos(id)
                             ON DELETE CASCADE
@@ -33,46 +120,290 @@ class DocumentoModel:
         DocumentoModel._archivos_table_ready = True
 
     @staticmethod
-    async def upsert_archivo(documento_id: str, *, filename: str, mime_type: str, contenido: bytes) -> None:
-        """Guarda/actualiza el archivo binario asociado a un documento."""
+    async def _referenciar(cur, preparado: BlobPreparado) -> None:
+        """+1 referencia al hash y deja el archivo en el almacén (dentro de la transacción)."""
+        await cur.execute(
+            """INSERT INTO documentos_blobs (sha256, tamano, referencias) VALUES (%s, %s, 1)
+               ON DUPLICATE KEY UPDATE referencias = referencias + 1""",
+            [preparado.sha256, preparado.tamano],
+        )
+        # Con la fila del hash bloqueada, un _liberar concurrente no puede borrar el archivo
+        await almacen.confirmar(preparado)
+
+    @staticmethod
+    async def _liberar(cur, sha256: str | None, huerfanos: list[str]) -> None:
+        """-1 referencia; si llega a 0 borra la fila (dentro de la transacción).
+
+        El archivo no se toca aquí: el hash se agrega a ``huerfanos`` y se borra
+        con ``_eliminar_huerfanos`` después del commit, así un rollback no deja
+        una fila apuntando a un archivo que ya no existe.
+        """
+        if not sha256:
+            return
+        await cur.execute(
+            "UPDATE documentos_blobs SET referencias = referencias - 1 WHERE sha256 = %s", [sha256]
+        )
+        await cur.execute(
+            "DELETE FROM documentos_blobs WHERE sha256 = %s AND referencias <= 0", [sha256]
+        )
+        if cur.rowcount:
+            huerfanos.append(sha256)
+
+    @staticmethod
+    async def _eliminar_huerfanos(conn, cur, huerfanos: list[str]) -> None:
+        """Borra del almacén los archivos liberados, ya confirmada la transacción."""
+        for sha256 in huerfanos:
+            await conn.begin()
+            try:
+                # Bloquea el hash (o su hueco): un _referenciar concurrente espera
+                # al borrado y vuelve a dejar el archivo con su confirmar
+                await cur.execute(
+                    "SELECT sha256 FROM documentos_blobs WHERE sha256 = %s FOR UPDATE", [sha256]
+                )
+                if not await cur.fetchone():
+                    await almacen.eliminar(sha256)
+                await conn.commit()
+            except Exception:
+                # El cambio ya está confirmado; el archivo queda huérfano y lo
+                # recoge scripts/migrar_blobs.py
+                await conn.rollback()
+
+    @staticmethod
+    async def guardar_archivo(
+        documento_id: str, preparado: BlobPreparado, *, filename: str, mime_type: str
+    ) -> None:
+        """Asocia a un documento un archivo ya preparado en el almacén.
+
+        Si el documento ya tenía ese mismo contenido (p. ej. una nueva versión
+        de acta idéntica) solo se actualizan nombre y tipo. El hash anterior
+        pierde una referencia.
+        """
         await DocumentoModel._ensure_archivos_table()
         pool = await get_pool()
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
-                # REPLACE: elimina e inserta, sirve como upsert simple.
-                await cur.execute(
-                    """REPLACE INTO documentos_archivos (documento_id, filename, mime_type, contenido)
-                       VALUES (%s, %s, %s, %s)""",
-                    [documento_id, filename, mime_type, contenido],
-                )
+                huerfanos: list[str] = []
+                await conn.begin()
+                try:
+                    await cur.execute(
+                        "SELECT sha256 FROM documentos_archivos WHERE documento_id = %s FOR UPDATE",
+                        [documento_id],
+                    )
+                    row = await cur.fetchone()
+                    anterior = row["sha256"] if row else None
+                    if anterior != preparado.sha256:
+                        await DocumentoModel._referenciar(cur, preparado)
+                    await cur.execute(
+                        """INSERT INTO documentos_archivos
+                               (documento_id, filename, mime_type, sha256, tamano, contenido)
+                           VALUES (%s, %s, %s, %s, %s, NULL)
+                           ON DUPLICATE KEY UPDATE filename = VALUES(filename),
+                               mime_type = VALUES(mime_type), sha256 = VALUES(sha256),
+                               tamano = VALUES(tamano), contenido = NULL""",
+                        [documento_id, filename, mime_type, preparado.sha256, preparado.tamano],
+                    )
+                    if anterior != preparado.sha256:
+                        await DocumentoModel._liberar(cur, anterior, huerfanos)
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+                finally:
+                    # Si el hash ya estaba referenciado o hubo error, el temporal sobra
+                    await almacen.descartar(preparado)
+                await DocumentoModel._eliminar_huerfanos(conn, cur, huerfanos)
+
+    @staticmethod
+    async def upsert_archivo(documento_id: str, *, filename: str, mime_type: str, contenido: bytes | Path) -> None:
+        """Guarda/actualiza el archivo asociado a un documento (bytes o ruta a copiar)."""
+        preparado = await almacen.preparar(contenido)
+        await DocumentoModel.guardar_archivo(
+            documento_id, preparado, filename=filename, mime_type=mime_type
+        )
+
+    @staticmethod
+    async def copiar_archivo(origen_id: str, destino_id: str) -> None:
+        """Asocia al destino el mismo archivo del origen (una referencia más, sin copiar bytes)."""
+        await DocumentoModel._ensure_archivos_table()
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                huerfanos: list[str] = []
+                await conn.begin()
+                try:
+                    await cur.execute(
+                        "SELECT sha256 FROM documentos_archivos WHERE documento_id = %s",
+                        [origen_id],
+                    )
+                    origen = await cur.fetchone()
+                    if not origen:
+                        await conn.rollback()
+                        return
+                    await cur.execute(
+                        "SELECT sha256 FROM documentos_archivos WHERE documento_id = %s FOR UPDATE",
+                        [destino_id],
+                    )
+                    row = await cur.fetchone()
+                    anterior = row["sha256"] if row else None
+                    if origen["sha256"] and anterior != origen["sha256"]:
+                        await cur.execute(
+                            "UPDATE documentos_blobs SET referencias = referencias + 1 WHERE sha256 = %s",
+                            [origen["sha256"]],
+                        )
+                    await cur.execute(
+                        """REPLACE INTO documentos_archivos
+                               (documento_id, filename, mime_type, sha256, tamano, contenido)
+                           SELECT %s, filename, mime_type, sha256, tamano, contenido
+                           FROM documentos_archivos
+                           WHERE documento_id = %s""",
+                        [destino_id, origen_id],
+                    )
+                    if anterior != origen["sha256"]:
+                        await DocumentoModel._liberar(cur, anterior, huerfanos)
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+                await DocumentoModel._eliminar_huerfanos(conn, cur, huerfanos)
 
     @staticmethod
     async def get_archivo(documento_id: str) -> dict | None:
-        """Obtiene el archivo binario de un documento (si existe)."""
+        """Obtiene el archivo de un documento (si existe), del almacén o de la fila legacy."""
         await DocumentoModel._ensure_archivos_table()
         pool = await get_pool()
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cur:
+                # Solo se trae el LONGBLOB si la fila aún no fue migrada al almacén
+                await cur.execute(
+                    """SELECT filename, mime_type, sha256, tamano,
+                              IF(sha256 IS NULL, contenido, NULL) AS contenido
+                       FROM documentos_archivos
+                       WHERE documento_id = %s
+                       LIMIT 1""",
+                    [documento_id],
+                )
+                row = await cur.fetchone()
+        if not row:
+            return None
+        if row.get("sha256"):
+            try:
+                contenido = await almacen.leer(row["sha256"])
+            except FileNotFoundError:
+                contenido = b""
+        else:
+            contenido = row.get("contenido")
+            if isinstance(contenido, memoryview):
+                contenido = contenido.tobytes()
+            elif isinstance(contenido, bytearray):
+                contenido = bytes(contenido)
+        return {
+            "filename": row.get("filename") or "documento",
+            "mime_type": row.get("mime_type") or "application/octet-stream",
+            "sha256": row.get("sha256"),
+            "contenido": contenido or b"",
+        }
+
+    @staticmethod
+    async def get_archivo_meta(documento_id: str) -> dict | None:
+        """Metadatos del archivo sin leer el contenido (para descargas en streaming).
+
+        ``ruta`` es el archivo en disco si el almacén es local; las filas legacy
+        no tienen hash y se leen por trozos con ``leer_rango_legacy``.
+        """
+        await DocumentoModel._ensure_archivos_table()
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
                 await cur.execute(
-                    """SELECT filename, mime_type, contenido
+                    """SELECT filename, mime_type, sha256,
+                              COALESCE(tamano, LENGTH(contenido)) AS tamano,
+                              UNIX_TIMESTAMP(updated_at) AS version
                        FROM documentos_archivos
                        WHERE documento_id = %s
                        LIMIT 1""",
                     [documento_id],
                 )
                 row = await cur.fetchone()
+        return _meta_archivo(row)
+
+    @staticmethod
+    async def get_archivos_meta(documento_ids: list[str]) -> dict[str, dict]:
+        """``get_archivo_meta`` para varios documentos en una sola consulta."""
+        if not documento_ids:
+            return {}
+        await DocumentoModel._ensure_archivos_table()
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    f"""SELECT documento_id, filename, mime_type, sha256,
+                               COALESCE(tamano, LENGTH(contenido)) AS tamano,
+                               UNIX_TIMESTAMP(updated_at) AS version
+                        FROM documentos_archivos
+                        WHERE documento_id IN ({", ".join(["%s"] * len(documento_ids))})""",
+                    list(documento_ids),
+                )
+                rows = await cur.fetchall()
+        metas = {row["documento_id"]: _meta_archivo(row) for row in rows}
+        return {doc_id: meta for doc_id, meta in metas.items() if meta}
+
+    @staticmethod
+    async def leer_rango_legacy(documento_id: str, inicio: int, largo: int) -> bytes:
+        """Lee un trozo del LONGBLOB legacy sin traer el resto (SUBSTRING es 1-based)."""
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """SELECT SUBSTRING(contenido, %s, %s) AS trozo
+                       FROM documentos_archivos WHERE documento_id = %s""",
+                    [inicio + 1, largo, documento_id],
+                )
+                row = await cur.fetchone()
+        trozo = row["trozo"] if row else None
+        return bytes(trozo) if trozo else b""
+
+    @staticmethod
+    async def migrar_archivo_legacy(documento_id: str) -> bool:
+        """Mueve el LONGBLOB de un documento al almacén y deja solo el hash en la BD."""
+        await DocumentoModel._ensure_archivos_table()
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """SELECT contenido FROM documentos_archivos
+                       WHERE documento_id = %s AND sha256 IS NULL AND contenido IS NOT NULL""",
+                    [documento_id],
+                )
+                row = await cur.fetchone()
                 if not row:
-                    return None
-                contenido = row.get("contenido")
-                if isinstance(contenido, memoryview):
-                    contenido = contenido.tobytes()
-                elif isinstance(contenido, bytearray):
-                    contenido = bytes(contenido)
-                return {
-                    "filename": row.get("filename") or "documento",
-                    "mime_type": row.get("mime_type") or "application/octet-stream",
-                    "contenido": contenido or b"",
-                }
+                    return False
+                preparado = await almacen.preparar(row["contenido"])
+                del row
+                await conn.begin()
+                try:
+                    await cur.execute(
+                        """SELECT documento_id FROM documentos_archivos
+                           WHERE documento_id = %s AND sha256 IS NULL FOR UPDATE""",
+                        [documento_id],
+                    )
+                    if not await cur.fetchone():
+                        # Otro proceso lo reemplazó mientras tanto
+                        await conn.rollback()
+                        return False
+                    await DocumentoModel._referenciar(cur, preparado)
+                    await cur.execute(
+                        """UPDATE documentos_archivos
+                           SET sha256 = %s, tamano = %s, contenido = NULL
+                           WHERE documento_id = %s""",
+                        [preparado.sha256, preparado.tamano, documento_id],
+                    )
+                    await conn.commit()
+                    return True
+                except Exception:
+                    await conn.rollback()
+                    raise
+                finally:
+                    await almacen.descartar(preparado)
 
     @staticmethod
     async def find_all(
@@ -81,42 +412,37 @@ class DocumentoModel:
         equipo_id: str = "",
         asignacion_id: str = "",
         usuario_id: str = "",
+        sede: str = "",
+        fecha_desde: str = "",
+        fecha_hasta: str = "",
     ) -> list[dict]:
         pool = await get_pool()
-        sql = """
-            SELECT d.*,
-                   e.placa AS equipo_placa,
-                   u.nombre AS usuario_nombre
-            FROM documentos d
-            LEFT JOIN equipos  e ON d.equipo_id  = e.id
-            LEFT JOIN usuarios u ON d.usuario_id = u.id
-            WHERE 1=1
-        """
-        params = []
-
-        if busqueda:
-            sql += " AND (d.nombre LIKE %s OR d.tipo LIKE %s)"
-            q = f"%{busqueda}%"
-            params.extend([q, q])
-        if tipo:
-            sql += " AND d.tipo = %s"
-            params.append(tipo)
-        if equipo_id:
-            sql += " AND d.equipo_id = %s"
-            params.append(equipo_id)
-        if asignacion_id:
-            sql += " AND d.asignacion_id = %s"
-            params.append(asignacion_id)
-        if usuario_id:
-            sql += " AND d.usuario_id = %s"
-            params.append(usuario_id)
-
-        sql += " ORDER BY d.fecha_carga DESC"
+        sql, params = await _consulta_documentos(
+            busqueda, tipo, equipo_id, asignacion_id, usuario_id, sede, fecha_desde, fecha_hasta
+        )
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
                 await cur.execute(sql, params)
                 return await cur.fetchall()
 
+    @staticmethod
+    async def stream_all(
+        busqueda: str = "",
+        tipo: str = "",
+        equipo_id: str = "",
+        asignacion_id: str = "",
+        usuario_id: str = "",
+        sede: str = "",
+        fecha_desde: str = "",
+        fecha_hasta: str = "",
+    ):
+        """Igual que find_all, pero por lotes con cursor de servidor."""
+        sql, params = await _consulta_documentos(
+            busqueda, tipo, equipo_id, asignacion_id, usuario_id, sede, fecha_desde, fecha_hasta
+        )
+        async for rows in iter_lotes(sql, params):
+            yield rows
+
     @staticmethod
     async def find_by_id(id: str) -> dict | None:
         pool = await get_pool()
@@ -137,29 +463,37 @@ class DocumentoModel:
         new_id = str(uuid.uuid4())
         fecha_carga = date.today().isoformat()
         pool = await get_pool()
+        columns = ["id", "nombre", "tipo", "equipo_id", "asignacion_id", "usuario_id", "area",
+                   "url", "version", "fecha_carga", "cargado_por", "sede"]
+        values = [
+            new_id,
+            data["nombre"],
+            data["tipo"],
+            data.get("equipo_id"),
+            data.get("asignacion_id"),
+            data.get("usuario_id"),
+            data.get("area"),          # ← nuevo
+            data["url"],
+            data.get("version", 1),
+            fecha_carga,
+            data.get("cargado_por"),
+            data.get("sede"),
+        ]
+        # Solo documentos generados (actas) traen huella de render
+        if data.get("huella_render"):
+            columns.append("huella_render")
+            values.append(data["huella_render"])
+
+        placeholders = ", ".join(["%s"] * len(values))
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
-                # En create
                 await cur.execute(
-                    """INSERT INTO documentos
-                    (id, nombre, tipo, equipo_id, asignacion_id, usuario_id, area, url, version, fecha_carga, cargado_por, sede)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                    [
-                        new_id,
-                        data["nombre"],
-                        data["tipo"],
-                        data.get("equipo_id"),
-                        data.get("asignacion_id"),
-                        data.get("usuario_id"),
-                        data.get("area"),          # ← nuevo
-                        data["url"],
-                        data.get("version", 1),
-                        fecha_carga,
-                        data.get("cargado_por"),
-                        data.get("sede"),
-                    ]
+                    f"INSERT INTO documentos ({', '.join(columns)}) VALUES ({placeholders})",
+                    values,
                 )
-        return await DocumentoModel.find_by_id(new_id)
+        row = await DocumentoModel.find_by_id(new_id)
+        search_index.actualizar("documentos", row)
+        return row
 
     @staticmethod
     async def update(id: str, data: dict) -> dict | None:
@@ -174,7 +508,7 @@ class DocumentoModel:
             "fecha_carga",
             "cargado_por",
             "sede",
-
+            "huella_render",
         ]
         fields, values = [], []
         for key in allowed:
@@ -192,11 +526,29 @@ class DocumentoModel:
                 await cur.execute(
                     f"UPDATE documentos SET {', '.join(fields)} WHERE id = %s", values
                 )
-        return await DocumentoModel.find_by_id(id)
+        row = await DocumentoModel.find_by_id(id)
+        search_index.actualizar("documentos", row)
+        return row
 
     @staticmethod
     async def delete(id: str):
+        await DocumentoModel._ensure_archivos_table()
         pool = await get_pool()
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
-                await cur.execute("DELETE FROM documentos WHERE id = %s", [id])
+                huerfanos: list[str] = []
+                await conn.begin()
+                try:
+                    await cur.execute(
+                        "SELECT sha256 FROM documentos_archivos WHERE documento_id = %s FOR UPDATE", [id]
+                    )
+                    row = await cur.fetchone()
+                    # documentos_archivos se borra en cascada; el hash pierde la referencia
+                    await cur.execute("DELETE FROM documentos WHERE id = %s", [id])
+                    await DocumentoModel._liberar(cur, row["sha256"] if row else None, huerfanos)
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+                await DocumentoModel._eliminar_huerfanos(conn, cur, huerfanos)
+        search_index.eliminar("documentos", id)
@@ -1,6 +1,11 @@
 import uuid
 from datetime import date
 from config.db import get_pool
+from utils.busqueda import IndiceBusqueda, condicion_busqueda
+from utils.search_index import search_index
+from utils.sql import insert_many, upsert_many
+
+BUSQUEDA_EQUIPOS = IndiceBusqueda("equipos", "ft_equipos_busqueda", ("placa", "marca", "modelo", "serial"))
 
 
 def _map_equipo(row: dict) -> dict:
@@ -9,6 +14,72 @@ def _map_equipo(row: dict) -> dict:
     return row
 
 
+async def _filtros_equipos(
+    busqueda: str = "",
+    estado: str = "",
+    criticidad: str = "",
+    tipo: str = "",
+    es_rentado=None,
+    sede: str = "",
+) -> tuple[str, list]:
+    """Condiciones WHERE comunes a los listados de equipos."""
+    sql, params = await condicion_busqueda(busqueda, BUSQUEDA_EQUIPOS)
+
+    if estado:
+        sql += " AND estado = %s"
+        params.append(estado)
+    if criticidad:
+        sql += " AND criticidad = %s"
+        params.append(criticidad)
+    if tipo:
+        sql += " AND tipo_equipo = %s"
+        params.append(tipo)
+    if es_rentado is not None:
+        sql += " AND es_rentado = %s"
+        params.append(1 if es_rentado else 0)
+    if sede:                 # ← nuevo filtro
+        sql += " AND sede = %s"
+        params.append(sede)
+    return sql, params
+
+
+def _columnas_insert(data: dict, new_id: str, fecha_registro: str) -> tuple[list[str], list]:
+    # Campos fijos obligatorios
+    columns = ["id", "placa", "tipo_equipo", "criticidad", "confidencialidad",
+               "estado", "fecha_registro"]
+    values = [
+        new_id,
+        data["placa"],
+        data["tipo_equipo"],
+        data["criticidad"],
+        data["confidencialidad"],
+        data.get("estado", "Disponible"),
+        fecha_registro,
+    ]
+
+    # Campos opcionales: sólo se incluyen si vienen en data y no son None
+    optional = [
+        "serial", "marca", "modelo", "sistema_operativo", "version_so",
+        "ram", "disco", "tecnologia", "fecha_compra", "proveedor",
+        "costo", "observaciones",
+        # ── Hoja de Vida ──
+        "procesador", "nombre_equipo", "licenciamiento_so",
+        "licenciamiento_office", "marca_monitor", "placa_monitor",
+        # ── Mantenimiento ──
+        "ultimo_mantenimiento",
+        "sede",
+    ]
+    for key in optional:
+        if data.get(key) is not None:
+            columns.append(key)
+            values.append(data[key])
+
+    # es_rentado siempre incluido
+    columns.append("es_rentado")
+    values.append(1 if data.get("es_rentado") else 0)
+    return columns, values
+
+
 class EquipoModel:
     @staticmethod
     async def find_all(
@@ -20,36 +91,46 @@ class EquipoModel:
         sede: str = "",
     ) -> list[dict]:
         pool = await get_pool()
-        sql = "SELECT * FROM equipos WHERE 1=1"
-        params = []
-
-        if busqueda:
-            sql += " AND (placa LIKE %s OR marca LIKE %s OR modelo LIKE %s OR serial LIKE %s)"
-            q = f"%{busqueda}%"
-            params.extend([q, q, q, q])
-        if estado:
-            sql += " AND estado = %s"
-            params.append(estado)
-        if criticidad:
-            sql += " AND criticidad = %s"
-            params.append(criticidad)
-        if tipo:
-            sql += " AND tipo_equipo = %s"
-            params.append(tipo)
-        if es_rentado is not None:
-            sql += " AND es_rentado = %s"
-            params.append(1 if es_rentado else 0)
-        if sede:                 # ← nuevo filtro
-            sql += " AND sede = %s"
-            params.append(sede)
-
-        sql += " ORDER BY fecha_registro DESC"
+        where, params = await _filtros_equipos(busqueda, estado, criticidad, tipo, es_rentado, sede)
+        sql = f"SELECT * FROM equipos WHERE 1=1{where} ORDER BY fecha_registro DESC"
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
                 await cur.execute(sql, params)
                 rows = await cur.fetchall()
                 return [_map_equipo(r) for r in rows]
 
+    @staticmethod
+    async def find_page(limit: int, after: tuple | None = None, **filtros) -> tuple[list[dict], bool]:
+        """Página ordenada por (fecha_registro, id) DESC empezando después de ``after``.
+
+        Devuelve (filas, hay_mas). Usa el índice idx_equipos_fecha_registro_id
+        en lugar de OFFSET, así que el costo no crece con la página pedida.
+        """
+        pool = await get_pool()
+        where, params = await _filtros_equipos(**filtros)
+        if after is not None:
+            fecha, last_id = after
+            where += " AND (fecha_registro < %s OR (fecha_registro = %s AND id < %s))"
+            params.extend([fecha, fecha, last_id])
+        sql = f"SELECT * FROM equipos WHERE 1=1{where} ORDER BY fecha_registro DESC, id DESC LIMIT %s"
+        params.append(limit + 1)
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(sql, params)
+                rows = await cur.fetchall()
+        hay_mas = len(rows) > limit
+        return [_map_equipo(r) for r in rows[:limit]], hay_mas
+
+    @staticmethod
+    async def count(**filtros) -> int:
+        pool = await get_pool()
+        where, params = await _filtros_equipos(**filtros)
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(f"SELECT COUNT(*) AS total FROM equipos WHERE 1=1{where}", params)
+                row = await cur.fetchone()
+                return int(row["total"]) if row else 0
+
     @staticmethod
     async def find_by_id(id: str) -> dict | None:
         pool = await get_pool()
@@ -59,6 +140,20 @@ class EquipoModel:
                 row = await cur.fetchone()
                 return _map_equipo(row) if row else None
 
+    @staticmethod
+    async def find_by_ids(ids: list[str]) -> dict[str, dict]:
+        """Devuelve {id: equipo} para varios ids en una sola consulta."""
+        ids = list(dict.fromkeys(i for i in ids if i))
+        if not ids:
+            return {}
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                placeholders = ",".join(["%s"] * len(ids))
+                await cur.execute(f"SELECT * FROM equipos WHERE id IN ({placeholders})", ids)
+                rows = await cur.fetchall()
+                return {r["id"]: _map_equipo(r) for r in rows}
+
     @staticmethod
     async def find_by_placa(placa: str) -> dict | None:
         pool = await get_pool()
@@ -72,40 +167,7 @@ class EquipoModel:
     async def create(data: dict) -> dict | None:
         new_id = str(uuid.uuid4())
         fecha_registro = date.today().isoformat()
-
-        # Campos fijos obligatorios
-        columns = ["id", "placa", "tipo_equipo", "criticidad", "confidencialidad",
-                   "estado", "fecha_registro"]
-        values = [
-            new_id,
-            data["placa"],
-            data["tipo_equipo"],
-            data["criticidad"],
-            data["confidencialidad"],
-            data.get("estado", "Disponible"),
-            fecha_registro,
-        ]
-
-        # Campos opcionales: sólo se incluyen si vienen en data y no son None
-        optional = [
-            "serial", "marca", "modelo", "sistema_operativo", "version_so",
-            "ram", "disco", "tecnologia", "fecha_compra", "proveedor",
-            "costo", "observaciones",
-            # ── Hoja de Vida ──
-            "procesador", "nombre_equipo", "licenciamiento_so",
-            "licenciamiento_office", "marca_monitor", "placa_monitor",
-            # ── Mantenimiento ──
-            "ultimo_mantenimiento",
-            "sede",
-        ]
-        for key in optional:
-            if data.get(key) is not None:
-                columns.append(key)
-                values.append(data[key])
-
-        # es_rentado siempre incluido
-        columns.append("es_rentado")
-        values.append(1 if data.get("es_rentado") else 0)
+        columns, values = _columnas_insert(data, new_id, fecha_registro)
 
         placeholders = ", ".join(["%s"] * len(values))
         col_str = ", ".join(columns)
@@ -116,7 +178,37 @@ class EquipoModel:
                 await cur.execute(
                     f"INSERT INTO equipos ({col_str}) VALUES ({placeholders})", values
                 )
-        return await EquipoModel.find_by_id(new_id)
+        row = await EquipoModel.find_by_id(new_id)
+        search_index.actualizar("equipos", row)
+        return row
+
+    @staticmethod
+    async def insert_many(cur, datos: list[dict]) -> list[str]:
+        """INSERT por lotes dentro de la transacción de ``cur``; devuelve los ids.
+
+        A diferencia de create no relee las filas ni hace commit (carga masiva).
+        """
+        fecha_registro = date.today().isoformat()
+        ids = [str(uuid.uuid4()) for _ in datos]
+        await insert_many(cur, "equipos", [
+            _columnas_insert(data, new_id, fecha_registro) for data, new_id in zip(datos, ids)
+        ])
+        return ids
+
+    @staticmethod
+    async def upsert_many(cur, filas: list[tuple[str, dict, set[str]]]) -> None:
+        """Actualiza por lotes equipos existentes ``(id, data, columnas_del_archivo)``.
+
+        Solo se sobrescriben las columnas que trae el archivo: un equipo
+        'Asignado' no vuelve a 'Disponible' por omitir el estado.
+        """
+        fecha_registro = date.today().isoformat()
+        lote = []
+        for id, data, columnas_archivo in filas:
+            columnas, valores = _columnas_insert(data, id, fecha_registro)
+            actualizar = [c for c in columnas if c in columnas_archivo and c not in ("id", "fecha_registro")]
+            lote.append((columnas, valores, actualizar))
+        await upsert_many(cur, "equipos", lote)
 
     @staticmethod
     async def update(id: str, data: dict) -> dict | None:
@@ -146,7 +238,9 @@ class EquipoModel:
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
                 await cur.execute(f"UPDATE equipos SET {', '.join(fields)} WHERE id = %s", values)
-        return await EquipoModel.find_by_id(id)
+        row = await EquipoModel.find_by_id(id)
+        search_index.actualizar("equipos", row)
+        return row
 
     @staticmethod
     async def delete(id: str):
@@ -154,6 +248,7 @@ class EquipoModel:
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
                 await cur.execute("DELETE FROM equipos WHERE id = %s", [id])
+        search_index.eliminar("equipos", id)
 
     @staticmethod
     async def get_historial(equipo_id: str) -> list[dict]:
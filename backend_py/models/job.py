@@ -0,0 +1,269 @@
+import json
+import uuid
+from config.db import get_pool
+
+RECLAMADO = "reclamado"
+OCUPADO = "ocupado"      # otro trabajo con la misma (tipo, clave) está en proceso
+NO_PENDIENTE = "no_pendiente"
+
+
+def _map_job(row: dict) -> dict:
+    if not row:
+        return row
+    for key in ("payload", "resultado", "progreso"):
+        val = row.get(key)
+        if isinstance(val, (bytes, bytearray)):
+            val = val.decode("utf-8")
+        if isinstance(val, str) and val:
+            try:
+                row[key] = json.loads(val)
+            except json.JSONDecodeError:
+                row[key] = val
+    return row
+
+
+class JobModel:
+    @staticmethod
+    async def create(tipo: str, clave: str, payload: dict | None = None) -> str:
+        new_id = str(uuid.uuid4())
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """INSERT INTO jobs (id, tipo, clave, payload, estado)
+                       VALUES (%s, %s, %s, %s, 'pendiente')""",
+                    [new_id, tipo, clave, json.dumps(payload or {}, ensure_ascii=False, default=str)],
+                )
+        return new_id
+
+    @staticmethod
+    async def find_by_id(id: str) -> dict | None:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT * FROM jobs WHERE id = %s", [id])
+                row = await cur.fetchone()
+                return _map_job(row) if row else None
+
+    @staticmethod
+    async def find_pendiente(tipo: str, clave: str) -> dict | None:
+        """Trabajo aún no iniciado para la misma clave (para fusionar solicitudes)."""
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """SELECT * FROM jobs
+                       WHERE tipo = %s AND clave = %s AND estado = 'pendiente'
+                       ORDER BY created_at ASC
+                       LIMIT 1""",
+                    [tipo, clave],
+                )
+                row = await cur.fetchone()
+                return _map_job(row) if row else None
+
+    @staticmethod
+    async def update_payload(id: str, payload: dict) -> None:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "UPDATE jobs SET payload = %s WHERE id = %s AND estado = 'pendiente'",
+                    [json.dumps(payload or {}, ensure_ascii=False, default=str), id],
+                )
+
+    @staticmethod
+    async def reclamar(id: str, propietario: str, lease_segundos: int) -> str:
+        """Marca el trabajo como en proceso con un lease de ``propietario``.
+
+        Devuelve ``RECLAMADO``, ``NO_PENDIENTE`` (otro worker ya lo tomó) u
+        ``OCUPADO`` si la misma (tipo, clave) tiene un trabajo en proceso con
+        lease vigente: las claves se ejecutan de a una, aun entre procesos.
+        """
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT tipo, clave FROM jobs WHERE id = %s", [id])
+                job = await cur.fetchone()
+                if not job:
+                    return NO_PENDIENTE
+                await conn.begin()
+                try:
+                    # Bloquea todas las filas de la clave: dos reclamos de la misma
+                    # clave se serializan aquí y el segundo ve al primero en proceso
+                    await cur.execute(
+                        """SELECT id, estado, lease_hasta > NOW() AS vigente
+                           FROM jobs WHERE tipo = %s AND clave = %s FOR UPDATE""",
+                        [job["tipo"], job["clave"]],
+                    )
+                    filas = await cur.fetchall()
+                    propio = next((f for f in filas if f["id"] == id), None)
+                    if not propio or propio["estado"] != "pendiente":
+                        await conn.rollback()
+                        return NO_PENDIENTE
+                    if any(f["estado"] == "en_proceso" and f["vigente"] for f in filas):
+                        await conn.rollback()
+                        return OCUPADO
+                    await cur.execute(
+                        """UPDATE jobs
+                           SET estado = 'en_proceso', intentos = intentos + 1, started_at = NOW(),
+                               propietario = %s, lease_hasta = NOW() + INTERVAL %s SECOND
+                           WHERE id = %s""",
+                        [propietario, lease_segundos, id],
+                    )
+                    await conn.commit()
+                    return RECLAMADO
+                except Exception:
+                    await conn.rollback()
+                    raise
+
+    @staticmethod
+    async def renovar_lease(id: str, propietario: str, lease_segundos: int) -> bool:
+        """Extiende el lease; False si el trabajo ya no es de ``propietario``."""
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """UPDATE jobs SET lease_hasta = NOW() + INTERVAL %s SECOND
+                       WHERE id = %s AND propietario = %s AND estado = 'en_proceso'""",
+                    [lease_segundos, id, propietario],
+                )
+                return cur.rowcount == 1
+
+    @staticmethod
+    async def finalizar(id: str, *, resultado: dict | None = None, error: str | None = None) -> None:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """UPDATE jobs
+                       SET estado = %s, resultado = %s, error = %s, finished_at = NOW(),
+                           lease_hasta = NULL
+                       WHERE id = %s""",
+                    [
+                        "error" if error else "completado",
+                        json.dumps(resultado, ensure_ascii=False, default=str) if resultado is not None else None,
+                        error,
+                        id,
+                    ],
+                )
+
+    @staticmethod
+    async def _escribir_progreso(cur, id: str, progreso: dict, errores: list[dict]) -> None:
+        if errores:
+            await cur.executemany(
+                "INSERT INTO jobs_errores (job_id, fila, error, campos) VALUES (%s, %s, %s, %s)",
+                [
+                    (id, e["fila"], e["error"], json.dumps(e.get("campos"), ensure_ascii=False, default=str))
+                    for e in errores
+                ],
+            )
+        await cur.execute(
+            "UPDATE jobs SET progreso = %s WHERE id = %s",
+            [json.dumps(progreso, ensure_ascii=False, default=str), id],
+        )
+
+    @staticmethod
+    async def guardar_progreso(id: str, progreso: dict, errores: list[dict] = (), *, cur=None) -> None:
+        """Guarda el avance (solo contadores) y agrega ``errores`` a jobs_errores.
+
+        Con ``cur`` se escribe dentro de esa transacción; sin él, en una propia.
+        """
+        if cur is not None:
+            await JobModel._escribir_progreso(cur, id, progreso, list(errores))
+            return
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as c:
+                await conn.begin()
+                try:
+                    await JobModel._escribir_progreso(c, id, progreso, list(errores))
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+
+    @staticmethod
+    async def find_errores(id: str, limit: int = 100, offset: int = 0) -> list[dict]:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """SELECT fila, error, campos FROM jobs_errores
+                       WHERE job_id = %s ORDER BY fila, id LIMIT %s OFFSET %s""",
+                    [id, limit, offset],
+                )
+                rows = await cur.fetchall()
+        for row in rows:
+            if row.get("campos"):
+                row["campos"] = json.loads(row["campos"])
+        return rows
+
+    @staticmethod
+    async def reintentar(id: str) -> bool:
+        """Devuelve a 'pendiente' un trabajo terminado con error (conserva su progreso)."""
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """UPDATE jobs
+                       SET estado = 'pendiente', error = NULL, finished_at = NULL
+                       WHERE id = %s AND estado = 'error'""",
+                    [id],
+                )
+                return cur.rowcount == 1
+
+    @staticmethod
+    async def liberar_vencidos() -> list[dict]:
+        """Devuelve a 'pendiente' los trabajos 'en_proceso' con lease vencido.
+
+        Solo esos tienen el propietario caído; los de procesos vivos renuevan
+        su lease y no se tocan. Devuelve los trabajos liberados.
+        """
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await conn.begin()
+                try:
+                    await cur.execute(
+                        """SELECT * FROM jobs
+                           WHERE estado = 'en_proceso' AND (lease_hasta IS NULL OR lease_hasta < NOW())
+                           FOR UPDATE"""
+                    )
+                    rows = await cur.fetchall()
+                    if rows:
+                        await cur.execute(
+                            f"""UPDATE jobs SET estado = 'pendiente', propietario = NULL, lease_hasta = NULL
+                                WHERE id IN ({", ".join(["%s"] * len(rows))})""",
+                            [r["id"] for r in rows],
+                        )
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+        return [_map_job(r) for r in rows]
+
+    @staticmethod
+    async def soltar(propietario: str) -> int:
+        """Devuelve a 'pendiente' los trabajos en proceso de ``propietario`` (apagado ordenado)."""
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """UPDATE jobs SET estado = 'pendiente', propietario = NULL, lease_hasta = NULL
+                       WHERE propietario = %s AND estado = 'en_proceso'""",
+                    [propietario],
+                )
+                return cur.rowcount
+
+    @staticmethod
+    async def recuperar_pendientes() -> list[dict]:
+        """Devuelve los trabajos sin terminar, incluidos los 'en_proceso' con lease vencido."""
+        await JobModel.liberar_vencidos()
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT * FROM jobs WHERE estado = 'pendiente' ORDER BY created_at ASC"
+                )
+                rows = await cur.fetchall()
+                return [_map_job(r) for r in rows]
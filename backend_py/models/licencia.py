@@ -1,6 +1,7 @@
 import uuid
 from datetime import date
 from config.db import get_pool
+from utils.search_index import search_index
 
 
 class LicenciaModel:
@@ -73,7 +74,9 @@ class LicenciaModel:
                         date.today().isoformat(),
                     ],
                 )
-        return await LicenciaModel.find_by_id(new_id)
+        row = await LicenciaModel.find_by_id(new_id)
+        search_index.actualizar("licencias", row)
+        return row
 
     @staticmethod
     async def update(id: str, data: dict) -> dict | None:
@@ -92,7 +95,9 @@ class LicenciaModel:
                 await cur.execute(
                     f"UPDATE licencias SET {', '.join(fields)} WHERE id = %s", values
                 )
-        return await LicenciaModel.find_by_id(id)
+        row = await LicenciaModel.find_by_id(id)
+        search_index.actualizar("licencias", row)
+        return row
 
     @staticmethod
     async def delete(id: str):
@@ -100,6 +105,7 @@ class LicenciaModel:
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
                 await cur.execute("DELETE FROM licencias WHERE id = %s", [id])
+        search_index.eliminar("licencias", id)
 
 
 # ── Asignaciones ──────────────────────────────────────────────────────────────
@@ -1,6 +1,34 @@
 import uuid
 from datetime import date
 from config.db import get_pool
+from utils.busqueda import IndiceBusqueda, condicion_busqueda
+from utils.search_index import search_index
+from utils.sql import insert_many
+
+BUSQUEDA_SUMINISTROS = IndiceBusqueda(
+    "suministros", "ft_suministros_busqueda",
+    ("s.nombre", "s.referencia", "s.marca", "s.modelo", "s.proveedor"),
+)
+
+
+def _columnas_insert(data: dict, new_id: str, fecha_registro: str) -> tuple[list[str], list]:
+    columns = ["id", "nombre", "tipo", "estado", "cantidad", "cantidad_minima", "fecha_registro"]
+    values = [
+        new_id,
+        data["nombre"],
+        data["tipo"],
+        data.get("estado", "Disponible"),
+        data.get("cantidad", 0),
+        data.get("cantidad_minima", 1),
+        fecha_registro,
+    ]
+    optional = ["referencia", "marca", "modelo", "proveedor",
+                "fecha_vencimiento", "costo", "equipo_id", "observaciones"]
+    for key in optional:
+        if data.get(key) is not None:
+            columns.append(key)
+            values.append(data[key])
+    return columns, values
 
 
 class SuministroModel:
@@ -19,11 +47,8 @@ class SuministroModel:
             LEFT JOIN equipos e ON s.equipo_id = e.id
             WHERE 1=1
         """
-        params = []
-        if busqueda:
-            sql += " AND (s.nombre LIKE %s OR s.referencia LIKE %s OR s.marca LIKE %s OR s.modelo LIKE %s OR s.proveedor LIKE %s)"
-            q = f"%{busqueda}%"
-            params.extend([q, q, q, q, q])
+        where, params = await condicion_busqueda(busqueda, BUSQUEDA_SUMINISTROS)
+        sql += where
         if tipo:
             sql += " AND s.tipo = %s"
             params.append(tipo)
@@ -58,22 +83,7 @@ class SuministroModel:
         new_id = str(uuid.uuid4())
         fecha_registro = date.today().isoformat()
         pool = await get_pool()
-        columns = ["id", "nombre", "tipo", "estado", "cantidad", "cantidad_minima", "fecha_registro"]
-        values = [
-            new_id,
-            data["nombre"],
-            data["tipo"],
-            data.get("estado", "Disponible"),
-            data.get("cantidad", 0),
-            data.get("cantidad_minima", 1),
-            fecha_registro,
-        ]
-        optional = ["referencia", "marca", "modelo", "proveedor",
-                    "fecha_vencimiento", "costo", "equipo_id", "observaciones"]
-        for key in optional:
-            if data.get(key) is not None:
-                columns.append(key)
-                values.append(data[key])
+        columns, values = _columnas_insert(data, new_id, fecha_registro)
 
         placeholders = ", ".join(["%s"] * len(values))
         col_str = ", ".join(columns)
@@ -82,7 +92,22 @@ class SuministroModel:
                 await cur.execute(
                     f"INSERT INTO suministros ({col_str}) VALUES ({placeholders})", values
                 )
-        return await SuministroModel.find_by_id(new_id)
+        row = await SuministroModel.find_by_id(new_id)
+        search_index.actualizar("suministros", row)
+        return row
+
+    @staticmethod
+    async def insert_many(cur, datos: list[dict]) -> list[str]:
+        """INSERT por lotes dentro de la transacción de ``cur``; devuelve los ids.
+
+        A diferencia de create no relee las filas ni hace commit (carga masiva).
+        """
+        fecha_registro = date.today().isoformat()
+        ids = [str(uuid.uuid4()) for _ in datos]
+        await insert_many(cur, "suministros", [
+            _columnas_insert(data, new_id, fecha_registro) for data, new_id in zip(datos, ids)
+        ])
+        return ids
 
     @staticmethod
     async def update(id: str, data: dict) -> dict | None:
@@ -103,7 +128,9 @@ class SuministroModel:
                 await cur.execute(
                     f"UPDATE suministros SET {', '.join(fields)} WHERE id = %s", values
                 )
-        return await SuministroModel.find_by_id(id)
+        row = await SuministroModel.find_by_id(id)
+        search_index.actualizar("suministros", row)
+        return row
 
     @staticmethod
     async def delete(id: str):
@@ -111,3 +138,4 @@ class SuministroModel:
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
                 await cur.execute("DELETE FROM suministros WHERE id = %s", [id])
+        search_index.eliminar("suministros", id)
@@ -1,29 +1,74 @@
 import uuid
 from datetime import date
 from config.db import get_pool
+from utils.busqueda import IndiceBusqueda, condicion_busqueda
+from utils.search_index import search_index
+from utils.sql import insert_many, upsert_many
+from utils.streaming import iter_lotes
+
+BUSQUEDA_USUARIOS = IndiceBusqueda("usuarios", "ft_usuarios_busqueda", ("nombre", "correo", "area", "proceso"))
+
+
+async def _consulta_usuarios(busqueda: str = "", area: str = "") -> tuple[str, list]:
+    where, params = await condicion_busqueda(busqueda, BUSQUEDA_USUARIOS)
+    sql = f"SELECT * FROM usuarios WHERE 1=1{where}"
+
+    if area:
+        sql += " AND area = %s"
+        params.append(area)
+
+    sql += " ORDER BY nombre ASC"
+    return sql, params
+
+
+# Columnas que no existen en esquemas antiguos (ver fallback en create)
+_COLUMNAS_RECIENTES = ("sede", "tipo_usuario")
+
+
+def _columnas_insert(data: dict, new_id: str, fecha_registro: str, *, recientes: bool = True) -> tuple[list[str], list]:
+    columns = ["id", "nombre", "cargo", "proceso", "grupo_asignado", "area", "correo",
+               "ubicacion", "sede", "activo", "fecha_registro", "tipo_usuario"]
+    values = [
+        new_id,
+        data.get("nombre"),
+        data.get("cargo"),
+        data.get("proceso"),
+        data.get("grupo_asignado"),
+        data.get("area"),
+        data.get("correo"),
+        data.get("ubicacion"),
+        data.get("sede"),
+        1 if data.get("activo", True) else 0,
+        fecha_registro,
+        data.get("tipo_usuario", "empleado"),
+    ]
+    if not recientes:
+        pares = [(c, v) for c, v in zip(columns, values) if c not in _COLUMNAS_RECIENTES]
+        columns, values = [c for c, _ in pares], [v for _, v in pares]
+    return columns, values
+
+
+def _falta_columna_sede(e: Exception) -> bool:
+    return "Unknown column" in str(e) and "sede" in str(e)
 
 
 class UsuarioModel:
     @staticmethod
     async def find_all(busqueda: str = "", area: str = "") -> list[dict]:
         pool = await get_pool()
-        sql = "SELECT * FROM usuarios WHERE 1=1"
-        params = []
-
-        if busqueda:
-            sql += " AND (nombre LIKE %s OR correo LIKE %s OR area LIKE %s OR proceso LIKE %s)"
-            q = f"%{busqueda}%"
-            params.extend([q, q, q, q])
-        if area:
-            sql += " AND area = %s"
-            params.append(area)
-
-        sql += " ORDER BY nombre ASC"
+        sql, params = await _consulta_usuarios(busqueda, area)
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
                 await cur.execute(sql, params)
                 return await cur.fetchall()
 
+    @staticmethod
+    async def stream_all(busqueda: str = "", area: str = ""):
+        """Igual que find_all, pero por lotes con cursor de servidor."""
+        sql, params = await _consulta_usuarios(busqueda, area)
+        async for rows in iter_lotes(sql, params):
+            yield rows
+
     @staticmethod
     async def find_by_id(id: str) -> dict | None:
         pool = await get_pool()
@@ -32,6 +77,20 @@ class UsuarioModel:
                 await cur.execute("SELECT * FROM usuarios WHERE id = %s", [id])
                 return await cur.fetchone()
 
+    @staticmethod
+    async def find_by_ids(ids: list[str]) -> dict[str, dict]:
+        """Devuelve {id: usuario} para varios ids en una sola consulta."""
+        ids = list(dict.fromkeys(i for i in ids if i))
+        if not ids:
+            return {}
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                placeholders = ",".join(["%s"] * len(ids))
+                await cur.execute(f"SELECT * FROM usuarios WHERE id IN ({placeholders})", ids)
+                rows = await cur.fetchall()
+                return {r["id"]: r for r in rows}
+
     @staticmethod
     async def find_areas() -> list[str]:
         pool = await get_pool()
@@ -49,48 +108,57 @@ class UsuarioModel:
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
                 try:
-                    await cur.execute(
-                    """INSERT INTO usuarios
-                    (id, nombre, cargo, proceso, grupo_asignado, area, correo, ubicacion, sede, activo, fecha_registro, tipo_usuario)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                    [
-                        new_id,
-                        data.get("nombre"),
-                        data.get("cargo"),
-                        data.get("proceso"),
-                        data.get("grupo_asignado"),
-                        data.get("area"),
-                        data.get("correo"),
-                        data.get("ubicacion"),
-                        data.get("sede"),
-                        1 if data.get("activo", True) else 0,
-                        fecha_registro,
-                        data.get("tipo_usuario", "empleado"),
-                    ]
-                )
+                    await insert_many(cur, "usuarios", [_columnas_insert(data, new_id, fecha_registro)])
                 except Exception as e:
                     # Compatibilidad: si la columna 'sede' no existe, insertar sin ella
-                    if "Unknown column" in str(e) and "sede" in str(e):
-                        await cur.execute(
-                            """INSERT INTO usuarios
-                               (id, nombre, cargo, proceso, grupo_asignado, area, correo, ubicacion, activo, fecha_registro)
-                               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                            [
-                                new_id,
-                                data.get("nombre"),
-                                data.get("cargo"),
-                                data.get("proceso"),
-                                data.get("grupo_asignado"),
-                                data.get("area"),
-                                data.get("correo"),
-                                data.get("ubicacion"),
-                                1 if data.get("activo", True) else 0,
-                                fecha_registro,
-                            ],
-                        )
+                    if _falta_columna_sede(e):
+                        await insert_many(cur, "usuarios", [
+                            _columnas_insert(data, new_id, fecha_registro, recientes=False)
+                        ])
                     else:
                         raise
-        return await UsuarioModel.find_by_id(new_id)
+        row = await UsuarioModel.find_by_id(new_id)
+        search_index.actualizar("usuarios", row)
+        return row
+
+    @staticmethod
+    async def insert_many(cur, datos: list[dict]) -> list[str]:
+        """INSERT por lotes dentro de la transacción de ``cur``; devuelve los ids.
+
+        A diferencia de create no relee las filas ni hace commit (carga masiva).
+        """
+        fecha_registro = date.today().isoformat()
+        ids = [str(uuid.uuid4()) for _ in datos]
+        try:
+            await insert_many(cur, "usuarios", [
+                _columnas_insert(data, new_id, fecha_registro) for data, new_id in zip(datos, ids)
+            ])
+        except Exception as e:
+            if not _falta_columna_sede(e):
+                raise
+            await insert_many(cur, "usuarios", [
+                _columnas_insert(data, new_id, fecha_registro, recientes=False)
+                for data, new_id in zip(datos, ids)
+            ])
+        return ids
+
+    @staticmethod
+    async def upsert_many(cur, filas: list[tuple[str, dict, set[str]]]) -> None:
+        """Actualiza por lotes usuarios existentes ``(id, data, columnas_del_archivo)``."""
+        fecha_registro = date.today().isoformat()
+
+        def lote(recientes: bool):
+            for id, data, columnas_archivo in filas:
+                columnas, valores = _columnas_insert(data, id, fecha_registro, recientes=recientes)
+                actualizar = [c for c in columnas if c in columnas_archivo and c not in ("id", "fecha_registro")]
+                yield columnas, valores, actualizar
+
+        try:
+            await upsert_many(cur, "usuarios", list(lote(True)))
+        except Exception as e:
+            if not _falta_columna_sede(e):
+                raise
+            await upsert_many(cur, "usuarios", list(lote(False)))
 
     @staticmethod
     async def update(id: str, data: dict) -> dict | None:
@@ -141,7 +209,9 @@ class UsuarioModel:
                         await cur.execute(f"UPDATE usuarios SET {', '.join(new_fields)} WHERE id = %s", new_values)
                     else:
                         raise
-        return await UsuarioModel.find_by_id(id)
+        row = await UsuarioModel.find_by_id(id)
+        search_index.actualizar("usuarios", row)
+        return row
 
     @staticmethod
     async def delete(id: str):
@@ -149,6 +219,7 @@ class UsuarioModel:
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
                 await cur.execute("DELETE FROM usuarios WHERE id = %s", [id])
+        search_index.eliminar("usuarios", id)
 
     @staticmethod
     async def get_perfil(id: str) -> dict:
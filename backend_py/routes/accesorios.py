@@ -36,7 +36,7 @@ async def create(body: dict, current_user: dict = Depends(get_current_user)):
             entidad_id=nuevo["id"],
             detalle=f"Nombre: {body['nombre']}, Placa: {body.get('placa', 'N/A')}"
         )
-        return serialize({"data": nuevo, "message": "Accesorio registrado exitosamente."})
+        return serialize({"data": nuevo, "message": "Accesorio registrado exitosamente."}, status_code=201)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
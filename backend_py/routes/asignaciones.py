@@ -1,5 +1,6 @@
 import os
 import json
+import asyncio
 from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
 from collections import defaultdict
@@ -17,11 +18,15 @@ from models.usuario import UsuarioModel
 from dependencies import get_current_user
 from routes.equipos import _generar_y_registrar_hoja_vida, _requiere_hoja_vida
 from utils.accesorios import normalizar_accesorios_entregados
-from utils.acta_entrega_pdf import generar_acta_entrega_pdf
+from utils.acta_entrega_pdf import generar_acta_entrega_pdf, huella_acta
 from utils.files import safe_filename
+from utils.pdf_renderer import RenderQueueFull, RenderTimeout, render_pdf
 from utils.serializer import serialize
 from utils.audit import log_action
 from utils.email_service import send_email, render_template
+from utils.jobs import job_queue
+from utils.loaders import Loaders
+from utils.streaming import ndjson_response, quiere_stream
 from config.db import get_pool
 
 router = APIRouter()
@@ -57,24 +62,23 @@ async def _cambiar_estado_accesorios(accesorios_ids: list[str], nuevo_estado: st
                 )
 
 # ========== FUNCIÓN PARA ENRIQUECER CON USUARIOS ==========
-async def _enriquecer_con_usuarios(asignacion: dict) -> dict:
-    from models.usuario import UsuarioModel
+async def _enriquecer_con_usuarios(asignacion: dict, loaders: Loaders | None = None) -> dict:
     from models.asignacion_usuario import AsignacionUsuarioModel
 
-    usuarios_asignados = []
+    loaders = loaders or Loaders()
 
-    # Usuario principal
-    principal = await UsuarioModel.find_by_id(asignacion["usuario_id"])
-    if principal:
-        usuarios_asignados.append({
-            "nombre": principal.get("nombre", ""),
-            "cargo": principal.get("cargo", "")
-        })
+    # Usuarios adicionales: find_by_id ya los trae en usuarios_ids
+    if "usuarios_ids" in asignacion:
+        adicionales_ids = list(asignacion.get("usuarios_ids") or [])
+    else:
+        adicionales = await AsignacionUsuarioModel.get_by_asignacion(asignacion["id"])
+        adicionales_ids = [a["usuario_id"] for a in adicionales]
 
-    # Usuarios adicionales desde la tabla puente
-    adicionales = await AsignacionUsuarioModel.get_by_asignacion(asignacion["id"])
-    for a in adicionales:
-        user = await UsuarioModel.find_by_id(a["usuario_id"])
+    # Principal + adicionales en una sola consulta
+    usuarios = await loaders.usuarios.load_many([asignacion["usuario_id"], *adicionales_ids])
+
+    usuarios_asignados = []
+    for user in usuarios:
         if user:
             usuarios_asignados.append({
                 "nombre": user.get("nombre", ""),
@@ -85,11 +89,18 @@ async def _enriquecer_con_usuarios(asignacion: dict) -> dict:
     return asignacion
 
 # ========== FUNCIÓN PARA ENRIQUECER CON EQUIPOS ==========
-async def _enriquecer_con_equipos(asignacion: dict) -> dict:
-    from models.equipo import EquipoModel
+async def _enriquecer_con_equipos(asignacion: dict, loaders: Loaders | None = None) -> dict:
+    loaders = loaders or Loaders()
+
+    accesorios = [
+        acc for acc in asignacion.get("accesorios_entregados", [])
+        if isinstance(acc, dict) and acc.get("id")
+    ]
+    # Equipo principal + accesorios en una sola consulta
+    equipo_principal, *equipos_accesorios = await loaders.equipos.load_many(
+        [asignacion["equipo_id"], *(acc["id"] for acc in accesorios)]
+    )
 
-    # Equipo principal
-    equipo_principal = await EquipoModel.find_by_id(asignacion["equipo_id"])
     if equipo_principal:
         asignacion["placa"] = equipo_principal.get("placa", "")
         asignacion["marca"] = equipo_principal.get("marca", "")
@@ -100,14 +111,7 @@ async def _enriquecer_con_equipos(asignacion: dict) -> dict:
     contadores = defaultdict(int)
     datos_por_tipo = {}
 
-    accesorios = asignacion.get("accesorios_entregados", [])
-    for acc in accesorios:
-        if not isinstance(acc, dict):
-            continue
-        equipo_id = acc.get("id")
-        if not equipo_id:
-            continue
-        equipo = await EquipoModel.find_by_id(equipo_id)
+    for equipo in equipos_accesorios:
         if not equipo:
             continue
         tipo_raw = equipo.get("tipo_equipo", "").lower()
@@ -146,7 +150,12 @@ async def _generar_y_registrar_acta(
     accesorios_entregados: list[str],
     cargado_por: str,
     regenerar: bool = False,
-) -> tuple[bytes, str, str]:
+) -> tuple[bytes, str, str, str]:
+    """Genera (o reutiliza) el acta y la registra como documento.
+
+    Devuelve ``(pdf_bytes, filename, file_url, cache)`` donde ``cache`` es
+    ``"hit"`` si se reutilizó el PDF guardado y ``"miss"`` si se renderizó.
+    """
     existing_docs = await DocumentoModel.find_all(tipo="Acta", asignacion_id=asignacion["id"])
     if not regenerar and existing_docs:
         doc = existing_docs[0]
@@ -155,7 +164,7 @@ async def _generar_y_registrar_acta(
             pdf_bytes = archivo["contenido"]
             filename = safe_filename(archivo.get("filename") or "acta.pdf", default="acta.pdf")
             file_url = doc.get("url") or f"/uploads/{filename}"
-            return pdf_bytes, filename, file_url
+            return pdf_bytes, filename, file_url, "hit"
         if doc.get("url") and doc["url"].startswith("/uploads/"):
             file_path = os.path.join(UPLOADS_DIR, Path(doc["url"]).name)
             if os.path.exists(file_path):
@@ -163,28 +172,41 @@ async def _generar_y_registrar_acta(
                     pdf_bytes = f.read()
                 filename = Path(file_path).name
                 file_url = doc["url"]
-                return pdf_bytes, filename, file_url
+                return pdf_bytes, filename, file_url, "hit"
 
-    asignacion_enriquecida = await _enriquecer_con_usuarios(asignacion)
-    asignacion_enriquecida = await _enriquecer_con_equipos(asignacion_enriquecida)
+    loaders = Loaders()
+    await asyncio.gather(
+        _enriquecer_con_usuarios(asignacion, loaders),
+        _enriquecer_con_equipos(asignacion, loaders),
+    )
+    asignacion_enriquecida = asignacion
 
-    pdf_bytes = generar_acta_entrega_pdf(
+    # Si los datos del render no cambiaron desde la última versión, reutilizar el PDF
+    huella = huella_acta(asignacion_enriquecida, accesorios_entregados=accesorios_entregados)
+    if existing_docs and existing_docs[0].get("huella_render") == huella:
+        doc = existing_docs[0]
+        archivo = await DocumentoModel.get_archivo(doc["id"])
+        if archivo and archivo.get("contenido"):
+            filename = safe_filename(archivo.get("filename") or "acta.pdf", default="acta.pdf")
+            file_url = doc.get("url") or f"/uploads/{filename}"
+            return archivo["contenido"], filename, file_url, "hit"
+
+    pdf_bytes = await render_pdf(
+        generar_acta_entrega_pdf,
         asignacion_enriquecida,
         accesorios_opciones=ACCESORIOS_OPCIONES,
         accesorios_entregados=accesorios_entregados,
         entregado_por=cargado_por,
     )
 
-    os.makedirs(UPLOADS_DIR, exist_ok=True)
     placa = asignacion.get("placa") or "equipo"
     filename = safe_filename(
         f"acta_entrega_{placa}_{str(asignacion.get('id') or '')[:8]}.pdf",
         default="acta_entrega.pdf",
     )
-    filepath = os.path.join(UPLOADS_DIR, filename)
-    with open(filepath, "wb") as f:
-        f.write(pdf_bytes)
-    file_url = f"/uploads/{filename}"
+    # Los bytes van solo al almacén de documentos (upsert_archivo); uploads/
+    # se sigue leyendo abajo para actas antiguas sin archivo en la BD
+    file_url = f"blob://{filename}"
 
     if not existing_docs:
         doc = await DocumentoModel.create({
@@ -197,6 +219,7 @@ async def _generar_y_registrar_acta(
             "fecha_carga": date.today().isoformat(),
             "cargado_por": cargado_por,
             "version": 1,
+            "huella_render": huella,
         })
         if doc:
             await DocumentoModel.upsert_archivo(doc["id"], filename=filename, mime_type="application/pdf", contenido=pdf_bytes)
@@ -207,17 +230,49 @@ async def _generar_y_registrar_acta(
             "fecha_carga": date.today().isoformat(),
             "cargado_por": cargado_por,
             "version": nueva_version,
+            "huella_render": huella,
         })
         if doc:
             await DocumentoModel.upsert_archivo(doc["id"], filename=filename, mime_type="application/pdf", contenido=pdf_bytes)
 
     await AsignacionModel.update(asignacion["id"], {"acta_pdf": file_url})
-    return pdf_bytes, filename, file_url
+    return pdf_bytes, filename, file_url, "miss"
+
+# ========== REGENERACIÓN DE ACTA EN SEGUNDO PLANO ==========
+async def _job_regenerar_acta(asignacion_id: str, payload: dict) -> dict:
+    # Se relee la asignación al ejecutar: si varias solicitudes se fusionaron,
+    # el acta sale con el estado más reciente (todas las firmas incluidas).
+    asignacion = await AsignacionModel.find_by_id(asignacion_id)
+    if not asignacion:
+        raise ValueError("Asignación no encontrada.")
+    accesorios = normalizar_accesorios_entregados(asignacion.get("accesorios_entregados"))
+    _, filename, file_url, acta_cache = await _generar_y_registrar_acta(
+        asignacion,
+        accesorios_entregados=accesorios,
+        cargado_por=payload.get("cargado_por") or "Sistema",
+        regenerar=True,
+    )
+    return {"asignacion_id": asignacion_id, "filename": filename, "url": file_url, "acta_cache": acta_cache}
+
+
+job_queue.registrar("regenerar_acta", _job_regenerar_acta)
+
+
+async def _encolar_regeneracion_acta(asignacion_id: str, cargado_por: str) -> str:
+    """Encola la regeneración del acta y devuelve el id del trabajo."""
+    return await job_queue.encolar("regenerar_acta", asignacion_id, {"cargado_por": cargado_por})
 
 # ================== ENDPOINTS ==================
 
 @router.get("")
-async def get_all(busqueda: str = Query(""), estado: str = Query("")):
+async def get_all(
+    request: Request,
+    busqueda: str = Query(""),
+    estado: str = Query(""),
+    stream: bool = Query(False),
+):
+    if quiere_stream(request, stream):
+        return ndjson_response(AsignacionModel.stream_all(busqueda=busqueda, estado=estado))
     asignaciones = await AsignacionModel.find_all(busqueda=busqueda, estado=estado)
     activas = sum(1 for a in asignaciones if a["estado"] == "Activa")
     return serialize({"data": asignaciones, "total": len(asignaciones), "activas": activas})
@@ -271,8 +326,9 @@ async def create(body: dict, current_user: dict = Depends(get_current_user)):
         accesorios_textos = normalizar_accesorios_entregados(body.get("accesorios_entregados"))
 
         acta_error = None
+        acta_cache = None
         try:
-            await _generar_y_registrar_acta(nueva, accesorios_entregados=accesorios_textos, cargado_por=cargado_por, regenerar=False)
+            *_, acta_cache = await _generar_y_registrar_acta(nueva, accesorios_entregados=accesorios_textos, cargado_por=cargado_por, regenerar=False)
         except Exception as e:
             acta_error = str(e)
             print(f"[ERROR] Falló generación de acta: {acta_error}")
@@ -322,10 +378,10 @@ async def create(body: dict, current_user: dict = Depends(get_current_user)):
                     html=html
                 )
 
-        response_data = {"data": nueva, "message": "Asignación creada exitosamente."}
+        response_data = {"data": nueva, "message": "Asignación creada exitosamente.", "acta_cache": acta_cache}
         if acta_error:
             response_data["warning"] = f"Acta generada con error: {acta_error}"
-        return serialize(response_data)
+        return serialize(response_data, status_code=201)
 
     except ValueError as e:
         raise HTTPException(status_code=409, detail=str(e))
@@ -344,12 +400,14 @@ async def get_acta_pdf(
     cargado_por = current_user.get("nombre") or current_user.get("username") or "Sistema"
     accesorios = normalizar_accesorios_entregados(asignacion.get("accesorios_entregados"))
     try:
-        pdf_bytes, filename, _ = await _generar_y_registrar_acta(
+        pdf_bytes, filename, _, acta_cache = await _generar_y_registrar_acta(
             asignacion,
             accesorios_entregados=accesorios,
             cargado_por=cargado_por,
             regenerar=force,
         )
+    except (RenderQueueFull, RenderTimeout) as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al generar el acta: {str(e)}")
     return Response(
@@ -359,7 +417,8 @@ async def get_acta_pdf(
             "Content-Disposition": f'attachment; filename="{filename}"',
             "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
             "Pragma": "no-cache",
-            "X-Acta-Generated": "true" if force else "false",
+            "X-Acta-Generated": "true" if acta_cache == "miss" else "false",
+            "X-Acta-Cache": acta_cache,
             "X-Acta-Length": str(len(pdf_bytes)),
         },
     )
@@ -405,29 +464,13 @@ async def firmar_con_token(body: dict):
         "fecha": datetime.now().isoformat()
     }
     firmas.append(nueva_firma)
-    await AsignacionModel.update(id, {
+    await AsignacionModel.update(asignacion_id, {
         "firmas": json.dumps(firmas)
     })
 
-    # Volver a consultar la asignación
-    asignacion_actualizada = await AsignacionModel.find_by_id(id)
-
-    print("FIRMAS RECARGADAS:")
-    print(asignacion_actualizada.get("firmas"))
-
-    # Regenerar usando los datos actualizados
-    cargado_por = current_user.get("nombre") or current_user.get("username") or "Sistema"
-
-    accesorios_textos = normalizar_accesorios_entregados(
-        asignacion_actualizada.get("accesorios_entregados")
-    )
-
-    await _generar_y_registrar_acta(
-        asignacion_actualizada,
-        accesorios_entregados=accesorios_textos,
-        cargado_por=cargado_por,
-        regenerar=True
-    )
+    # Regenerar en segundo plano (endpoint público: no hay usuario de sistema)
+    job_id = await _encolar_regeneracion_acta(asignacion_id, "Sistema")
+    return {"message": "Firma registrada correctamente", "job_id": job_id}
 
 @router.put("/{id}")
 async def update(id: str, body: dict, current_user: dict = Depends(get_current_user)):
@@ -441,15 +484,7 @@ async def update(id: str, body: dict, current_user: dict = Depends(get_current_u
         actualizada = await AsignacionModel.update(id, body)
 
         cargado_por = current_user.get("nombre") or current_user.get("username") or "Sistema"
-        accesorios = normalizar_accesorios_entregados(actualizada.get("accesorios_entregados"))
-        await _generar_y_registrar_acta(
-            actualizada,
-            accesorios_entregados=accesorios,
-            cargado_por=cargado_por,
-            regenerar=True
-        )
-
-        actualizada = await AsignacionModel.find_by_id(id)
+        job_id = await _encolar_regeneracion_acta(id, cargado_por)
         user_id = current_user.get("sub") or current_user.get("id")
         await log_action(
             user_id=user_id,
@@ -458,7 +493,7 @@ async def update(id: str, body: dict, current_user: dict = Depends(get_current_u
             entidad_id=id,
             detalle=f"Campos: {list(body.keys())}"
         )
-        return serialize({"data": actualizada, "message": "Asignación actualizada y acta regenerada."})
+        return serialize({"data": actualizada, "message": "Asignación actualizada. El acta se regenera en segundo plano.", "job_id": job_id})
     except HTTPException:
         raise
     except Exception as e:
@@ -516,14 +551,7 @@ async def registrar_devolucion(
             raise HTTPException(status_code=404, detail="Asignación no encontrada después de actualizar.")
 
         cargado_por = current_user.get("nombre") or current_user.get("username") or "Sistema"
-        accesorios_textos = normalizar_accesorios_entregados(actualizada.get("accesorios_entregados"))
-        await _generar_y_registrar_acta(
-            actualizada,
-            accesorios_entregados=accesorios_textos,
-            cargado_por=cargado_por,
-            regenerar=True
-        )
-        actualizada = await AsignacionModel.find_by_id(id)
+        job_id = await _encolar_regeneracion_acta(id, cargado_por)
 
         user_id = current_user.get("sub") or current_user.get("id")
         if user_id:
@@ -534,7 +562,7 @@ async def registrar_devolucion(
                 entidad_id=id,
                 detalle=f"Equipos devueltos: {', '.join(equipos_a_devolver)}"
             )
-        return serialize({"data": actualizada, "message": "Devolución selectiva registrada. Las firmas han sido reiniciadas y el acta regenerada."})
+        return serialize({"data": actualizada, "message": "Devolución selectiva registrada. Las firmas han sido reiniciadas y el acta se regenera en segundo plano.", "job_id": job_id})
     except Exception as e:
         print("Error inesperado en devolución:")
         import traceback
@@ -590,15 +618,9 @@ async def agregar_accesorio(
 
     asignacion_actualizada = await AsignacionModel.find_by_id(id)
     cargado_por = current_user.get("nombre") or current_user.get("username") or "Sistema"
-    accesorios_textos = normalizar_accesorios_entregados(asignacion_actualizada.get("accesorios_entregados"))
-    await _generar_y_registrar_acta(
-        asignacion_actualizada,
-        accesorios_entregados=accesorios_textos,
-        cargado_por=cargado_por,
-        regenerar=True
-    )
+    job_id = await _encolar_regeneracion_acta(id, cargado_por)
 
-    return {"message": "Accesorio agregado correctamente. Las firmas han sido reiniciadas y el acta regenerada.", "data": asignacion_actualizada}
+    return {"message": "Accesorio agregado correctamente. Las firmas han sido reiniciadas y el acta se regenera en segundo plano.", "data": asignacion_actualizada, "job_id": job_id}
 @router.post("/{id}/firmar")
 async def firmar_asignacion(
     id: str,
@@ -653,21 +675,15 @@ async def firmar_asignacion(
     
     print(f"[FIRMAR] Firmas totales después: {len(firmas)}")
 
-    # Regenerar acta para que incluya la firma
+    # Regenerar acta (en segundo plano) para que incluya la firma
+    job_id = None
     try:
-        from utils.accesorios import normalizar_accesorios_entregados
         cargado_por = current_user.get("nombre") or current_user.get("username") or "Sistema"
-        accesorios_textos = normalizar_accesorios_entregados(asignacion.get("accesorios_entregados"))
-        await _generar_y_registrar_acta(
-            asignacion,
-            accesorios_entregados=accesorios_textos,
-            cargado_por=cargado_por,
-            regenerar=True
-        )
+        job_id = await _encolar_regeneracion_acta(id, cargado_por)
     except Exception as e:
-        print(f"Error regenerando acta: {e}")
+        print(f"Error encolando regeneración de acta: {e}")
 
-    return {"message": "Firma registrada correctamente"}
+    return {"message": "Firma registrada correctamente", "job_id": job_id}
 
 @router.get("/{id}/token-firma")
 async def obtener_token_firma(
@@ -695,10 +711,9 @@ async def reenviar_firma(
     if asignacion["estado"] != "Activa":
         raise HTTPException(400, "La asignación no está activa")
 
-    from models.usuario import UsuarioModel
-
-    # Obtener usuarios (principal + adicionales)
-    usuario_principal = await UsuarioModel.find_by_id(asignacion["usuario_id"])
+    # Obtener usuarios (principal + adicionales) en una sola consulta
+    usuarios = await UsuarioModel.find_by_ids([asignacion["usuario_id"], *(asignacion.get("usuarios_ids") or [])])
+    usuario_principal = usuarios.get(asignacion["usuario_id"])
     if not usuario_principal or not usuario_principal.get("correo"):
         raise HTTPException(400, "El usuario principal no tiene correo")
 
@@ -706,7 +721,7 @@ async def reenviar_firma(
     destinatarios = [{"id": usuario_principal["id"], "nombre": usuario_principal["nombre"], "correo": usuario_principal["correo"]}]
     if asignacion.get("usuarios_ids"):
         for uid in asignacion["usuarios_ids"]:
-            u = await UsuarioModel.find_by_id(uid)
+            u = usuarios.get(uid)
             if u and u.get("correo") and not any(d["id"] == uid for d in destinatarios):
                 destinatarios.append({"id": u["id"], "nombre": u["nombre"], "correo": u["correo"]})
 
@@ -806,30 +821,20 @@ async def firmar_asignacion_simple(
     asignacion_verificar = await AsignacionModel.find_by_id(id)
     print(f"[FIRMAR] Verificación - Firmas guardadas: {asignacion_verificar.get('firmas')}")
     
-    # ========== REGENERAR EL ACTA CON LA NUEVA FIRMA ==========
+    # ========== REGENERAR EL ACTA CON LA NUEVA FIRMA (SEGUNDO PLANO) ==========
+    # Firmas seguidas sobre la misma asignación se fusionan en un solo render.
+    job_id = None
     try:
-        from utils.accesorios import normalizar_accesorios_entregados
-        from routes.asignaciones import _generar_y_registrar_acta
-        
-        # Obtener la asignación actualizada (ya tiene la firma)
-        asignacion_actualizada = await AsignacionModel.find_by_id(id)
-        
         cargado_por = current_user.get("nombre") or current_user.get("username") or "Sistema"
-        accesorios_textos = normalizar_accesorios_entregados(asignacion_actualizada.get("accesorios_entregados"))
-        
-        await _generar_y_registrar_acta(
-            asignacion_actualizada,
-            accesorios_entregados=accesorios_textos,
-            cargado_por=cargado_por,
-            regenerar=True
-        )
-        print("[FIRMAR] Acta regenerada con la firma incluida")
+        job_id = await _encolar_regeneracion_acta(id, cargado_por)
+        print(f"[FIRMAR] Regeneración de acta encolada: {job_id}")
     except Exception as e:
-        print(f"[FIRMAR] Error regenerando acta: {e}")
+        print(f"[FIRMAR] Error encolando regeneración de acta: {e}")
         # No lanzamos excepción para que la firma quede guardada aunque falle la regeneración
     
     return {
         "message": "Firma registrada correctamente",
         "firmante": nombre_usuario,
-        "total_firmas": len(firmas)
+        "total_firmas": len(firmas),
+        "job_id": job_id,
     }
\ No newline at end of file
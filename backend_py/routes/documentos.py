@@ -1,17 +1,29 @@
+import csv
+import io
+import logging
 import os
+import tempfile
 import uuid
+from datetime import datetime
+from functools import partial
 from pathlib import Path
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form, status
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile, File, Form, status
+from fastapi.responses import StreamingResponse
+import anyio
 from models.documento import DocumentoModel
+from utils.almacen_documentos import ArchivoDemasiadoGrande, BlobPreparado, almacen
+from utils.descargas import respuesta_archivo, trozos_archivo, trozos_lector
+from utils.zip_streaming import MODOS, ZipEnStreaming
 from utils.serializer import serialize
 from utils.files import safe_filename
 from utils.audit import log_action
+from utils.streaming import ndjson_response, quiere_stream
 from dependencies import get_current_user
 
 
 
 router = APIRouter()
+logger = logging.getLogger("itam.documentos")
 
 UPLOADS_DIR = os.getenv("UPLOADS_DIR", "uploads")
 os.makedirs(UPLOADS_DIR, exist_ok=True)
@@ -25,39 +37,190 @@ ALLOWED_MIME_TYPES = {
     "text/plain",
 }
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
+# Tope del cuerpo multipart completo (archivo + campos del formulario), lo aplica
+# LimiteCuerpoMiddleware antes de parsear
+MAX_REQUEST_SIZE = MAX_FILE_SIZE + 256 * 1024
 
 
-def _validate_file(content_type: str, size: int) -> None:
+def _validate_file(content_type: str) -> None:
     if content_type not in ALLOWED_MIME_TYPES:
         raise HTTPException(
             status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
             detail=f"Tipo de archivo no permitido. Permitidos: {', '.join(ALLOWED_MIME_TYPES)}"
         )
-    if size > MAX_FILE_SIZE:
+
+
+async def _preparar_subida(archivo: UploadFile) -> BlobPreparado:
+    """Copia la subida por bloques al temporal del almacén (SHA-256 al vuelo).
+
+    Nunca se lee completa en memoria; se corta en cuanto pasa de MAX_FILE_SIZE.
+    """
+    _validate_file(archivo.content_type or "application/octet-stream")
+    try:
+        return await almacen.preparar(archivo.file, limite=MAX_FILE_SIZE)
+    except ArchivoDemasiadoGrande:
         raise HTTPException(
             status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
             detail=f"El archivo excede el tamaño máximo de {MAX_FILE_SIZE // (1024*1024)} MB"
         )
+    finally:
+        await archivo.close()
 
 
 @router.get("")
 async def get_all(
+    request: Request,
     busqueda: str = Query(""),
     tipo: str = Query(""),
     equipo_id: str = Query(""),
     asignacion_id: str = Query(""),
     usuario_id: str = Query(""),
+    sede: str = Query(""),
+    fecha_desde: str = Query(""),
+    fecha_hasta: str = Query(""),
+    stream: bool = Query(False),
 ):
-    documentos = await DocumentoModel.find_all(
+    filtros = dict(
         busqueda=busqueda,
         tipo=tipo,
         equipo_id=equipo_id,
         asignacion_id=asignacion_id,
         usuario_id=usuario_id,
+        sede=sede,
+        fecha_desde=fecha_desde,
+        fecha_hasta=fecha_hasta,
     )
+    if quiere_stream(request, stream):
+        return ndjson_response(DocumentoModel.stream_all(**filtros))
+    documentos = await DocumentoModel.find_all(**filtros)
     return serialize({"data": documentos, "total": len(documentos)})
 
 
+# ─── Exportación ZIP ──────────────────────────────────────────────────────────
+FILTROS_DOCUMENTOS = (
+    "busqueda", "tipo", "equipo_id", "asignacion_id", "usuario_id", "sede", "fecha_desde", "fecha_hasta",
+)
+COLUMNAS_MANIFIESTO = [
+    "documento_id", "nombre", "tipo", "sede", "fecha_carga", "equipo_placa", "usuario_nombre",
+    "version", "archivo_zip", "filename", "mime_type", "tamano", "sha256", "estado",
+]
+TROZO_ZIP = 1024 * 1024
+
+
+def _nombre_en_zip(doc: dict, archivo: dict) -> str:
+    # El id evita choques entre documentos con el mismo nombre de archivo
+    carpeta = safe_filename(doc.get("tipo") or "", default="otros")
+    return f"{carpeta}/{doc['id']}_{safe_filename(archivo['filename'], default='documento')}"
+
+
+def _trozos_documento(documento_id: str, archivo: dict):
+    if archivo["ruta"] is not None:
+        return trozos_archivo(archivo["ruta"], 0, archivo["tamano"])
+    return trozos_lector(
+        partial(DocumentoModel.leer_rango_legacy, documento_id), 0, archivo["tamano"], TROZO_ZIP
+    )
+
+
+def _fila_manifiesto(doc: dict, archivo: dict | None, archivo_zip: str, estado: str) -> list:
+    archivo = archivo or {}
+    return [
+        doc["id"], doc.get("nombre"), doc.get("tipo"), doc.get("sede"), doc.get("fecha_carga"),
+        doc.get("equipo_placa"), doc.get("usuario_nombre"), doc.get("version"), archivo_zip,
+        archivo.get("filename"), archivo.get("mime_type"), archivo.get("tamano"), archivo.get("sha256"),
+        estado,
+    ]
+
+
+@router.post("/export.zip")
+async def exportar_zip(body: dict = None, current_user: dict = Depends(get_current_user)):
+    """ZIP de los documentos que cumplen los filtros de ``get_all``, en streaming.
+
+    Cada archivo se lee por trozos (almacén o LONGBLOB legacy) y se escribe en
+    el ZIP a medida que llega; el archivo completo nunca está en memoria. Al
+    final va ``manifiesto.csv`` con una fila por documento (incluidos los que
+    no tienen archivo). ``compresion``: ``deflate`` (por defecto) o ``store``.
+    """
+    body = body or {}
+    modo = body.get("compresion") or "deflate"
+    if modo not in MODOS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"compresion debe ser uno de: {', '.join(MODOS)}"
+        )
+    filtros = {campo: str(body.get(campo) or "") for campo in FILTROS_DOCUMENTOS}
+
+    async def cuerpo():
+        zip_ = ZipEnStreaming(modo)
+        incluidos = sin_archivo = 0
+        # El manifiesto se completa mientras se recorre y se agrega al final
+        with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as manifiesto:
+            texto = io.StringIO()
+            escritor = csv.writer(texto, delimiter=";")
+            escritor.writerow(COLUMNAS_MANIFIESTO)
+            try:
+                async for docs in DocumentoModel.stream_all(**filtros):
+                    archivos = await DocumentoModel.get_archivos_meta([doc["id"] for doc in docs])
+                    for doc in docs:
+                        archivo = archivos.get(doc["id"])
+                        if not archivo or (archivo["sha256"] and not await almacen.existe(archivo["sha256"])):
+                            escritor.writerow(_fila_manifiesto(doc, archivo, "", "sin archivo"))
+                            sin_archivo += 1
+                            continue
+                        nombre = _nombre_en_zip(doc, archivo)
+                        async for parte in zip_.agregar(
+                            nombre,
+                            _trozos_documento(doc["id"], archivo),
+                            tamano=archivo["tamano"],
+                            fecha=doc.get("fecha_carga"),
+                        ):
+                            yield parte
+                        escritor.writerow(_fila_manifiesto(doc, archivo, nombre, "incluido"))
+                        incluidos += 1
+                    manifiesto.write(texto.getvalue().encode("utf-8"))
+                    texto.seek(0)
+                    texto.truncate()
+                manifiesto.write(texto.getvalue().encode("utf-8"))
+                tamano_manifiesto = manifiesto.tell()
+                manifiesto.seek(0)
+
+                async def trozos_manifiesto():
+                    yield "\ufeff".encode("utf-8")
+                    while trozo := manifiesto.read(TROZO_ZIP):
+                        yield trozo
+
+                async for parte in zip_.agregar(
+                    "manifiesto.csv", trozos_manifiesto(), tamano=tamano_manifiesto + 3
+                ):
+                    yield parte
+                final = zip_.cerrar()
+            except Exception as e:
+                # Los encabezados ya se enviaron: solo queda registrar y cortar
+                logger.error("Error durante la exportación ZIP de documentos: %s", e, exc_info=True)
+                raise
+
+        # Antes de los últimos bytes: un fallo de auditoría no debe cortar la descarga
+        try:
+            await log_action(
+                user_id=current_user.get("sub") or current_user.get("id"),
+                accion="Exportó documentos (ZIP)",
+                modulo="Documentos",
+                detalle=(
+                    f"Incluidos: {incluidos}, Sin archivo: {sin_archivo}, Compresión: {modo}, "
+                    f"Filtros: { {k: v for k, v in filtros.items() if v} }"
+                ),
+            )
+        except Exception as e:
+            logger.warning("No se pudo auditar la exportación ZIP de documentos: %s", e)
+        yield final
+
+    nombre = f"documentos_{datetime.now():%Y%m%d_%H%M%S}.zip"
+    return StreamingResponse(
+        cuerpo(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={nombre}"}
+    )
+
+
 @router.get("/{id}")
 async def get_by_id(id: str):
     doc = await DocumentoModel.find_by_id(id)
@@ -66,19 +229,54 @@ async def get_by_id(id: str):
     return serialize({"data": doc})
 
 
+def _lector_blob(sha256: str):
+    """Lector de rangos para un almacén no local: trae el blob en la primera
+    lectura, así un 304 por ``If-None-Match`` no lo lee."""
+    contenido: bytes | None = None
+
+    async def leer(inicio: int, largo: int) -> bytes:
+        nonlocal contenido
+        if contenido is None:
+            contenido = await almacen.leer(sha256)
+        return contenido[inicio:inicio + largo]
+
+    return leer
+
+
 @router.get("/{id}/download")
-async def download(id: str):
+async def download(id: str, request: Request):
+    """Descarga con ETag (SHA-256), ``If-None-Match`` → 304 y ``Range`` → 206."""
     doc = await DocumentoModel.find_by_id(id)
     if not doc:
         raise HTTPException(status_code=404, detail="Documento no encontrado.")
-    archivo = await DocumentoModel.get_archivo(id)
-    if not archivo or not archivo.get("contenido"):
+    archivo = await DocumentoModel.get_archivo_meta(id)
+    if not archivo or not archivo["tamano"]:
         raise HTTPException(status_code=404, detail="Archivo no disponible para descarga.")
-    filename = safe_filename(archivo.get("filename") or "documento", default="documento")
-    return Response(
-        content=archivo["contenido"],
-        media_type=archivo.get("mime_type") or "application/octet-stream",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    filename = safe_filename(archivo["filename"], default="documento")
+
+    if archivo["sha256"]:
+        ruta = archivo["ruta"]
+        if ruta is not None and not await anyio.Path(ruta).exists():
+            raise HTTPException(status_code=404, detail="Archivo no disponible para descarga.")
+        etag = f'"{archivo["sha256"]}"'
+        # Almacén no local: se lee completo una vez y se sirve por trozos
+        leer = _lector_blob(archivo["sha256"]) if ruta is None else None
+    else:
+        # Fila legacy (LONGBLOB aún no migrado): se lee por trozos con SUBSTRING
+        ruta = None
+        etag = f'W/"{id}-{archivo["version"]}-{archivo["tamano"]}"'
+
+        async def leer(inicio: int, largo: int) -> bytes:
+            return await DocumentoModel.leer_rango_legacy(id, inicio, largo)
+
+    return respuesta_archivo(
+        request,
+        tamano=archivo["tamano"],
+        etag=etag,
+        filename=filename,
+        media_type=archivo["mime_type"],
+        ruta=ruta,
+        leer=leer,
     )
 
 
@@ -97,32 +295,35 @@ async def create(
     archivo: UploadFile = File(...),
     current_user: dict = Depends(get_current_user)
 ):
-    content = await archivo.read()
-    await archivo.close()
-    _validate_file(archivo.content_type or "application/octet-stream", len(content))
+    preparado = await _preparar_subida(archivo)
 
     original_filename = archivo.filename or "documento"
     unique_filename = f"{uuid.uuid4().hex}_{safe_filename(original_filename, default='documento')}"
 
-    nuevo = await DocumentoModel.create({
-        "nombre": nombre,
-        "tipo": tipo,
-        "equipo_id": equipo_id,
-        "asignacion_id": asignacion_id,
-        "usuario_id": usuario_id,
-        "area": area,
-        "url": f"blob://{unique_filename}",
-        "version": version,
-        "cargado_por": cargado_por,
-    })
+    try:
+        nuevo = await DocumentoModel.create({
+            "nombre": nombre,
+            "tipo": tipo,
+            "equipo_id": equipo_id,
+            "asignacion_id": asignacion_id,
+            "usuario_id": usuario_id,
+            "area": area,
+            "url": f"blob://{unique_filename}",
+            "version": version,
+            "cargado_por": cargado_por,
+        })
+        if nuevo:
+            # El temporal se mueve (no se copia) a su ruta definitiva en el almacén
+            await DocumentoModel.guardar_archivo(
+                nuevo["id"],
+                preparado,
+                filename=original_filename,
+                mime_type=archivo.content_type or "application/octet-stream",
+            )
+    finally:
+        await almacen.descartar(preparado)
 
     if nuevo:
-        await DocumentoModel.upsert_archivo(
-            nuevo["id"],
-            filename=original_filename,
-            mime_type=archivo.content_type or "application/octet-stream",
-            contenido=content,
-        )
 
         # Auditoría
         user_id = current_user.get("sub") or current_user.get("id")
@@ -131,10 +332,10 @@ async def create(
             accion="Subió documento",
             modulo="Documentos",
             entidad_id=nuevo["id"],
-            detalle=f"Nombre: {nombre}, Tipo: {tipo}, Tamaño: {len(content)} bytes"
+            detalle=f"Nombre: {nombre}, Tipo: {tipo}, Tamaño: {preparado.tamano} bytes"
         )
 
-    return serialize({"data": nuevo, "message": "Documento registrado exitosamente."})
+    return serialize({"data": nuevo, "message": "Documento registrado exitosamente."}, status_code=status.HTTP_201_CREATED)
 
 
 @router.put("/{id}")
@@ -166,22 +367,24 @@ async def update(
             data[key] = val
 
     if archivo:
-        content = await archivo.read()
-        await archivo.close()
-        _validate_file(archivo.content_type or "application/octet-stream", len(content))
+        preparado = await _preparar_subida(archivo)
 
         original_filename = archivo.filename or "documento"
         unique_filename = f"{uuid.uuid4().hex}_{safe_filename(original_filename, default='documento')}"
         data["url"] = f"blob://{unique_filename}"
 
-        actualizado = await DocumentoModel.update(id, data)
+        try:
+            actualizado = await DocumentoModel.update(id, data)
+            if actualizado:
+                await DocumentoModel.guardar_archivo(
+                    id,
+                    preparado,
+                    filename=original_filename,
+                    mime_type=archivo.content_type or "application/octet-stream",
+                )
+        finally:
+            await almacen.descartar(preparado)
         if actualizado:
-            await DocumentoModel.upsert_archivo(
-                id,
-                filename=original_filename,
-                mime_type=archivo.content_type or "application/octet-stream",
-                contenido=content,
-            )
             # Auditoría (actualización con nuevo archivo)
             user_id = current_user.get("sub") or current_user.get("id")
             await log_action(
@@ -189,7 +392,7 @@ async def update(
             accion="Actualizó documento (nuevo archivo)",
             modulo="Documentos",
             entidad_id=id,
-            detalle=f"Nombre: {nombre or existe['nombre']}, Nuevo tamaño: {len(content)} bytes"
+            detalle=f"Nombre: {nombre or existe['nombre']}, Nuevo tamaño: {preparado.tamano} bytes"
         )
         return serialize({"data": actualizado, "message": "Documento actualizado con nuevo archivo."})
 
@@ -198,7 +401,7 @@ async def update(
     # Auditoría (solo metadatos)
     if actualizado and data:
         await log_action(
-            user_id=current_user["id"],
+            user_id=current_user.get("sub") or current_user.get("id"),
             accion="Actualizó documento (metadatos)",
             modulo="Documentos",
             entidad_id=id,
@@ -7,11 +7,14 @@ from models.documento import DocumentoModel
 from utils.serializer import serialize
 from utils.hoja_vida_pdf import generar_hoja_vida_pdf
 from utils.files import safe_filename
+from utils.pagination import decode_cursor, encode_cursor
+from utils.pdf_renderer import render_pdf
 from utils.audit import log_action
 from dependencies import get_current_user
 
-UPLOADS_DIR = os.getenv("UPLOADS_DIR", "uploads")
 TIPOS_CON_HV = {"Laptop", "Desktop", "All-in-one"}
+PAGE_SIZE_DEFAULT = int(os.getenv("API_PAGE_SIZE", "50"))
+PAGE_SIZE_MAX = int(os.getenv("API_MAX_PAGE_SIZE", "200"))
 
 router = APIRouter()
 
@@ -24,15 +27,11 @@ def _requiere_hoja_vida(equipo: dict, generar_hoja_vida: bool | None) -> bool:
 
 async def _generar_y_registrar_hoja_vida(equipo: dict) -> tuple[bytes, str]:
     historial = await EquipoModel.get_historial(equipo["id"])
-    pdf_bytes = generar_hoja_vida_pdf(dict(equipo), list(historial))
+    pdf_bytes = await render_pdf(generar_hoja_vida_pdf, dict(equipo), list(historial))
 
-    os.makedirs(UPLOADS_DIR, exist_ok=True)
     filename = safe_filename(f"hoja_vida_{equipo['placa']}.pdf", default="hoja_vida.pdf")
-    filepath = os.path.join(UPLOADS_DIR, filename)
-    with open(filepath, "wb") as f:
-        f.write(pdf_bytes)
-
-    file_url = f"/uploads/{filename}"
+    # Los bytes van solo al almacén de documentos (upsert_archivo)
+    file_url = f"blob://{filename}"
     existing = await DocumentoModel.find_all(tipo="Hoja de vida", equipo_id=equipo["id"])
     if not existing:
         doc = await DocumentoModel.create({
@@ -76,11 +75,14 @@ async def get_all(
     tipo: str = Query(""),
     es_rentado: str = Query(None),
     sede: str = Query(""),   
+    limit: int = Query(None, ge=1),
+    cursor: str = Query(None),
+    incluir_total: bool = Query(False),
 ):
     rentado_flag = None
     if es_rentado is not None:
         rentado_flag = es_rentado.lower() == "true"
-    equipos = await EquipoModel.find_all(
+    filtros = dict(
         busqueda=busqueda,
         estado=estado,
         criticidad=criticidad,
@@ -88,7 +90,30 @@ async def get_all(
         es_rentado=rentado_flag,
         sede=sede,
     )
-    return serialize({"data": equipos, "total": len(equipos)})
+
+    # Sin limit/cursor: listado completo (compatibilidad con el frontend actual)
+    if limit is None and cursor is None:
+        equipos = await EquipoModel.find_all(**filtros)
+        return serialize({"data": equipos, "total": len(equipos)})
+
+    limit = min(limit or PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX)
+    after = None
+    if cursor:
+        try:
+            after = tuple(decode_cursor(cursor, 2))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    equipos, hay_mas = await EquipoModel.find_page(limit, after, **filtros)
+    next_cursor = None
+    if hay_mas and equipos:
+        ultimo = equipos[-1]
+        next_cursor = encode_cursor(ultimo["fecha_registro"], ultimo["id"])
+
+    response = {"data": equipos, "limit": limit, "next_cursor": next_cursor, "has_more": hay_mas}
+    if incluir_total:
+        response["total"] = await EquipoModel.count(**filtros)
+    return serialize(response)
 
 @router.get("/{id}/historial")
 async def get_historial(id: str):
@@ -152,7 +177,7 @@ async def create(body: dict, current_user: dict = Depends(get_current_user)):
                     entidad_id=nuevo["id"],
                     detalle=f"Placa: {body['placa']}, Tipo: {body['tipo_equipo']}"
                 )
-            return serialize({"data": nuevo, "message": "Equipo rentado actualizado exitosamente."})
+            return serialize({"data": nuevo, "message": "Equipo rentado actualizado exitosamente."}, status_code=201)
 
         nuevo = await EquipoModel.create(body)
 
@@ -171,7 +196,7 @@ async def create(body: dict, current_user: dict = Depends(get_current_user)):
                 entidad_id=nuevo["id"],
                 detalle=f"Placa: {body['placa']}, Tipo: {body['tipo_equipo']}"
             )
-        return serialize({"data": nuevo, "message": "Equipo registrado exitosamente."})
+        return serialize({"data": nuevo, "message": "Equipo registrado exitosamente."}, status_code=201)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -4,33 +4,62 @@ POST /api/importar/{entidad}
 
 Entidades soportadas: equipos, usuarios, suministros, accesorios
 Respuesta: { total, insertados, errores: [{fila, campos, error}] }
+
+El archivo se lee en streaming: UploadFile ya lo vuelca a disco si es grande,
+el CSV se decodifica de forma incremental y el Excel se recorre con
+``iter_rows`` en modo read_only. Las filas pasan una a una por detección de
+cabeceras, normalización y alias hasta el insertor, sin listas intermedias.
+
+``bulk=true`` valida e inserta por bloques con executemany a medida que se
+leen las filas (ver utils/importacion.py).
+
+``on_conflict=error|skip|update`` decide qué hacer con placas (equipos) o
+correos (usuarios) que ya existen: se detectan con una consulta por bloque
+antes de insertar, también en la carga fila a fila por defecto. ``skip`` y
+``update`` usan siempre la carga por bloques.
+
+``background=true`` responde 202 con ``job_id`` y procesa la importación como
+trabajo en segundo plano:
+    GET /api/importar/jobs/{id}           estado, progreso y errores (paginados)
+    GET /api/importar/jobs/{id}/eventos   progreso por SSE (text/event-stream)
+    POST /api/importar/jobs/{id}/reanudar reintenta un trabajo terminado en error
+Las filas normalizadas se guardan en IMPORT_JOBS_DIR y el progreso (solo
+contadores) se confirma junto con cada bloque, así un trabajo interrumpido
+(reinicio del servidor) continúa desde el último bloque confirmado. Los
+errores se agregan a la tabla jobs_errores; el SSE solo relee contadores.
 """
+import asyncio
+import codecs
 import csv
 import io
+import itertools
+import json
 import os
 import re
-import uuid
 import unicodedata
+import uuid
 from pathlib import Path
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from models.equipo import EquipoModel
-from models.usuario import UsuarioModel
-from models.suministro import SuministroModel
-from models.accesorio import AccesorioModel
+from typing import Iterable, Iterator
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from models.documento import DocumentoModel
+from models.job import JobModel
 from utils.files import safe_filename
+from utils.importacion import (
+    CLAVES_UNICAS, IMPORT_CHUNK_SIZE, MODELOS, ON_CONFLICT, REQUIRED,
+    buscar_existentes, celda, convertir_fila, importar_bulk, mensaje_error,
+)
+from utils.indice_pdfs import IndicePdfs
+from utils.jobs import job_actual, job_queue
+from utils.serializer import dumps, serialize
 
 router = APIRouter()
 
 ENTIDADES = {"equipos", "usuarios", "suministros", "accesorios"}
 
-# ── Campos requeridos por entidad ──────────────────────────────────────────────
-REQUIRED: dict[str, list[str]] = {
-    "equipos":     ["placa", "tipo_equipo", "criticidad", "confidencialidad"],
-    "usuarios":    ["nombre", "cargo", "proceso", "grupo_asignado", "area"],
-    "suministros": ["nombre", "tipo"],
-    "accesorios":  ["nombre"],
-}
+IMPORT_JOBS_DIR = os.getenv("IMPORT_JOBS_DIR", "importaciones")
+IMPORT_SSE_INTERVAL = float(os.getenv("IMPORT_SSE_INTERVAL", "1"))
+_SSE_KEEPALIVE = 15  # segundos sin cambios antes de enviar un comentario ": ping"
 
 # ── Plantillas CSV (cabeceras) ─────────────────────────────────────────────────
 HEADERS: dict[str, list[str]] = {
@@ -57,16 +86,32 @@ HEADERS: dict[str, list[str]] = {
 }
 
 
-def _parse_csv(content: bytes) -> list[dict]:
-    # Excel puede guardar como UTF-8 (con BOM) o como ANSI (cp1252) según versión/configuración
+_BLOQUE_LECTURA = 1024 * 1024
+
+
+def _codificacion_csv(f) -> str:
+    """utf-8 (con o sin BOM) si todo el archivo decodifica; si no, cp1252."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    f.seek(0)
     try:
-        text = content.decode("utf-8-sig")  # utf-8-sig elimina el BOM de Excel
+        for bloque in iter(lambda: f.read(_BLOQUE_LECTURA), b""):
+            decoder.decode(bloque)
+        decoder.decode(b"", final=True)
+        return "utf-8-sig"  # utf-8-sig elimina el BOM de Excel
     except UnicodeDecodeError:
-        text = content.decode("cp1252")
-    text = text.strip()
+        return "cp1252"
+    finally:
+        f.seek(0)
+
+
+def _parse_csv(f) -> tuple[list, Iterator[list]]:
+    """Devuelve (cabeceras, iterador de filas) leyendo el archivo en streaming."""
+    # Excel puede guardar como UTF-8 (con BOM) o como ANSI (cp1252) según versión/configuración
+    text = io.TextIOWrapper(f, encoding=_codificacion_csv(f), newline="")
 
     # Excel (según configuración regional) puede exportar CSV con ';' en vez de ','
-    sample = text[:4096]
+    sample = text.read(4096).strip()
+    text.seek(0)
     delimiter = ","
     try:
         dialect = csv.Sniffer().sniff(sample, ",;\t|")
@@ -76,26 +121,30 @@ def _parse_csv(content: bytes) -> list[dict]:
         if ";" in sample and "," not in sample:
             delimiter = ";"
 
-    reader = csv.DictReader(io.StringIO(text), delimiter=delimiter)
-    return list(reader)
+    reader = csv.reader(text, delimiter=delimiter)
+    headers = next((r for r in reader if any(c.strip() for c in r)), [])
+    return headers, reader
 
 
-def _parse_xlsx(content: bytes) -> list[dict]:
-    """Parsea un .xlsx en memoria y devuelve lista de dicts (cabeceras tal cual)."""
+def _abrir_xlsx(f):
+    """Libro en modo read_only; quien lo abre lo cierra (``wb.close()``)."""
     try:
         from openpyxl import load_workbook
     except Exception as e:
         raise RuntimeError("openpyxl no está instalado. Instala openpyxl en el entorno.") from e
+    return load_workbook(filename=f, read_only=True, data_only=True)
+
 
-    wb = load_workbook(filename=io.BytesIO(content), read_only=True, data_only=True)
-    ws = wb.active
-    rows = list(ws.values)
-    if not rows:
-        return []
+def _parse_xlsx(wb) -> tuple[list, Iterator[tuple]]:
+    """Devuelve (cabeceras, iterador de filas) de un libro abierto con ``_abrir_xlsx``."""
+    rows = wb.active.iter_rows(values_only=True)
+    primeras = list(itertools.islice(rows, 20))
+    if not primeras:
+        return [], iter(())
 
     header_idx = None
     tokens = ('placa', 'serial', 'usuario', 'tipo', 'marca', 'modelo', 'referencia')
-    for i, row in enumerate(rows[:20]):
+    for i, row in enumerate(primeras):
         row_str = ' '.join([str(x).strip().lower() if x is not None else '' for x in row])
         if any(t in row_str for t in tokens):
             header_idx = i
@@ -104,25 +153,8 @@ def _parse_xlsx(content: bytes) -> list[dict]:
     if header_idx is None:
         header_idx = 0
 
-    headers = [str(h) if h is not None else "" for h in rows[header_idx]]
-    out = []
-    for row in rows[header_idx + 1:]:
-        d = {}
-        for i, h in enumerate(headers):
-            try:
-                val = row[i]
-            except Exception:
-                val = None
-            d[h] = val if val is not None else ""
-        out.append(d)
-    return out
-
-
-def _s(v) -> str:
-    """Convierte cualquier valor de celda a str limpio."""
-    if v is None:
-        return ""
-    return str(v).strip()
+    headers = [str(h) if h is not None else "" for h in primeras[header_idx]]
+    return headers, itertools.chain(primeras[header_idx + 1:], rows)
 
 
 def _normalize_header(h: str) -> str:
@@ -135,155 +167,429 @@ def _normalize_header(h: str) -> str:
     return s
 
 
-async def _insert_equipo(row: dict) -> dict | None:
-    row["es_rentado"] = _s(row.get("es_rentado", "0")).lower() in ("1", "true", "si", "sí")
-    data = {k: (_s(v) if _s(v) != "" else None) for k, v in row.items()}
-    data["es_rentado"] = row["es_rentado"]
-    return await EquipoModel.create(data)
+ALIASES = {
+    'placa': ['placa', 'codigo', 'codigo_activo'],
+    'serial': ['serial', 'sn', 'numero_serial'],
+    'tipo_equipo': ['tipo_equipo', 'tipo', 'torre', 'portatil', 'all_in_one'],
+    'criticidad': ['criticidad'],
+    'confidencialidad': ['confidencialidad', 'confidecialiad'],
+    'usuario_nombre': ['usuario_asignado', 'nombre', 'usuario'],
+    'area': ['area'],
+    'marca': ['marca'],
+    'modelo': ['modelo'],
+    'referencia': ['referencia', 'modelo'],
+}
 
 
-async def _insert_usuario(row: dict) -> None:
-    data = {k: (_s(v) if _s(v) != "" else None) for k, v in row.items()}
-    activo_raw = _s(data.get("activo") or "1").lower()
-    data["activo"] = activo_raw not in ("0", "false", "no")
-    await UsuarioModel.create(data)
+def _mapear_alias(headers_norm: list[str]) -> dict[str, str]:
+    mapping = {}
+    for canon, tokens in ALIASES.items():
+        if canon in headers_norm:
+            continue
+        for h in headers_norm:
+            for t in tokens:
+                if t in h:
+                    mapping[canon] = h
+                    break
+            if canon in mapping:
+                break
+    return mapping
 
 
-async def _insert_suministro(row: dict) -> None:
-    data = {k: (_s(v) if _s(v) != "" else None) for k, v in row.items()}
-    if data.get("cantidad") is not None:
-        data["cantidad"] = int(data["cantidad"])
-    if data.get("cantidad_minima") is not None:
-        data["cantidad_minima"] = int(data["cantidad_minima"])
-    if data.get("costo") is not None:
-        data["costo"] = float(data["costo"])
-    await SuministroModel.create(data)
+def _normalizar_filas(headers_norm: list[str], mapping: dict[str, str], rows: Iterable) -> Iterator[dict]:
+    """Convierte cada fila del archivo en dict con cabeceras normalizadas y alias aplicados."""
+    try:
+        for valores in rows:
+            row = {h: "" for h in headers_norm}
+            for h, v in zip(headers_norm, valores):
+                row[h] = celda(v)
+            for canon, src in mapping.items():
+                if canon not in row or not row.get(canon):
+                    row[canon] = row.get(src, '')
+            yield row
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Error al procesar el archivo: {e}")
 
 
-async def _insert_accesorio(row: dict) -> None:
-    data = {k: (_s(v) if _s(v) != "" else None) for k, v in row.items()}
-    if data.get("cantidad") is not None:
-        data["cantidad"] = int(data["cantidad"])
-    await AccesorioModel.create(data)
+async def _insertar_fila(entidad: str, row: dict) -> dict | None:
+    return await MODELOS[entidad].create(convertir_fila(entidad, row))
 
 
-INSERTERS = {
-    "equipos":     _insert_equipo,
-    "usuarios":    _insert_usuario,
-    "suministros": _insert_suministro,
-    "accesorios":  _insert_accesorio,
-}
+DOC_DIR = Path(__file__).resolve().parents[2] / 'Doc'
+
+
+async def _auto_adjuntar(fila: dict, equipo_id: str, indice: IndicePdfs) -> None:
+    """Busca en Doc/ un PDF del equipo importado y lo registra como Acta.
+
+    El PDF se copia al almacén de documentos (direccionado por contenido: el
+    mismo archivo queda una sola vez en disco). Cuando aparece en varias
+    filas, los documentos siguientes solo suman una referencia al primero.
+    """
+    try:
+        match = indice.buscar(fila)
+        if match:
+            digest = indice.sha256(match)
+            previa = indice.copias.get(digest)
+            if previa:
+                url, origen_id = previa
+            else:
+                base = safe_filename(match.stem, default='doc')
+                ext = match.suffix or '.pdf'
+                url = f"blob://{base}_{digest[:8]}{ext}"
+
+            # ✅ CORREGIDO: tipo era 'acta_entrega' (no existe en el enum).
+            #    Ahora es 'Acta', que sí aparece en filtros y métricas de
+            #    "equipos sin acta".
+            nuevo = await DocumentoModel.create({
+                'nombre': match.name,
+                'tipo': 'Acta',
+                'equipo_id': equipo_id,
+                'asignacion_id': None,
+                'usuario_id': None,
+                'url': url,
+                'version': 1,
+                'cargado_por': None,
+            })
+            if nuevo:
+                try:
+                    if previa:
+                        await DocumentoModel.copiar_archivo(origen_id, nuevo['id'])
+                    else:
+                        await DocumentoModel.upsert_archivo(
+                            nuevo['id'],
+                            filename=match.name,
+                            mime_type='application/pdf',
+                            contenido=match,
+                        )
+                        indice.copias[digest] = (url, nuevo['id'])
+                except Exception:
+                    pass
+    except Exception:
+        pass
+
+
+# ── Importación en segundo plano ──────────────────────────────────────────────
+
+def _ruta_spool(clave: str) -> Path:
+    return Path(IMPORT_JOBS_DIR) / f"{clave}.ndjson"
+
+
+def _leer_spool(clave: str):
+    with _ruta_spool(clave).open("r", encoding="utf-8") as f:
+        for linea in f:
+            if linea.strip():
+                item = json.loads(linea)
+                yield item["fila"], item["datos"]
+
+
+async def _encolar_importacion(entidad: str, filas: Iterable[dict], on_conflict: str) -> str:
+    clave = uuid.uuid4().hex
+    os.makedirs(IMPORT_JOBS_DIR, exist_ok=True)
+    total = 0
+    with _ruta_spool(clave).open("wb") as f:
+        for idx, fila in enumerate(filas, start=2):
+            f.write(dumps({"fila": idx, "datos": fila}) + b"\n")
+            total += 1
+    return await job_queue.encolar(
+        "importar", clave, {"entidad": entidad, "total": total, "on_conflict": on_conflict}
+    )
+
+
+async def _job_importar(clave: str, payload: dict) -> dict:
+    """Importa el archivo guardado por bloques, desde la última fila confirmada."""
+    job_id = job_actual.get()
+    entidad = payload["entidad"]
+    total = payload.get("total", 0)
+
+    job = await JobModel.find_by_id(job_id) if job_id else None
+    progreso = (job or {}).get("progreso")
+    if not isinstance(progreso, dict):
+        progreso = {"total": total}
+
+    async def guardar(cur, avance: dict, errores: list) -> None:
+        if job_id:
+            await JobModel.guardar_progreso(job_id, avance, errores, cur=cur)
+
+    indice = IndicePdfs(DOC_DIR) if entidad == "equipos" else None
+
+    async def adjuntar(creados: list) -> None:
+        for (_, fila, _), equipo_id in creados:
+            await _auto_adjuntar(fila, equipo_id, indice)
+
+    resultado = await importar_bulk(
+        entidad,
+        _leer_spool(clave),
+        on_conflict=payload.get("on_conflict", "error"),
+        progreso=progreso,
+        al_confirmar=guardar,
+        max_errores=0,  # los errores quedan en jobs_errores
+        despues_de_bloque=adjuntar if indice else None,
+    )
+    try:
+        _ruta_spool(clave).unlink()
+    except OSError:
+        pass
+    return {
+        "total":        total,
+        "insertados":   resultado["insertados"],
+        "actualizados": resultado["actualizados"],
+        "omitidos":     resultado["omitidos"],
+        "n_errores":    resultado["n_errores"],
+    }
+
+
+job_queue.registrar("importar", _job_importar, grupo="importacion")
+
+
+def _estado_importacion(job: dict) -> dict:
+    progreso = job.get("progreso") if isinstance(job.get("progreso"), dict) else {}
+    payload = job.get("payload") if isinstance(job.get("payload"), dict) else {}
+    total = progreso.get("total", payload.get("total", 0))
+    # Las filas de datos empiezan en la 2 (la 1 es la cabecera)
+    procesadas = max(progreso.get("fila", 1) - 1, 0)
+    return {
+        "id":           job["id"],
+        "entidad":      payload.get("entidad"),
+        "estado":       job["estado"],
+        "total":        total,
+        "procesadas":   procesadas,
+        "insertados":   progreso.get("insertados", 0),
+        "actualizados": progreso.get("actualizados", 0),
+        "omitidos":     progreso.get("omitidos", 0),
+        "n_errores":    progreso.get("n_errores", len(progreso.get("errores", []))),
+        "error":        job.get("error"),
+        "created_at":   job.get("created_at"),
+        "started_at":   job.get("started_at"),
+        "finished_at":  job.get("finished_at"),
+    }
+
+
+async def _job_importacion(id: str) -> dict:
+    job = await JobModel.find_by_id(id)
+    if not job or job.get("tipo") != "importar":
+        raise HTTPException(status_code=404, detail="Importación no encontrada.")
+    return job
+
+
+@router.get("/jobs/{id}")
+async def get_job_importacion(
+    id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
+    job = await _job_importacion(id)
+    data = _estado_importacion(job)
+    progreso = job.get("progreso") if isinstance(job.get("progreso"), dict) else {}
+    if "errores" in progreso:
+        # Trabajo guardado antes de jobs_errores: la lista vive en el progreso
+        data["errores"] = sorted(progreso["errores"], key=lambda e: e["fila"])[offset:offset + limit]
+    else:
+        data["errores"] = await JobModel.find_errores(id, limit, offset)
+    return serialize({"data": data, "limit": limit, "offset": offset})
+
+
+@router.get("/jobs/{id}/eventos")
+async def eventos_job_importacion(id: str, request: Request):
+    """Progreso por Server-Sent Events: un evento ``progreso`` por cambio y ``fin`` al terminar.
+
+    EventSource no permite enviar Authorization: el front lo consume con fetch.
+    """
+    await _job_importacion(id)
+
+    async def eventos():
+        anterior = None
+        sin_cambios = 0.0
+        while not await request.is_disconnected():
+            job = await JobModel.find_by_id(id)
+            if not job:
+                break
+            estado = _estado_importacion(job)
+            if estado != anterior:
+                yield b"event: progreso\ndata: " + dumps(estado) + b"\n\n"
+                anterior, sin_cambios = estado, 0.0
+            elif sin_cambios >= _SSE_KEEPALIVE:
+                yield b": ping\n\n"
+                sin_cambios = 0.0
+            if job["estado"] in ("completado", "error"):
+                yield b"event: fin\ndata: " + dumps(estado) + b"\n\n"
+                break
+            await asyncio.sleep(IMPORT_SSE_INTERVAL)
+            sin_cambios += IMPORT_SSE_INTERVAL
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/jobs/{id}/reanudar")
+async def reanudar_job_importacion(id: str):
+    job = await _job_importacion(id)
+    if not _ruta_spool(job["clave"]).exists():
+        raise HTTPException(status_code=409, detail="El archivo de la importación ya no está disponible.")
+    if not await JobModel.reintentar(id):
+        raise HTTPException(status_code=409, detail="Solo se pueden reanudar importaciones terminadas con error.")
+    await job_queue.reencolar(id, job["tipo"], job["clave"])
+    return serialize({"data": _estado_importacion(await JobModel.find_by_id(id))}, status_code=202)
 
 
 # ── Endpoint principal ────────────────────────────────────────────────────────
 
 @router.post("/{entidad}")
-async def importar_csv(entidad: str, archivo: UploadFile = File(...), dry_run: bool = False):
+async def importar_csv(
+    entidad: str,
+    archivo: UploadFile = File(...),
+    dry_run: bool = False,
+    bulk: bool = False,
+    background: bool = False,
+    on_conflict: str = "error",
+):
     if entidad not in ENTIDADES:
         raise HTTPException(
             status_code=400,
             detail=f"Entidad no soportada. Usa: {', '.join(sorted(ENTIDADES))}.",
         )
+    if on_conflict not in ON_CONFLICT:
+        raise HTTPException(
+            status_code=400,
+            detail=f"on_conflict no válido. Usa: {', '.join(ON_CONFLICT)}.",
+        )
 
     filename = (archivo.filename or "").lower()
 
-    content = await archivo.read()
-    if not content:
+    # UploadFile es un SpooledTemporaryFile: se lee desde disco sin cargarlo entero
+    f = archivo.file
+    f.seek(0, os.SEEK_END)
+    if f.tell() == 0:
         raise HTTPException(status_code=400, detail="El archivo está vacío.")
+    f.seek(0)
 
-    filas = []
+    libro = None
     try:
-        if filename.endswith(".csv"):
-            filas = _parse_csv(content)
-        elif filename.endswith(".xlsx") or filename.endswith(".xlsm"):
-            try:
-                filas = _parse_xlsx(content)
-            except Exception as e:
-                raise HTTPException(status_code=422, detail=f"Error al leer el Excel: {e}")
-        else:
-            raise HTTPException(status_code=400, detail="Solo se aceptan archivos .csv o .xlsx")
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=422, detail=f"Error al procesar el archivo: {e}")
+        try:
+            if filename.endswith(".csv"):
+                headers, rows = _parse_csv(f)
+            elif filename.endswith(".xlsx") or filename.endswith(".xlsm"):
+                try:
+                    libro = _abrir_xlsx(f)
+                    headers, rows = _parse_xlsx(libro)
+                except Exception as e:
+                    raise HTTPException(status_code=422, detail=f"Error al leer el Excel: {e}")
+            else:
+                raise HTTPException(status_code=400, detail="Solo se aceptan archivos .csv o .xlsx")
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=422, detail=f"Error al procesar el archivo: {e}")
+
+        return await _importar_filas(
+            entidad, headers, rows,
+            dry_run=dry_run, bulk=bulk, background=background, on_conflict=on_conflict,
+        )
+    finally:
+        # También en los 422: el libro read_only mantiene el archivo abierto
+        if libro is not None:
+            libro.close()
 
-    if not filas:
-        raise HTTPException(status_code=422, detail="El CSV no contiene filas de datos.")
 
+async def _importar_filas(
+    entidad: str, headers: list, rows: Iterable, *,
+    dry_run: bool, bulk: bool, background: bool, on_conflict: str,
+):
     try:
-        filas_normalizadas = []
-        for f in filas:
-            normed = { _normalize_header(k): _s(v) for k, v in f.items() }
-            filas_normalizadas.append(normed)
+        headers_norm = [_normalize_header(h) for h in headers]
     except Exception as e:
         raise HTTPException(status_code=422, detail=f"Error al normalizar cabeceras: {e}")
 
-    mapping = {}
-    if filas_normalizadas:
-        headers_norm = list(filas_normalizadas[0].keys())
-        ALIASES = {
-            'placa': ['placa', 'codigo', 'codigo_activo'],
-            'serial': ['serial', 'sn', 'numero_serial'],
-            'tipo_equipo': ['tipo_equipo', 'tipo', 'torre', 'portatil', 'all_in_one'],
-            'criticidad': ['criticidad'],
-            'confidencialidad': ['confidencialidad', 'confidecialiad'],
-            'usuario_nombre': ['usuario_asignado', 'nombre', 'usuario'],
-            'area': ['area'],
-            'marca': ['marca'],
-            'modelo': ['modelo'],
-            'referencia': ['referencia', 'modelo'],
-        }
-
-        mapping = {}
-        for canon, tokens in ALIASES.items():
-            if canon in headers_norm:
-                continue
-            for h in headers_norm:
-                for t in tokens:
-                    if t in h:
-                        mapping[canon] = h
-                        break
-                if canon in mapping:
-                    break
-
-        if mapping:
-            for row in filas_normalizadas:
-                for canon, src in mapping.items():
-                    if canon not in row or not row.get(canon):
-                        row[canon] = row.get(src, '')
+    mapping = _mapear_alias(headers_norm)
+    filas = _normalizar_filas(headers_norm, mapping, rows)
+    primera = next(filas, None)
+    if primera is None:
+        raise HTTPException(status_code=422, detail="El CSV no contiene filas de datos.")
+    filas = itertools.chain([primera], filas)
 
-    columnas_csv = set(filas_normalizadas[0].keys())
+    columnas_csv = set(headers_norm) | set(mapping)
     faltantes = [c for c in REQUIRED[entidad] if c not in columnas_csv]
-    if faltantes:
-        if dry_run:
-            sample = filas_normalizadas[:20]
-            return {
-                "total": len(filas_normalizadas),
-                "preview": sample,
-                "mapping": mapping,
-                "missing_columns": faltantes,
-            }
+    if faltantes and not dry_run:
         raise HTTPException(
             status_code=422,
             detail=f"El CSV no tiene las columnas requeridas: {', '.join(faltantes)}. "
                    f"Descarga la plantilla para ver el formato correcto.",
         )
 
-    inserter = INSERTERS[entidad]
-    insertados = 0
-    errores: list[dict] = []
-
     if dry_run:
-        sample = filas_normalizadas[:20]
+        sample = list(itertools.islice(filas, 20))
         return {
-            "total": len(filas_normalizadas),
+            "total": len(sample) + sum(1 for _ in filas),
             "preview": sample,
             "mapping": mapping,
-            "missing_columns": [],
+            "missing_columns": faltantes,
         }
 
-    for idx, fila in enumerate(filas_normalizadas, start=2):
-        if all(_s(v) == "" for v in fila.values()):
+    if background:
+        job_id = await _encolar_importacion(entidad, filas, on_conflict)
+        return serialize({"data": {"job_id": job_id, "estado": "pendiente"}}, status_code=202)
+
+    # Doc/ se indexa una sola vez por importación (no un rglob por fila)
+    indice = IndicePdfs(DOC_DIR) if entidad == 'equipos' else None
+
+    if bulk or on_conflict != "error":
+        async def adjuntar(creados: list) -> None:
+            for (_, fila, _), equipo_id in creados:
+                await _auto_adjuntar(fila, equipo_id, indice)
+
+        resultado = await importar_bulk(
+            entidad,
+            enumerate(filas, start=2),
+            on_conflict=on_conflict,
+            despues_de_bloque=adjuntar if indice else None,
+        )
+        return {
+            "total":        resultado["fila"] - 1,
+            "insertados":   resultado["insertados"],
+            "actualizados": resultado["actualizados"],
+            "omitidos":     resultado["omitidos"],
+            "n_errores":    resultado["n_errores"],
+            # Muestra acotada (IMPORT_MAX_ERRORES); la lista completa, con background=true
+            "errores":      resultado["errores"],
+        }
+
+    insertados = 0
+    errores: list[dict] = []
+    total = 0
+    clave = CLAVES_UNICAS.get(entidad)
+
+    async def insertar(bloque: list) -> None:
+        nonlocal insertados
+        # Una consulta IN por bloque en vez de un INSERT fallido por cada duplicado
+        existentes = await buscar_existentes(entidad, bloque)
+        for idx, fila, data in bloque:
+            k = (data.get(clave) or "").lower() if clave else ""
+            if k and k in existentes:
+                errores.append({
+                    "fila": idx,
+                    "campos": dict(fila),
+                    "error": f"Registro duplicado: {clave} ya existe",
+                })
+                continue
+            try:
+                created = await MODELOS[entidad].create(data)
+                insertados += 1
+                if k and created:
+                    existentes[k] = created.get("id")  # repetida más abajo en el archivo
+
+                # Auto-attach: si estamos importando equipos, buscar PDFs en Doc/ y registrar
+                if indice and created:
+                    await _auto_adjuntar(fila, created.get('id'), indice)
+
+            except Exception as e:
+                errores.append({"fila": idx, "campos": dict(fila), "error": mensaje_error(e)})
+
+    bloque: list = []
+    for idx, fila in enumerate(filas, start=2):
+        total += 1
+        if all(celda(v) == "" for v in fila.values()):
             continue
         vacios = [c for c in REQUIRED[entidad] if not str(fila.get(c, "")).strip()]
         if vacios:
@@ -294,84 +600,21 @@ async def importar_csv(entidad: str, archivo: UploadFile = File(...), dry_run: b
             })
             continue
         try:
-            created = await inserter(fila)
-            insertados += 1
-
-            # Auto-attach: si estamos importando equipos, buscar PDFs en Doc/ y registrar
-            if entidad == 'equipos' and created:
-                try:
-                    doc_dir = Path(__file__).resolve().parents[2] / 'Doc'
-                    placa = (fila.get('placa') or '').strip()
-                    usuario = (fila.get('usuario_nombre') or fila.get('nombre') or '').strip()
-
-                    def find_match():
-                        for v in fila.values():
-                            if not v:
-                                continue
-                            s = str(v).strip()
-                            if s.lower().endswith('.pdf'):
-                                p = doc_dir / s
-                                if p.exists():
-                                    return p
-                        if placa:
-                            for p in doc_dir.rglob('*.pdf'):
-                                if placa.lower() in p.name.lower():
-                                    return p
-                        if usuario:
-                            tokens = [t for t in re.split(r"\s+", usuario) if t]
-                            for p in doc_dir.rglob('*.pdf'):
-                                name = p.name.lower()
-                                if any(tok.lower() in name for tok in tokens):
-                                    return p
-                        return None
-
-                    match = find_match()
-                    if match:
-                        file_content = match.read_bytes()
-                        UPLOADS_DIR = os.getenv('UPLOADS_DIR', 'uploads')
-                        os.makedirs(UPLOADS_DIR, exist_ok=True)
-                        base = safe_filename(match.stem, default='doc')
-                        ext = match.suffix or '.pdf'
-                        new_name = f"{base}_{uuid.uuid4().hex[:8]}{ext}"
-                        dest = Path(UPLOADS_DIR) / new_name
-                        dest.write_bytes(file_content)
-
-                        # ✅ CORREGIDO: tipo era 'acta_entrega' (no existe en el enum).
-                        #    Ahora es 'Acta', que sí aparece en filtros y métricas de
-                        #    "equipos sin acta".
-                        nuevo = await DocumentoModel.create({
-                            'nombre': match.name,
-                            'tipo': 'Acta',
-                            'equipo_id': created.get('id'),
-                            'asignacion_id': None,
-                            'usuario_id': None,
-                            'url': f"/uploads/{new_name}",
-                            'version': 1,
-                            'cargado_por': None,
-                        })
-                        if nuevo:
-                            try:
-                                await DocumentoModel.upsert_archivo(
-                                    nuevo['id'],
-                                    filename=match.name,
-                                    mime_type='application/pdf',
-                                    contenido=file_content,
-                                )
-                            except Exception:
-                                pass
-                except Exception:
-                    pass
-
-        except Exception as e:
-            msg = str(e)
-            if "Duplicate entry" in msg or "1062" in msg:
-                msg = "Registro duplicado (placa o correo ya existe)"
-            errores.append({"fila": idx, "campos": dict(fila), "error": msg})
+            data = convertir_fila(entidad, fila)
+        except ValueError as e:
+            errores.append({"fila": idx, "campos": dict(fila), "error": str(e)})
+            continue
+        bloque.append((idx, fila, data))
+        if len(bloque) >= IMPORT_CHUNK_SIZE:
+            await insertar(bloque)
+            bloque = []
+    if bloque:
+        await insertar(bloque)
 
     return {
-        "total":      len(filas),
+        "total":      total,
         "insertados": insertados,
-        "errores":    errores,
+        "errores":    sorted(errores, key=lambda e: e["fila"]),
     }
 
 
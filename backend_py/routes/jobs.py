@@ -0,0 +1,14 @@
+from fastapi import APIRouter, HTTPException
+from models.job import JobModel
+from utils.serializer import serialize
+
+router = APIRouter()
+
+
+@router.get("/{id}")
+async def get_by_id(id: str):
+    job = await JobModel.find_by_id(id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado.")
+    job.pop("payload", None)
+    return serialize({"data": job})
@@ -33,7 +33,7 @@ async def create(body: dict, current_user: dict = Depends(get_current_user)):
         detalle=f"Nombre: {body['nombre']}, Cantidad total: {body.get('cantidad_total', 1)}"
     )
 
-    return serialize({"data": nuevo, "message": "Licencia registrada exitosamente."})
+    return serialize({"data": nuevo, "message": "Licencia registrada exitosamente."}, status_code=201)
 
 @router.put("/{id}")
 async def update(id: str, body: dict, current_user: dict = Depends(get_current_user)):
@@ -103,7 +103,7 @@ async def crear_asignacion(licencia_id: str, body: dict, current_user: dict = De
         detalle=f"Licencia ID: {licencia_id}, Serial: {body.get('serial', 'N/A')}, Usuario: {body.get('usuario', 'N/A')}, Equipo: {body.get('equipo_id', 'N/A')}"
     )
 
-    return serialize({"data": nueva, "message": "Licencia asignada exitosamente."})
+    return serialize({"data": nueva, "message": "Licencia asignada exitosamente."}, status_code=201)
 
 @router.put("/asignaciones/{id}")
 async def actualizar_asignacion(id: str, body: dict, current_user: dict = Depends(get_current_user)):
@@ -32,7 +32,7 @@ async def agregar_mantenimiento(
         detalle=f"Tipo: {body['tipo']}, Fecha: {body['fecha']}"
     )
     
-    return serialize({"data": nuevo, "message": "Mantenimiento registrado"})
+    return serialize({"data": nuevo, "message": "Mantenimiento registrado"}, status_code=201)
 
 @router.get("/equipos/{equipo_id}/mantenimientos")
 async def obtener_mantenimientos(
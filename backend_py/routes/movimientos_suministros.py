@@ -1,5 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from collections import defaultdict
 from datetime import datetime
+import asyncio
+import logging
+import tempfile
 import uuid
 import os
 import csv
@@ -10,13 +16,193 @@ from utils.audit import log_action
 from utils.serializer import serialize
 from models.suministro import SuministroModel
 from utils.email_service import send_email, render_template
+from utils.streaming import iter_lotes
+from utils.saldos_suministros import aplicar_efecto, aplicar_efectos, efecto, saldo_al, verificar_saldos
 
 router = APIRouter()
+logger = logging.getLogger("itam.suministros")
 
 # ──────────────────────────────────────────────────────────────────────────────
 # FUNCIONES AUXILIARES
 # ──────────────────────────────────────────────────────────────────────────────
 
+# Movimientos por sentencia en el endpoint de lote (una ida y vuelta por bloque)
+LOTE_MOVIMIENTOS = int(os.getenv("SUMINISTROS_LOTE_MOVIMIENTOS", "500"))
+MAX_MOVIMIENTOS_LOTE = 5000
+
+
+class _StockInsuficiente(Exception):
+    def __init__(self, requerido: dict[str, int]):
+        self.requerido = requerido
+
+
+async def _aplicar_bloque(
+    cur, bloque: list[dict], movimiento_ids: list[str], ahora=None,
+) -> tuple[list[dict], dict[str, dict], object]:
+    """Aplica un bloque de movimientos dentro de la transacción abierta en ``cur``.
+
+    El stock se descuenta con un único UPDATE condicional para todos los
+    suministros del bloque: ``requerido`` es el mayor faltante acumulado
+    recorriendo los movimientos en orden, así una salida no se cubre con una
+    entrada que viene después. Si alguno no alcanza, no se toca ninguno y se
+    lanza ``_StockInsuficiente``. La fila queda bloqueada hasta el commit, así
+    que dos salidas concurrentes no pierden actualizaciones.
+
+    ``movimiento_ids`` trae un id por movimiento, ya ordenados: todos comparten
+    ``fecha`` y el kárdex ordena por ``(fecha, id)``.
+    """
+    netos: dict[str, int] = defaultdict(int)
+    requerido: dict[str, int] = defaultdict(int)
+    for m in bloque:
+        sid = m["suministro_id"]
+        netos[sid] += efecto(m["tipo"], m["cantidad"])
+        requerido[sid] = max(requerido[sid], -netos[sid])
+    ids = list(netos)
+    marcas = ", ".join(["%s"] * len(ids))
+
+    # Un UPDATE con neto 0 no cambia la fila y no contaría en rowcount: esos
+    # (salida y entrada que se compensan) se verifican aparte con FOR UPDATE
+    cambian = [sid for sid in ids if netos[sid]]
+    verificar = [sid for sid in ids if not netos[sid] and requerido[sid]]
+    insuficiente = _StockInsuficiente({sid: requerido[sid] for sid in cambian + verificar})
+    if verificar:
+        caso = "CASE id " + "WHEN %s THEN %s " * len(verificar) + "END"
+        await cur.execute(
+            f"""SELECT COUNT(*) AS n FROM suministros
+                WHERE id IN ({", ".join(["%s"] * len(verificar))}) AND cantidad >= {caso}
+                FOR UPDATE""",
+            verificar + [x for sid in verificar for x in (sid, requerido[sid])],
+        )
+        if (await cur.fetchone())["n"] != len(verificar):
+            raise insuficiente
+    if cambian:
+        caso = "CASE id " + "WHEN %s THEN %s " * len(cambian) + "END"
+        await cur.execute(
+            f"""UPDATE suministros SET cantidad = cantidad + {caso}
+                WHERE id IN ({", ".join(["%s"] * len(cambian))})
+                  AND ({caso} = 0 OR cantidad >= {caso})""",
+            [x for sid in cambian for x in (sid, netos[sid])]
+            + cambian
+            + [x for sid in cambian for x in (sid, requerido[sid])] * 2,
+        )
+        if cur.rowcount != len(cambian):
+            raise insuficiente
+
+    await cur.execute(
+        f"""SELECT id, nombre, cantidad, cantidad_minima, NOW() AS ahora
+            FROM suministros WHERE id IN ({marcas})""",
+        ids,
+    )
+    stock = {row["id"]: row for row in await cur.fetchall()}
+    if len(stock) != len(ids):
+        faltan = [sid for sid in ids if sid not in stock]
+        raise ValueError(f"Suministro no encontrado: {', '.join(faltan)}")
+    if ahora is None:
+        ahora = next(iter(stock.values()))["ahora"]
+
+    # Stock tras cada movimiento, partiendo del previo al bloque
+    corriente = {sid: stock[sid]["cantidad"] - netos[sid] for sid in ids}
+    filas, resultados = [], []
+    for m, movimiento_id in zip(bloque, movimiento_ids):
+        sid = m["suministro_id"]
+        corriente[sid] += efecto(m["tipo"], m["cantidad"])
+        filas.append((
+            movimiento_id, sid, m["tipo"], m["cantidad"], m["usuario_sistema_id"],
+            m.get("solicitante_id"), m.get("area_solicitante"), m["motivo"],
+            m.get("comprobante"), m.get("observaciones"), ahora,
+        ))
+        resultados.append({
+            "id": movimiento_id,
+            "suministro_id": sid,
+            "tipo": m["tipo"],
+            "cantidad": m["cantidad"],
+            "nuevo_stock": corriente[sid],
+            "fecha": ahora.isoformat() if isinstance(ahora, datetime) else ahora,
+        })
+    await cur.executemany(
+        """INSERT INTO movimientos_suministros
+           (id, suministro_id, tipo_movimiento, cantidad, usuario_sistema_id,
+            solicitante_id, area_solicitante, motivo, comprobante, observaciones, fecha)
+           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+        filas,
+    )
+    await aplicar_efectos(cur, ahora, netos)
+    return resultados, stock, ahora
+
+
+async def _mensaje_stock_insuficiente(cur, requerido: dict[str, int]) -> str:
+    ids = list(requerido)
+    await cur.execute(
+        f"SELECT id, nombre, cantidad FROM suministros WHERE id IN ({', '.join(['%s'] * len(ids))})",
+        ids,
+    )
+    stock = {row["id"]: row for row in await cur.fetchall()}
+    faltan = [sid for sid in ids if sid not in stock]
+    if faltan:
+        return f"Suministro no encontrado: {', '.join(faltan)}"
+    if len(ids) == 1:
+        row = stock[ids[0]]
+        return f"Stock insuficiente. Disponible: {row['cantidad']}, solicitado: {requerido[ids[0]]}"
+    detalle = "; ".join(
+        f"{stock[sid]['nombre']} (disponible: {stock[sid]['cantidad']}, solicitado: {requerido[sid]})"
+        for sid in ids if stock[sid]["cantidad"] < requerido[sid]
+    )
+    return f"Stock insuficiente: {detalle}"
+
+
+def _alertar_stock_bajo(nombre: str, stock_actual: int, cantidad_minima: int) -> None:
+    # ⚠️ ALERTA DE STOCK BAJO (asíncrona, no bloquea)
+    html = render_template("stock_bajo", {
+        "nombre": nombre,
+        "stock_actual": stock_actual,
+        "stock_minimo": cantidad_minima
+    })
+    asyncio.create_task(send_email(
+        to=os.getenv("RESEND_ALERT_EMAIL", "admin@localhost"),
+        subject=f"⚠️ Stock bajo: {nombre}",
+        html=html
+    ))
+
+
+async def registrar_movimientos(movimientos: list[dict]) -> list[dict]:
+    """Registra varios movimientos en una sola transacción (todo o nada).
+
+    Cada movimiento es un dict con ``suministro_id``, ``tipo``, ``cantidad``,
+    ``usuario_sistema_id``, ``motivo`` y opcionales ``solicitante_id``,
+    ``area_solicitante``, ``comprobante``, ``observaciones``. Todos comparten
+    la misma fecha; sus ids se generan ordenados para que el kárdex los
+    muestre en el orden recibido. Lanza ``ValueError`` si falta stock o un
+    suministro.
+    """
+    resultados, stock_final = [], {}
+    movimiento_ids = sorted(str(uuid.uuid4()) for _ in movimientos)
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await conn.begin()
+            try:
+                ahora = None
+                for i in range(0, len(movimientos), LOTE_MOVIMIENTOS):
+                    fin = i + LOTE_MOVIMIENTOS
+                    bloque, stock, ahora = await _aplicar_bloque(
+                        cur, movimientos[i:fin], movimiento_ids[i:fin], ahora
+                    )
+                    resultados.extend(bloque)
+                    stock_final.update(stock)
+                await conn.commit()
+            except _StockInsuficiente as e:
+                await conn.rollback()
+                raise ValueError(await _mensaje_stock_insuficiente(cur, e.requerido))
+            except Exception:
+                await conn.rollback()
+                raise
+
+    for row in stock_final.values():
+        if row["cantidad"] <= row["cantidad_minima"]:
+            _alertar_stock_bajo(row["nombre"], row["cantidad"], row["cantidad_minima"])
+    return resultados
+
+
 async def registrar_movimiento(
     suministro_id: str,
     tipo: str,
@@ -30,64 +216,76 @@ async def registrar_movimiento(
 ) -> dict:
     if cantidad <= 0:
         raise ValueError("La cantidad debe ser positiva")
-    
+    [movimiento] = await registrar_movimientos([{
+        "suministro_id": suministro_id,
+        "tipo": tipo,
+        "cantidad": cantidad,
+        "usuario_sistema_id": usuario_sistema_id,
+        "motivo": motivo,
+        "solicitante_id": solicitante_id,
+        "area_solicitante": area_solicitante,
+        "comprobante": comprobante,
+        "observaciones": observaciones,
+    }])
+    return movimiento
+
+
+# Saldo acumulado con función de ventana: se calcula en la subconsulta y luego se
+# pagina, así el saldo de cada fila es el real aunque la página no empiece en el
+# origen. Con fecha_desde la ventana arranca en esa fecha y suma el saldo de
+# apertura (snapshot del día anterior + delta), sin recorrer el historial previo.
+_SQL_KARDEX = """
+    SELECT
+        k.id,
+        k.suministro_id,
+        k.tipo_movimiento,
+        k.cantidad,
+        DATE_FORMAT(k.fecha, '%%Y-%%m-%%dT%%H:%%i:%%s') as fecha,
+        u.username as usuario_nombre,
+        u.nombre as usuario_sistema_nombre,
+        s.nombre as solicitante_nombre,
+        k.area_solicitante,
+        k.motivo,
+        k.comprobante,
+        k.observaciones,
+        k.saldo_parcial,
+        COUNT(*) OVER () as total_filas
+    FROM (
+        SELECT m.*,
+               %s + CAST(SUM(CASE WHEN m.tipo_movimiento = 'entrada' THEN m.cantidad ELSE -m.cantidad END)
+                         OVER (ORDER BY m.fecha, m.id) AS SIGNED) as saldo_parcial
+        FROM movimientos_suministros m
+        WHERE m.suministro_id = %s{desde}
+    ) k
+    LEFT JOIN usuarios_sistema u ON k.usuario_sistema_id = u.id
+    LEFT JOIN solicitantes s ON k.solicitante_id = s.id
+    WHERE 1=1
+"""
+
+
+def _filtro_fechas(fecha_desde: str = None, fecha_hasta: str = None, alias: str = "k") -> tuple[str, list]:
+    # Rango sobre la columna (usa el índice) en vez de DATE(fecha)
+    sql, params = "", []
+    if fecha_desde:
+        sql += f" AND {alias}.fecha >= %s"
+        params.append(fecha_desde)
+    if fecha_hasta:
+        sql += f" AND {alias}.fecha < DATE_ADD(%s, INTERVAL 1 DAY)"
+        params.append(fecha_hasta)
+    return sql, params
+
+
+async def contar_movimientos(suministro_id: str, fecha_desde: str = None, fecha_hasta: str = None) -> int:
+    filtro, params = _filtro_fechas(fecha_desde, fecha_hasta, alias="m")
     pool = await get_pool()
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
-            # Obtener stock actual, cantidad mínima y nombre
             await cur.execute(
-                "SELECT cantidad, cantidad_minima, nombre FROM suministros WHERE id = %s",
-                (suministro_id,)
+                f"SELECT COUNT(*) as total FROM movimientos_suministros m WHERE m.suministro_id = %s{filtro}",
+                [suministro_id, *params],
             )
             row = await cur.fetchone()
-            if not row:
-                raise ValueError("Suministro no encontrado")
-            stock_actual = row["cantidad"]
-            cantidad_minima = row["cantidad_minima"]
-            nombre_suministro = row["nombre"]
-            
-            if tipo == "salida" and stock_actual < cantidad:
-                raise ValueError(f"Stock insuficiente. Disponible: {stock_actual}, solicitado: {cantidad}")
-            
-            nuevo_stock = stock_actual + cantidad if tipo == "entrada" else stock_actual - cantidad
-            
-            movimiento_id = str(uuid.uuid4())
-            await cur.execute(
-                """INSERT INTO movimientos_suministros
-                   (id, suministro_id, tipo_movimiento, cantidad, usuario_sistema_id,
-                    solicitante_id, area_solicitante, motivo, comprobante, observaciones, fecha)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())""",
-                (movimiento_id, suministro_id, tipo, cantidad, usuario_sistema_id,
-                 solicitante_id, area_solicitante, motivo, comprobante, observaciones)
-            )
-            
-            await cur.execute(
-                "UPDATE suministros SET cantidad = %s WHERE id = %s",
-                (nuevo_stock, suministro_id)
-            )
-    
-    # ⚠️ ALERTA DE STOCK BAJO (asíncrona, no bloquea)
-    if nuevo_stock <= cantidad_minima:
-        import asyncio
-        html = render_template("stock_bajo", {
-            "nombre": nombre_suministro,
-            "stock_actual": nuevo_stock,
-            "stock_minimo": cantidad_minima
-        })
-        asyncio.create_task(send_email(
-            to=os.getenv("RESEND_ALERT_EMAIL", "admin@localhost"),
-            subject=f"⚠️ Stock bajo: {nombre_suministro}",
-            html=html
-        ))
-    
-    return {
-        "id": movimiento_id,
-        "suministro_id": suministro_id,
-        "tipo": tipo,
-        "cantidad": cantidad,
-        "nuevo_stock": nuevo_stock,
-        "fecha": datetime.now().isoformat()
-    }
+            return row["total"] if row else 0
 
 
 async def obtener_movimientos(
@@ -95,125 +293,244 @@ async def obtener_movimientos(
     limit: int = 100,
     offset: int = 0,
     fecha_desde: str = None,
-    fecha_hasta: str = None
-) -> list:
+    fecha_hasta: str = None,
+    orden: str = "DESC",
+) -> tuple[list, int]:
+    """Página de movimientos con ``saldo_parcial`` en una sola consulta. Devuelve (filas, total)."""
+    orden = "ASC" if orden.upper() == "ASC" else "DESC"
+    desde, params_desde = _filtro_fechas(fecha_desde, alias="m")
+    filtro, params = _filtro_fechas(fecha_hasta=fecha_hasta)
+    sql = (
+        _SQL_KARDEX.format(desde=desde)
+        + f"{filtro} ORDER BY k.fecha {orden}, k.id {orden} LIMIT %s OFFSET %s"
+    )
     pool = await get_pool()
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
-            sql = """
-                SELECT 
-                    m.id,
-                    m.suministro_id,
-                    m.tipo_movimiento,
-                    m.cantidad,
-                    DATE_FORMAT(m.fecha, '%%Y-%%m-%%dT%%H:%%i:%%s') as fecha,
-                    u.username as usuario_nombre,
-                    u.nombre as usuario_sistema_nombre,
-                    s.nombre as solicitante_nombre,
-                    m.area_solicitante,
-                    m.motivo,
-                    m.comprobante,
-                    m.observaciones
-                FROM movimientos_suministros m
-                LEFT JOIN usuarios_sistema u ON m.usuario_sistema_id = u.id
-                LEFT JOIN solicitantes s ON m.solicitante_id = s.id
-                WHERE m.suministro_id = %s
-            """
-            params = [suministro_id]
-            if fecha_desde:
-                sql += " AND DATE(m.fecha) >= %s"
-                params.append(fecha_desde)
-            if fecha_hasta:
-                sql += " AND DATE(m.fecha) <= %s"
-                params.append(fecha_hasta)
-            sql += " ORDER BY m.fecha DESC LIMIT %s OFFSET %s"
-            params.extend([limit, offset])
-            await cur.execute(sql, params)
+            apertura = await saldo_al(cur, suministro_id, fecha_desde) if fecha_desde else 0
+            await cur.execute(sql, [apertura, suministro_id, *params_desde, *params, limit, offset])
             rows = await cur.fetchall()
-            for row in rows:
-                for key, value in row.items():
-                    if isinstance(value, datetime):
-                        row[key] = value.isoformat()
-            return rows
+    total = rows[0]["total_filas"] if rows else 0
+    for row in rows:
+        row.pop("total_filas", None)
+        for key, value in row.items():
+            if isinstance(value, datetime):
+                row[key] = value.isoformat()
+    if not rows and offset:
+        # Página fuera de rango: COUNT(*) OVER () no tiene filas de donde leer
+        total = await contar_movimientos(suministro_id, fecha_desde, fecha_hasta)
+    return rows, total
 
+# Exportación del kárdex: uno o todos los suministros, con saldo por suministro.
+# Con fecha_desde la ventana arranca en esa fecha y el saldo de apertura sale
+# del último snapshot anterior (fecha_desde es inicio de día, no hace falta delta).
+_SQL_EXPORTACION = """
+    SELECT
+        DATE_FORMAT(k.fecha, '%%Y-%%m-%%d %%H:%%i:%%s') as fecha,
+        su.nombre as suministro_nombre,
+        k.tipo_movimiento,
+        k.cantidad,
+        COALESCE(ap.saldo, 0) + k.acumulado as saldo,
+        u.nombre as usuario_sistema_nombre,
+        s.nombre as solicitante_nombre,
+        k.area_solicitante,
+        k.motivo,
+        k.comprobante,
+        k.observaciones
+    FROM (
+        SELECT m.*,
+               CAST(SUM(CASE WHEN m.tipo_movimiento = 'entrada' THEN m.cantidad ELSE -m.cantidad END)
+                    OVER (PARTITION BY m.suministro_id ORDER BY m.fecha, m.id) AS SIGNED) as acumulado
+        FROM movimientos_suministros m
+        WHERE 1=1{filtro}
+    ) k
+    JOIN suministros su ON su.id = k.suministro_id
+    {apertura}
+    LEFT JOIN usuarios_sistema u ON k.usuario_sistema_id = u.id
+    LEFT JOIN solicitantes s ON k.solicitante_id = s.id
+    ORDER BY k.suministro_id, k.fecha, k.id
+"""
+
+_SQL_APERTURA = """
+    LEFT JOIN (
+        SELECT sn.suministro_id, sn.saldo
+        FROM suministros_saldos_snapshot sn
+        JOIN (
+            SELECT suministro_id, MAX(periodo) as periodo
+            FROM suministros_saldos_snapshot
+            WHERE periodo < DATE(%s){filtro}
+            GROUP BY suministro_id
+        ) ult ON ult.suministro_id = sn.suministro_id AND ult.periodo = sn.periodo
+    ) ap ON ap.suministro_id = k.suministro_id
+"""
+
+COLUMNAS_EXPORTACION = [
+    "Fecha", "Suministro", "Tipo", "Cantidad", "Saldo", "Usuario",
+    "Solicitante/Área", "Motivo", "Comprobante", "Observaciones",
+]
+
+
+def _consulta_exportacion(suministro_id: str = None, fecha_desde: str = None, fecha_hasta: str = None) -> tuple[str, list]:
+    filtro, params = ("", [])
+    if suministro_id:
+        filtro, params = " AND m.suministro_id = %s", [suministro_id]
+    fechas, params_fechas = _filtro_fechas(fecha_desde, fecha_hasta, alias="m")
+    apertura, params_apertura = "", []
+    if fecha_desde:
+        apertura = _SQL_APERTURA.format(filtro=" AND suministro_id = %s" if suministro_id else "")
+        params_apertura = [fecha_desde, *([suministro_id] if suministro_id else [])]
+    sql = _SQL_EXPORTACION.format(filtro=filtro + fechas, apertura=apertura)
+    return sql, [*params, *params_fechas, *params_apertura]
+
+
+def _fila_exportacion(m: dict) -> list:
+    return [
+        m["fecha"],
+        m["suministro_nombre"],
+        "Entrada" if m["tipo_movimiento"] == "entrada" else "Salida",
+        m["cantidad"],
+        m["saldo"],
+        m["usuario_sistema_nombre"] or "",
+        m["solicitante_nombre"] or m["area_solicitante"] or "",
+        m["motivo"] or "",
+        m["comprobante"] or "",
+        m["observaciones"] or "",
+    ]
+
+
+def _nombre_exportacion(suministro_id: str = None, fecha_desde: str = None, fecha_hasta: str = None) -> str:
+    partes = ["movimientos", suministro_id or "todos"]
+    if fecha_desde or fecha_hasta:
+        partes.append(f"{fecha_desde or 'inicio'}_{fecha_hasta or 'hoy'}")
+    return "_".join(partes)
+
+
+def _escribir_xlsx(ws, rows: list[dict]) -> None:
+    for m in rows:
+        ws.append(_fila_exportacion(m))
+
+
+def _guardar_xlsx(wb, destino: str) -> None:
+    wb.save(destino)
+    wb.close()
 
-async def obtener_saldo_parcial(suministro_id: str) -> int:
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                """SELECT SUM(CASE WHEN tipo_movimiento='entrada' THEN cantidad ELSE -cantidad END) as saldo
-                   FROM movimientos_suministros
-                   WHERE suministro_id = %s""",
-                (suministro_id,)
-            )
-            row = await cur.fetchone()
-            return row["saldo"] if row["saldo"] else 0
 
 # ──────────────────────────────────────────────────────────────────────────────
 # ENDPOINTS
 # ──────────────────────────────────────────────────────────────────────────────
 
-@router.post("/{suministro_id}/movimientos", status_code=201)
-async def crear_movimiento(
-    suministro_id: str,
-    body: dict,
-    current_user: dict = Depends(get_current_user)
-):
-    tipo = body.get("tipo")
-    cantidad = body.get("cantidad")
-    motivo = body.get("motivo")
-    solicitante_id = body.get("solicitante_id")
-    area = body.get("area")
-    comprobante = body.get("comprobante")
-    observaciones = body.get("observaciones")
-
+def _leer_movimiento(body: dict, comun: dict = None) -> dict:
+    """Valida y normaliza un movimiento del body; ``comun`` aporta valores por defecto (lote)."""
+    datos = {**(comun or {}), **{k: v for k, v in body.items() if v is not None}}
+    tipo = datos.get("tipo")
+    cantidad = datos.get("cantidad")
     if tipo not in ("entrada", "salida"):
-        raise HTTPException(status_code=400, detail="tipo debe ser 'entrada' o 'salida'")
-    if not cantidad or cantidad <= 0:
-        raise HTTPException(status_code=400, detail="cantidad debe ser un número positivo")
-    if not motivo:
-        raise HTTPException(status_code=400, detail="motivo es requerido")
+        raise ValueError("tipo debe ser 'entrada' o 'salida'")
+    if not isinstance(cantidad, int) or isinstance(cantidad, bool) or cantidad <= 0:
+        raise ValueError("cantidad debe ser un número positivo")
+    if not datos.get("motivo"):
+        raise ValueError("motivo es requerido")
+    return {
+        "suministro_id": datos.get("suministro_id"),
+        "tipo": tipo,
+        "cantidad": cantidad,
+        "motivo": datos["motivo"],
+        "solicitante_id": datos.get("solicitante_id") or None,
+        "area_solicitante": datos.get("area") or None,
+        "comprobante": datos.get("comprobante") or None,
+        "observaciones": datos.get("observaciones") or None,
+    }
+
 
+def _usuario_actual(current_user: dict) -> str:
     user_id = current_user.get("sub") or current_user.get("id")
     if not user_id:
         raise HTTPException(status_code=400, detail="No se pudo identificar el usuario autenticado")
+    return user_id
 
-    if solicitante_id == "":
-        solicitante_id = None
-    if area == "":
-        area = None
-    if comprobante == "":
-        comprobante = None
-    if observaciones == "":
-        observaciones = None
+
+@router.post("/{suministro_id}/movimientos", status_code=201)
+async def crear_movimiento(
+    suministro_id: str,
+    body: dict,
+    current_user: dict = Depends(get_current_user)
+):
+    try:
+        datos = _leer_movimiento({**body, "suministro_id": suministro_id})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    user_id = _usuario_actual(current_user)
 
     try:
-        movimiento = await registrar_movimiento(
-            suministro_id=suministro_id,
-            tipo=tipo,
-            cantidad=cantidad,
-            usuario_sistema_id=user_id,
-            motivo=motivo,
-            solicitante_id=solicitante_id,
-            area_solicitante=area,
-            comprobante=comprobante,
-            observaciones=observaciones
-        )
+        movimiento = await registrar_movimiento(usuario_sistema_id=user_id, **datos)
         await log_action(
             user_id=user_id,
-            accion=f"Registró {tipo} de suministro",
+            accion=f"Registró {datos['tipo']} de suministro",
             modulo="Suministros",
             entidad_id=suministro_id,
-            detalle=f"Movimiento: {tipo} de {cantidad} unidades, motivo: {motivo}"
+            detalle=f"Movimiento: {datos['tipo']} de {datos['cantidad']} unidades, motivo: {datos['motivo']}"
         )
-        return serialize({"data": movimiento, "message": "Movimiento registrado exitosamente"})
+        return serialize({"data": movimiento, "message": "Movimiento registrado exitosamente"}, status_code=201)
     except ValueError as e:
         raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/movimientos/batch", status_code=201)
+async def crear_movimientos_lote(
+    body: dict,
+    current_user: dict = Depends(get_current_user)
+):
+    """Aplica todos los movimientos (p. ej. una remisión completa) en una transacción.
+
+    Body: ``{"movimientos": [{suministro_id, tipo, cantidad, ...}], "motivo",
+    "comprobante", "solicitante_id", "area", "observaciones"}``; los campos
+    de nivel superior son el valor por defecto de cada movimiento. Si algún
+    suministro no tiene stock suficiente no se registra ninguno (409).
+    """
+    items = body.get("movimientos")
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="movimientos debe ser una lista no vacía")
+    if len(items) > MAX_MOVIMIENTOS_LOTE:
+        raise HTTPException(
+            status_code=400, detail=f"Máximo {MAX_MOVIMIENTOS_LOTE} movimientos por lote"
+        )
+    comun = {k: body.get(k) for k in ("tipo", "motivo", "solicitante_id", "area", "comprobante", "observaciones")}
+    user_id = _usuario_actual(current_user)
+
+    movimientos = []
+    for i, item in enumerate(items, start=1):
+        try:
+            if not isinstance(item, dict) or not item.get("suministro_id"):
+                raise ValueError("suministro_id es requerido")
+            datos = _leer_movimiento(item, comun)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Movimiento {i}: {e}")
+        movimientos.append({**datos, "usuario_sistema_id": user_id})
+
+    try:
+        registrados = await registrar_movimientos(movimientos)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    suministros = {m["suministro_id"] for m in movimientos}
+    await log_action(
+        user_id=user_id,
+        accion="Registró lote de movimientos de suministros",
+        modulo="Suministros",
+        detalle=(
+            f"{len(registrados)} movimientos sobre {len(suministros)} suministros"
+            + (f", comprobante: {comun['comprobante']}" if comun.get("comprobante") else "")
+        )
+    )
+    return serialize({
+        "data": registrados,
+        "total": len(registrados),
+        "message": "Movimientos registrados exitosamente"
+    }, status_code=201)
+
+
 @router.get("/{suministro_id}/movimientos")
 async def listar_movimientos(
     suministro_id: str,
@@ -226,43 +543,32 @@ async def listar_movimientos(
     suministro = await SuministroModel.find_by_id(suministro_id)
     if not suministro:
         raise HTTPException(status_code=404, detail="Suministro no encontrado")
-    movimientos = await obtener_movimientos(suministro_id, limit, offset, fecha_desde, fecha_hasta)
-    saldo_actual = await obtener_saldo_parcial(suministro_id)
-    saldo = saldo_actual
-    movimientos_invertidos = list(reversed(movimientos))
-    for m in movimientos_invertidos:
-        if m["tipo_movimiento"] == "entrada":
-            saldo -= m["cantidad"]
-        else:
-            saldo += m["cantidad"]
-        m["saldo_parcial"] = saldo
-    for m in movimientos:
-        m["saldo_parcial"] = next((x["saldo_parcial"] for x in movimientos_invertidos if x["id"] == m["id"]), 0)
-    return serialize({"data": movimientos, "total": len(movimientos)})
+    movimientos, total = await obtener_movimientos(suministro_id, limit, offset, fecha_desde, fecha_hasta)
+    return serialize({"data": movimientos, "total": total})
 
 
 @router.get("/{suministro_id}/kardex")
 async def obtener_kardex(
     suministro_id: str,
+    limit: int = Query(1000, ge=1, le=10000),
+    offset: int = Query(0, ge=0),
+    fecha_desde: str = Query(None),
+    fecha_hasta: str = Query(None),
     current_user: dict = Depends(get_current_user)
 ):
     suministro = await SuministroModel.find_by_id(suministro_id)
     if not suministro:
         raise HTTPException(status_code=404, detail="Suministro no encontrado")
-    movimientos = await obtener_movimientos(suministro_id, limit=10000, offset=0)
-    saldo = 0
-    for m in movimientos:
-        if m["tipo_movimiento"] == "entrada":
-            saldo += m["cantidad"]
-        else:
-            saldo -= m["cantidad"]
-        m["saldo_parcial"] = saldo
+    movimientos, total = await obtener_movimientos(
+        suministro_id, limit, offset, fecha_desde, fecha_hasta, orden="ASC"
+    )
     return serialize({
         "data": {
             "suministro": suministro,
             "stock_actual": suministro["cantidad"],
             "movimientos": movimientos
-        }
+        },
+        "total": total,
     })
 
 
@@ -275,43 +581,54 @@ async def editar_movimiento(
     pool = await get_pool()
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
-            await cur.execute("SELECT * FROM movimientos_suministros WHERE id = %s", (movimiento_id,))
-            old = await cur.fetchone()
-            if not old:
-                raise HTTPException(status_code=404, detail="Movimiento no encontrado")
-            nuevo_tipo = body.get("tipo", old["tipo_movimiento"])
-            nueva_cantidad = body.get("cantidad", old["cantidad"])
-            if nueva_cantidad <= 0:
-                raise HTTPException(status_code=400, detail="La cantidad debe ser positiva")
-            motivo = body.get("motivo", old["motivo"])
-            solicitante_id = body.get("solicitante_id", old["solicitante_id"])
-            area = body.get("area_solicitante", old["area_solicitante"])
-            comprobante = body.get("comprobante", old["comprobante"])
-            observaciones = body.get("observaciones", old["observaciones"])
-
-            old_effect = old["cantidad"] if old["tipo_movimiento"] == "entrada" else -old["cantidad"]
-            new_effect = nueva_cantidad if nuevo_tipo == "entrada" else -nueva_cantidad
-            delta = new_effect - old_effect
+            # Movimiento, stock y snapshot cambian juntos; FOR UPDATE evita que
+            # dos ediciones simultáneas apliquen dos veces el mismo delta
+            await conn.begin()
+            try:
+                await cur.execute(
+                    "SELECT * FROM movimientos_suministros WHERE id = %s FOR UPDATE", (movimiento_id,)
+                )
+                old = await cur.fetchone()
+                if not old:
+                    raise HTTPException(status_code=404, detail="Movimiento no encontrado")
+                nuevo_tipo = body.get("tipo", old["tipo_movimiento"])
+                nueva_cantidad = body.get("cantidad", old["cantidad"])
+                if nueva_cantidad <= 0:
+                    raise HTTPException(status_code=400, detail="La cantidad debe ser positiva")
+                motivo = body.get("motivo", old["motivo"])
+                solicitante_id = body.get("solicitante_id", old["solicitante_id"])
+                area = body.get("area_solicitante", old["area_solicitante"])
+                comprobante = body.get("comprobante", old["comprobante"])
+                observaciones = body.get("observaciones", old["observaciones"])
 
-            await cur.execute(
-                "UPDATE suministros SET cantidad = cantidad + %s WHERE id = %s",
-                (delta, old["suministro_id"])
-            )
-            await cur.execute(
-                """UPDATE movimientos_suministros SET
-                    tipo_movimiento=%s, cantidad=%s, motivo=%s, solicitante_id=%s,
-                    area_solicitante=%s, comprobante=%s, observaciones=%s
-                   WHERE id=%s""",
-                (nuevo_tipo, nueva_cantidad, motivo, solicitante_id, area, comprobante, observaciones, movimiento_id)
-            )
-            await log_action(
-                user_id=current_admin["id"],
-                accion="Editó movimiento de suministro",
-                modulo="Suministros",
-                entidad_id=old["suministro_id"],
-                detalle=f"Movimiento {movimiento_id}: tipo {old['tipo_movimiento']}->{nuevo_tipo}, cantidad {old['cantidad']}->{nueva_cantidad}"
-            )
-            return {"message": "Movimiento actualizado"}
+                old_effect = efecto(old["tipo_movimiento"], old["cantidad"])
+                new_effect = efecto(nuevo_tipo, nueva_cantidad)
+                delta = new_effect - old_effect
+
+                await cur.execute(
+                    "UPDATE suministros SET cantidad = cantidad + %s WHERE id = %s",
+                    (delta, old["suministro_id"])
+                )
+                await cur.execute(
+                    """UPDATE movimientos_suministros SET
+                        tipo_movimiento=%s, cantidad=%s, motivo=%s, solicitante_id=%s,
+                        area_solicitante=%s, comprobante=%s, observaciones=%s
+                       WHERE id=%s""",
+                    (nuevo_tipo, nueva_cantidad, motivo, solicitante_id, area, comprobante, observaciones, movimiento_id)
+                )
+                await aplicar_efecto(cur, old["suministro_id"], old["fecha"], delta)
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+    await log_action(
+        user_id=current_admin.get("sub") or current_admin.get("id"),
+        accion="Editó movimiento de suministro",
+        modulo="Suministros",
+        entidad_id=old["suministro_id"],
+        detalle=f"Movimiento {movimiento_id}: tipo {old['tipo_movimiento']}->{nuevo_tipo}, cantidad {old['cantidad']}->{nueva_cantidad}"
+    )
+    return {"message": "Movimiento actualizado"}
 
 
 @router.delete("/movimientos/{movimiento_id}", dependencies=[Depends(require_admin)])
@@ -322,54 +639,131 @@ async def eliminar_movimiento(
     pool = await get_pool()
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
-            await cur.execute("SELECT * FROM movimientos_suministros WHERE id = %s", (movimiento_id,))
-            mov = await cur.fetchone()
-            if not mov:
-                raise HTTPException(status_code=404, detail="Movimiento no encontrado")
-            efecto = mov["cantidad"] if mov["tipo_movimiento"] == "entrada" else -mov["cantidad"]
-            await cur.execute(
-                "UPDATE suministros SET cantidad = cantidad - %s WHERE id = %s",
-                (efecto, mov["suministro_id"])
-            )
-            await cur.execute("DELETE FROM movimientos_suministros WHERE id = %s", (movimiento_id,))
-            await log_action(
-                user_id=current_admin["id"],
-                accion="Eliminó movimiento de suministro",
-                modulo="Suministros",
-                entidad_id=mov["suministro_id"],
-                detalle=f"Movimiento {movimiento_id} eliminado"
-            )
-            return {"message": "Movimiento eliminado"}
+            await conn.begin()
+            try:
+                await cur.execute(
+                    "SELECT * FROM movimientos_suministros WHERE id = %s FOR UPDATE", (movimiento_id,)
+                )
+                mov = await cur.fetchone()
+                if not mov:
+                    raise HTTPException(status_code=404, detail="Movimiento no encontrado")
+                efecto_mov = efecto(mov["tipo_movimiento"], mov["cantidad"])
+                await cur.execute(
+                    "UPDATE suministros SET cantidad = cantidad - %s WHERE id = %s",
+                    (efecto_mov, mov["suministro_id"])
+                )
+                await cur.execute("DELETE FROM movimientos_suministros WHERE id = %s", (movimiento_id,))
+                await aplicar_efecto(cur, mov["suministro_id"], mov["fecha"], -efecto_mov)
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+    await log_action(
+        user_id=current_admin.get("sub") or current_admin.get("id"),
+        accion="Eliminó movimiento de suministro",
+        modulo="Suministros",
+        entidad_id=mov["suministro_id"],
+        detalle=f"Movimiento {movimiento_id} eliminado"
+    )
+    return {"message": "Movimiento eliminado"}
+
+
+@router.post("/saldos/verificar", dependencies=[Depends(require_admin)])
+async def verificar_snapshots_saldo(
+    suministro_id: str = Query(None),
+    reparar: bool = Query(False),
+    current_admin: dict = Depends(require_admin)
+):
+    resultado = await verificar_saldos(suministro_id, reparar=reparar)
+    if resultado["reparado"]:
+        await log_action(
+            user_id=current_admin.get("sub") or current_admin.get("id"),
+            accion="Reconstruyó snapshots de saldo",
+            modulo="Suministros",
+            entidad_id=suministro_id,
+            detalle=f"{len(resultado['diferencias'])} diferencias corregidas"
+        )
+    return serialize({"data": resultado})
+
+
+async def _validar_exportacion(suministro_id: str = None) -> None:
+    if suministro_id and not await SuministroModel.find_by_id(suministro_id):
+        raise HTTPException(status_code=404, detail="Suministro no encontrado")
 
 
 @router.get("/export/csv")
 async def exportar_movimientos_csv(
-    suministro_id: str = Query(...),
+    suministro_id: str = Query(None),
     fecha_desde: str = Query(None),
     fecha_hasta: str = Query(None),
     current_user: dict = Depends(get_current_user)
 ):
-    suministro = await SuministroModel.find_by_id(suministro_id)
-    if not suministro:
-        raise HTTPException(status_code=404, detail="Suministro no encontrado")
-    movimientos = await obtener_movimientos(suministro_id, limit=10000, offset=0, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta)
-    output = StringIO()
-    writer = csv.writer(output, delimiter=';')
-    writer.writerow(["Fecha", "Tipo", "Cantidad", "Usuario", "Solicitante/Área", "Motivo", "Comprobante", "Observaciones"])
-    for m in movimientos:
-        writer.writerow([
-            m["fecha"],
-            "Entrada" if m["tipo_movimiento"] == "entrada" else "Salida",
-            m["cantidad"],
-            m["usuario_sistema_nombre"] or "",
-            m["solicitante_nombre"] or m["area_solicitante"] or "",
-            m["motivo"] or "",
-            m["comprobante"] or "",
-            m["observaciones"] or ""
-        ])
-    csv_content = output.getvalue()
-    return Response(
-        content=csv_content.encode("utf-8-sig"),
+    """Kárdex en CSV (``;``, UTF-8 con BOM) en streaming: de un suministro o de todos."""
+    await _validar_exportacion(suministro_id)
+    sql, params = _consulta_exportacion(suministro_id, fecha_desde, fecha_hasta)
+
+    async def cuerpo():
+        buffer = StringIO()
+        writer = csv.writer(buffer, delimiter=';')
+        writer.writerow(COLUMNAS_EXPORTACION)
+        yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+        try:
+            async for rows in iter_lotes(sql, params):
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(_fila_exportacion(m) for m in rows)
+                yield buffer.getvalue().encode("utf-8")
+        except Exception as e:
+            # Los encabezados ya se enviaron: solo queda registrar y cortar
+            logger.error("Error exportando movimientos a CSV: %s", e, exc_info=True)
+            raise
+
+    nombre = _nombre_exportacion(suministro_id, fecha_desde, fecha_hasta)
+    return StreamingResponse(
+        cuerpo(),
         media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename=movimientos_{suministro_id}.csv"}
-    )
\ No newline at end of file
+        headers={"Content-Disposition": f"attachment; filename={nombre}.csv"}
+    )
+
+
+@router.get("/export/xlsx")
+async def exportar_movimientos_xlsx(
+    suministro_id: str = Query(None),
+    fecha_desde: str = Query(None),
+    fecha_hasta: str = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """Kárdex en XLSX con openpyxl en modo write-only.
+
+    Las filas se escriben por lotes a medida que llegan del cursor de servidor
+    (openpyxl las vuelca a un temporal, la memoria no crece con el número de
+    filas). El .xlsx es un ZIP que solo se cierra al final, así que se arma en
+    un archivo temporal y luego se envía por trozos.
+    """
+    try:
+        from openpyxl import Workbook
+    except Exception as e:  # pragma: no cover
+        raise HTTPException(status_code=500, detail="openpyxl no está instalado en el servidor") from e
+    await _validar_exportacion(suministro_id)
+    sql, params = _consulta_exportacion(suministro_id, fecha_desde, fecha_hasta)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Kardex")
+    ws.append(COLUMNAS_EXPORTACION)
+    fd, destino = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        async for rows in iter_lotes(sql, params):
+            await asyncio.to_thread(_escribir_xlsx, ws, rows)
+        await asyncio.to_thread(_guardar_xlsx, wb, destino)
+    except Exception:
+        os.unlink(destino)
+        raise
+
+    nombre = _nombre_exportacion(suministro_id, fecha_desde, fecha_hasta)
+    return FileResponse(
+        destino,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filename=f"{nombre}.xlsx",
+        background=BackgroundTask(os.unlink, destino),
+    )
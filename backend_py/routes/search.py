@@ -0,0 +1,33 @@
+from fastapi import APIRouter, HTTPException, Query
+
+from utils.search_index import ENTIDADES, search_index
+
+router = APIRouter()
+
+
+@router.get("")
+async def buscar(
+    q: str = Query("", description="Texto a buscar (placa, serial, nombre, documento...)"),
+    tipos: str = Query("", description="Entidades separadas por coma, p. ej. equipos,usuarios"),
+    limit: int = Query(20, ge=1, le=100),
+):
+    lista_tipos = [t.strip() for t in tipos.split(",") if t.strip()]
+    invalidos = [t for t in lista_tipos if t not in ENTIDADES]
+    if invalidos:
+        raise HTTPException(status_code=400, detail=f"Tipos no válidos: {', '.join(invalidos)}.")
+    if not search_index.listo:
+        raise HTTPException(status_code=503, detail="El índice de búsqueda se está construyendo. Intenta de nuevo.")
+
+    resultados = search_index.buscar(q, tipos=lista_tipos or None, limit=limit)
+    return {"data": resultados, "total": len(resultados)}
+
+
+@router.get("/stats")
+async def stats():
+    return {"data": search_index.stats()}
+
+
+@router.post("/reindex")
+async def reindex():
+    await search_index.reconstruir()
+    return {"data": search_index.stats(), "message": "Índice de búsqueda reconstruido."}
@@ -71,7 +71,7 @@ async def create(
             detalle=f"Nombre: {body['nombre']}, Tipo: {body['tipo']}, Cantidad: {body.get('cantidad', 0)}"
         )
         
-        return serialize({"data": nuevo, "message": "Suministro registrado exitosamente."})
+        return serialize({"data": nuevo, "message": "Suministro registrado exitosamente."}, status_code=201)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from models.usuario import UsuarioModel
 from utils.serializer import serialize
 from utils.audit import log_action
+from utils.streaming import ndjson_response, quiere_stream
 from dependencies import get_current_user
 
 
@@ -17,7 +18,14 @@ def _normalizar_correo(correo):
 
 
 @router.get("")
-async def get_all(busqueda: str = Query(""), area: str = Query("")):
+async def get_all(
+    request: Request,
+    busqueda: str = Query(""),
+    area: str = Query(""),
+    stream: bool = Query(False),
+):
+    if quiere_stream(request, stream):
+        return ndjson_response(UsuarioModel.stream_all(busqueda=busqueda, area=area))
     usuarios = await UsuarioModel.find_all(busqueda=busqueda, area=area)
     return serialize({"data": usuarios, "total": len(usuarios)})
 
@@ -71,7 +79,7 @@ async def create(body: dict, current_user: dict = Depends(get_current_user)):
         else:
             print("Advertencia: no se pudo obtener user_id para auditoría (POST usuario)")
 
-        return serialize({"data": nuevo, "message": "Usuario creado exitosamente."})
+        return serialize({"data": nuevo, "message": "Usuario creado exitosamente."}, status_code=201)
     except Exception as e:
         print(f"Error en POST /usuarios: {e}")
         if "Duplicate entry" in str(e) or "1062" in str(e):
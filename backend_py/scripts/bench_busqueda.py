@@ -0,0 +1,110 @@
+"""
+Compara la latencia de búsqueda LIKE vs FULLTEXT (ngram) a 10k y 100k filas.
+
+Crea una tabla temporal ``bench_busqueda_equipos`` con las columnas de texto
+de ``equipos``, la llena con datos sintéticos, mide ambos modos y la elimina.
+No toca las tablas reales.
+
+Uso (desde backend_py):
+    python scripts/bench_busqueda.py
+    python scripts/bench_busqueda.py --filas 10000 100000 --repeticiones 7
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+from config.db import close_pool, get_pool
+
+TABLA = "bench_busqueda_equipos"
+MARCAS = ["Lenovo", "HP", "Dell", "Asus", "Acer", "Apple", "Samsung", "Epson"]
+MODELOS = ["ThinkPad", "EliteBook", "Latitude", "VivoBook", "Aspire", "MacBook", "Galaxy", "EcoTank"]
+TERMINOS = ["EAC01234", "Latitude", "thinkpad", "SN4F2", "Epson EcoTank"]
+
+
+def _fila(i: int) -> tuple:
+    marca = random.choice(MARCAS)
+    return (
+        f"EAC{i:06d}",
+        marca,
+        f"{random.choice(MODELOS)} {random.randint(100, 999)}",
+        f"SN{random.getrandbits(40):010X}",
+    )
+
+
+async def _preparar(cur, filas: int) -> None:
+    await cur.execute(f"DROP TABLE IF EXISTS {TABLA}")
+    await cur.execute(
+        f"""CREATE TABLE {TABLA} (
+              id INT AUTO_INCREMENT PRIMARY KEY,
+              placa VARCHAR(50), marca VARCHAR(100), modelo VARCHAR(150), serial VARCHAR(100)
+            ) ENGINE=InnoDB"""
+    )
+    lote = 5000
+    for inicio in range(0, filas, lote):
+        datos = [_fila(i) for i in range(inicio, min(inicio + lote, filas))]
+        await cur.executemany(
+            f"INSERT INTO {TABLA} (placa, marca, modelo, serial) VALUES (%s, %s, %s, %s)", datos
+        )
+    await cur.execute(
+        f"ALTER TABLE {TABLA} ADD FULLTEXT INDEX ft_bench (placa, marca, modelo, serial) WITH PARSER ngram"
+    )
+
+
+async def _medir(cur, sql: str, params: list, repeticiones: int) -> tuple[float, int]:
+    tiempos, total = [], 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        await cur.execute(sql, params)
+        total = len(await cur.fetchall())
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos), total
+
+
+async def main(filas_list: list[int], repeticiones: int) -> None:
+    pool = await get_pool()
+    try:
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                for filas in filas_list:
+                    print(f"\n[BENCH] Preparando {filas:,} filas...")
+                    try:
+                        await _preparar(cur, filas)
+                    except Exception as e:
+                        print(f"   [ERROR] No se pudo crear el índice ngram (¿MariaDB?): {e}")
+                        continue
+                    print(f"   {'termino':<16}{'LIKE ms':>10}{'FULLTEXT ms':>14}{'filas':>8}")
+                    for termino in TERMINOS:
+                        q = f"%{termino}%"
+                        like_ms, n_like = await _medir(
+                            cur,
+                            f"SELECT * FROM {TABLA} WHERE placa LIKE %s OR marca LIKE %s "
+                            f"OR modelo LIKE %s OR serial LIKE %s",
+                            [q, q, q, q],
+                            repeticiones,
+                        )
+                        ft_ms, n_ft = await _medir(
+                            cur,
+                            f"SELECT * FROM {TABLA} WHERE MATCH(placa, marca, modelo, serial) "
+                            f"AGAINST (%s IN BOOLEAN MODE)",
+                            [f'"{termino}"'],
+                            repeticiones,
+                        )
+                        print(f"   {termino:<16}{like_ms:>10.2f}{ft_ms:>14.2f}{n_like:>8}/{n_ft}")
+                await cur.execute(f"DROP TABLE IF EXISTS {TABLA}")
+    finally:
+        await close_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.filas, args.repeticiones))
@@ -0,0 +1,128 @@
+"""
+Benchmark: conversión del inventario Excel fila a fila vs vectorizada.
+
+Anterior: excel_to_importar.procesar recorría cada fila y, dentro, cada
+columna de BLOQUES con ``row.iloc``. Nuevo: excel_to_importar.convertir
+(bloques derretidos a formato largo + operaciones por columna).
+
+La lectura del .xlsx se mide aparte (es igual en ambos casos). Con
+``--repetir N`` las filas de datos se replican N veces para ver cómo escala.
+
+Uso (desde backend_py):
+    python scripts/bench_excel_importar.py
+    python scripts/bench_excel_importar.py --repetir 50
+    python scripts/bench_excel_importar.py --archivo "../Doc/otro.xlsx"
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(RAIZ))
+
+import pandas as pd
+
+import excel_to_importar as conv
+from excel_to_importar import BLOQUES, EQUIPOS_HEADERS, GLOBAL_COLS, USUARIOS_HEADERS, norm, vc
+
+
+def _procesar_anterior(data: pd.DataFrame):
+    ncols = len(data.columns)
+    rows_u, rows_e, rows_a = [], [], []
+
+    for ri in range(len(data)):
+        row = data.iloc[ri]
+        if all(vc(row.iloc[i]) == "" for i in range(min(ncols, 20))):
+            continue
+
+        usr = {h: "" for h in USUARIOS_HEADERS}
+        shared = {h: "" for h in EQUIPOS_HEADERS}
+        obs = []
+        for ci, (dest, campo) in GLOBAL_COLS.items():
+            if ci >= ncols:
+                continue
+            val = vc(row.iloc[ci])
+            if not val:
+                continue
+            if dest == "usuario" and campo in usr:
+                usr[campo] = val
+            elif dest == "equipo" and campo in shared:
+                shared[campo] = val
+            elif dest == "obs":
+                obs.append(f"{campo}: {val}")
+        shared["observaciones"] = " | ".join(obs)
+
+        if norm(usr["nombre"]) in ("usuario_asignado", "nombre", "usuario", "item", ""):
+            continue
+        if not usr["nombre"]:
+            continue
+        rows_u.append(dict(usr))
+
+        for blk in BLOQUES:
+            eq = dict(shared)
+            tipo = ""
+            if blk["tipo_col"] is not None and blk["tipo_col"] < ncols:
+                tipo = vc(row.iloc[blk["tipo_col"]])
+            if not tipo and blk["tipo_default"]:
+                tipo = blk["tipo_default"]
+            eq["tipo_equipo"] = tipo
+            if blk["placa_col"] is not None and blk["placa_col"] < ncols:
+                eq["placa"] = vc(row.iloc[blk["placa_col"]])
+            if blk["forma_col"] is not None and blk["forma_col"] < ncols:
+                forma = vc(row.iloc[blk["forma_col"]])
+                if forma:
+                    eq["modelo"] = forma
+            if blk["pantalla_col"] is not None and blk["pantalla_col"] < ncols:
+                pant = vc(row.iloc[blk["pantalla_col"]])
+                if pant:
+                    eq["observaciones"] = (eq["observaciones"] + f" | pantalla: {pant}").lstrip(" | ")
+            if eq.get("placa"):
+                rows_e.append(eq)
+            elif tipo and tipo not in ("Computador", "Otro Dispositivo"):
+                rows_a.append({"nombre": tipo, "observaciones": f"usuario: {usr.get('nombre','')} | area: {usr.get('area','')}"})
+
+    return rows_u, rows_e, rows_a
+
+
+def _medir(fn, repeticiones: int) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def main(archivo: Path, repetir: int, repeticiones: int) -> None:
+    inicio = time.perf_counter()
+    data = conv.leer_excel(archivo)
+    t_lectura = (time.perf_counter() - inicio) * 1000
+    if repetir > 1:
+        data = pd.concat([data] * repetir, ignore_index=True)
+
+    t_anterior = _medir(lambda: _procesar_anterior(data), repeticiones)
+    t_nuevo = _medir(lambda: conv.convertir(data), repeticiones)
+
+    _, equipos_ant, accesorios_ant = _procesar_anterior(data)
+    usuarios, equipos, accesorios = conv.convertir(data)
+    assert equipos["placa"].tolist() == [e["placa"] for e in equipos_ant]
+    assert accesorios["nombre"].tolist() == [a["nombre"] for a in accesorios_ant]
+
+    print(f"\nArchivo: {archivo.name}  filas de datos: {len(data):,}")
+    print(f"  lectura .xlsx:   {t_lectura:9.2f} ms  (una vez, común a ambos)")
+    print(f"  anterior:        {t_anterior:9.2f} ms")
+    print(f"  vectorizado:     {t_nuevo:9.2f} ms")
+    print(f"  mejora:          x{t_anterior / t_nuevo:.1f}")
+    print(f"  salida: {len(usuarios)} usuarios (deduplicados), {len(equipos)} equipos, {len(accesorios)} accesorios")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archivo", type=Path, default=RAIZ / "Doc" / "INVENTARIO 2026 TECNOLOGIA.xlsx")
+    parser.add_argument("--repetir", type=int, default=1)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+    main(args.archivo, args.repetir, args.repeticiones)
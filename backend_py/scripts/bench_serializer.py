@@ -0,0 +1,100 @@
+"""
+Microbenchmark: serialización anterior vs FastJSONResponse sobre 10k equipos.
+
+Anterior: serialize() recursivo (copia cada dict) + jsonable_encoder de FastAPI
++ json.dumps de JSONResponse. Nuevo: utils.serializer.dumps en una pasada.
+
+Uso (desde backend_py):
+    python scripts/bench_serializer.py
+    python scripts/bench_serializer.py --filas 50000 --repeticiones 5
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.append(os.getcwd())
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from utils.serializer import FastJSONResponse, orjson
+
+
+def _serialize_anterior(obj):
+    if isinstance(obj, list):
+        return [_serialize_anterior(item) for item in obj]
+    if isinstance(obj, dict):
+        return {k: _serialize_anterior(v) for k, v in obj.items()}
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return obj
+
+
+def _equipos(n: int) -> list[dict]:
+    base = date(2020, 1, 1)
+    return [
+        {
+            "id": f"00000000-0000-0000-0000-{i:012d}",
+            "placa": f"EAC-{i:05d}",
+            "serial": f"SN{i:010X}",
+            "tipo_equipo": "Portátil",
+            "marca": "Lenovo",
+            "modelo": "ThinkPad T14",
+            "sistema_operativo": "Windows 11",
+            "ram": "16 GB",
+            "disco": "512 GB SSD",
+            "criticidad": "Media",
+            "confidencialidad": "Interna",
+            "estado": "Asignado",
+            "fecha_compra": base + timedelta(days=i % 1500),
+            "fecha_registro": base + timedelta(days=i % 1000),
+            "ultimo_mantenimiento": datetime(2024, 1, 1, 8, 30) + timedelta(hours=i),
+            "costo": Decimal("3250000.00") + i,
+            "es_rentado": bool(i % 7 == 0),
+            "observaciones": None,
+        }
+        for i in range(n)
+    ]
+
+
+def _medir(fn, repeticiones: int) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def main(filas: int, repeticiones: int) -> None:
+    payload = {"data": _equipos(filas), "total": filas}
+
+    def anterior():
+        return JSONResponse(jsonable_encoder(_serialize_anterior(payload))).body
+
+    def nuevo():
+        return FastJSONResponse(payload).body
+
+    t_anterior = _medir(anterior, repeticiones)
+    t_nuevo = _medir(nuevo, repeticiones)
+    print(f"Filas: {filas:,}  (encoder: {'orjson' if orjson else 'json estándar'})")
+    print(f"  anterior: {t_anterior:9.2f} ms  ({len(anterior()):,} bytes)")
+    print(f"  nuevo:    {t_nuevo:9.2f} ms  ({len(nuevo()):,} bytes)")
+    print(f"  mejora:   x{t_anterior / t_nuevo:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=10_000)
+    parser.add_argument("--repeticiones", type=int, default=7)
+    args = parser.parse_args()
+    main(args.filas, args.repeticiones)
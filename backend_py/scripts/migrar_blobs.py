@@ -0,0 +1,133 @@
+"""
+Mueve los archivos de documentos guardados como LONGBLOB al almacén por contenido.
+
+Recorre documentos_archivos (filas con contenido y sin sha256) de a un
+archivo por vez: lo escribe en el almacén, suma la referencia del hash y
+deja la fila solo con hash y metadatos. Se puede interrumpir y volver a
+ejecutar; las filas ya migradas se saltan.
+
+Opciones de mantenimiento (mejor con la API detenida):
+    --recontar    recalcula documentos_blobs.referencias desde
+                  documentos_archivos, borra los hashes sin referencias y
+                  lista los que no tienen archivo en el almacén
+    --huerfanos   borra del almacén los archivos que ningún hash referencia
+    --optimizar   OPTIMIZE TABLE documentos_archivos para devolver el espacio
+                  de los LONGBLOB al tablespace
+
+Uso (desde backend_py, después de config/migration_documentos_blobs.sql):
+    python scripts/migrar_blobs.py
+    python scripts/migrar_blobs.py --recontar --huerfanos --optimizar
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.append(os.getcwd())
+from config.db import close_pool, get_pool
+from models.documento import DocumentoModel
+from utils.almacen_documentos import almacen
+
+
+async def migrar(lote: int) -> int:
+    pool = await get_pool()
+    ultimo, migrados = "", 0
+    while True:
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """SELECT documento_id FROM documentos_archivos
+                       WHERE sha256 IS NULL AND contenido IS NOT NULL AND documento_id > %s
+                       ORDER BY documento_id LIMIT %s""",
+                    [ultimo, lote],
+                )
+                ids = [row["documento_id"] for row in await cur.fetchall()]
+        if not ids:
+            return migrados
+        for documento_id in ids:
+            if await DocumentoModel.migrar_archivo_legacy(documento_id):
+                migrados += 1
+        ultimo = ids[-1]
+        print(f"  {migrados:,} archivos migrados...")
+
+
+async def recontar() -> None:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await conn.begin()
+            try:
+                await cur.execute("UPDATE documentos_blobs SET referencias = 0")
+                await cur.execute(
+                    """INSERT INTO documentos_blobs (sha256, tamano, referencias)
+                       SELECT sha256, MAX(tamano), COUNT(*) FROM documentos_archivos
+                       WHERE sha256 IS NOT NULL GROUP BY sha256
+                       ON DUPLICATE KEY UPDATE referencias = VALUES(referencias)"""
+                )
+                await cur.execute("SELECT sha256 FROM documentos_blobs WHERE referencias = 0")
+                sin_uso = [row["sha256"] for row in await cur.fetchall()]
+                await cur.execute("DELETE FROM documentos_blobs WHERE referencias = 0")
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+            for sha in sin_uso:
+                await almacen.eliminar(sha)
+            print(f"Hashes sin referencias eliminados: {len(sin_uso):,}")
+
+            await cur.execute("SELECT sha256 FROM documentos_blobs")
+            faltan = [row["sha256"] for row in await cur.fetchall() if not await almacen.existe(row["sha256"])]
+            print(f"Hashes sin archivo en el almacén: {len(faltan):,}")
+            for sha in faltan[:50]:
+                print(f"  {sha}")
+
+
+async def huerfanos() -> None:
+    if not hasattr(almacen, "hashes"):
+        print("El backend de almacenamiento no permite listar archivos; se omite.")
+        return
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT sha256 FROM documentos_blobs")
+            conocidos = {row["sha256"] for row in await cur.fetchall()}
+    borrados = 0
+    for sha in list(almacen.hashes()):
+        if sha not in conocidos:
+            await almacen.eliminar(sha)
+            borrados += 1
+    temporales = almacen.limpiar_temporales()
+    print(f"Archivos huérfanos eliminados: {borrados:,}  temporales: {temporales:,}")
+
+
+async def optimizar() -> None:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("OPTIMIZE TABLE documentos_archivos")
+            await cur.fetchall()
+    print("documentos_archivos optimizada.")
+
+
+async def main(args) -> None:
+    try:
+        migrados = await migrar(args.lote)
+        print(f"Archivos movidos al almacén: {migrados:,}")
+        if args.recontar:
+            await recontar()
+        if args.huerfanos:
+            await huerfanos()
+        if args.optimizar:
+            await optimizar()
+    finally:
+        await close_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lote", type=int, default=200, help="Ids leídos por consulta")
+    parser.add_argument("--recontar", action="store_true")
+    parser.add_argument("--huerfanos", action="store_true")
+    parser.add_argument("--optimizar", action="store_true")
+    asyncio.run(main(parser.parse_args()))
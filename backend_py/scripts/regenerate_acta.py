@@ -24,13 +24,13 @@ async def main():
     accesorios = normalizar_accesorios_entregados(asignacion.get('accesorios_entregados'))
 
     try:
-        pdf_bytes, filename, url = await _generar_y_registrar_acta(
+        pdf_bytes, filename, url, cache = await _generar_y_registrar_acta(
         asignacion,
         accesorios_entregados=accesorios,
         cargado_por='script',
         regenerar=True,         
     )
-        print('Acta regenerada:', filename, url)
+        print('Acta regenerada:', filename, url, f'(cache {cache})')
     except Exception as e:
         print('Error regenerando acta:', e)
 
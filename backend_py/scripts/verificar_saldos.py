@@ -0,0 +1,48 @@
+"""
+Verifica los snapshots de saldo del kárdex contra los movimientos.
+
+Recalcula el cierre diario de cada suministro desde movimientos_suministros
+y lista los snapshots que no coinciden o faltan. Con ``--reparar``
+reconstruye la tabla suministros_saldos_snapshot (del suministro indicado o
+de todos) en una transacción.
+
+Uso (desde backend_py):
+    python scripts/verificar_saldos.py
+    python scripts/verificar_saldos.py --suministro <id> --reparar
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.append(os.getcwd())
+from config.db import close_pool
+from utils.saldos_suministros import verificar_saldos
+
+
+async def main(suministro_id: str | None, reparar: bool, mostrar: int) -> int:
+    try:
+        resultado = await verificar_saldos(suministro_id, reparar=reparar)
+    finally:
+        await close_pool()
+
+    diferencias = resultado["diferencias"]
+    print(f"Snapshots revisados: {resultado['revisados']:,}  diferencias: {len(diferencias):,}")
+    for d in diferencias[:mostrar]:
+        registrado = "falta" if d["registrado"] is None else d["registrado"]
+        print(f"  {d['suministro_id']}  {d['periodo']}  esperado={d['esperado']}  registrado={registrado}")
+    if len(diferencias) > mostrar:
+        print(f"  ... y {len(diferencias) - mostrar:,} más")
+    if resultado["reparado"]:
+        print("Snapshots reconstruidos.")
+    return 1 if diferencias and not resultado["reparado"] else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suministro", default=None, help="Solo este suministro (id)")
+    parser.add_argument("--reparar", action="store_true", help="Reconstruir los snapshots si hay diferencias")
+    parser.add_argument("--mostrar", type=int, default=50, help="Máximo de diferencias a listar")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.suministro, args.reparar, args.mostrar)))
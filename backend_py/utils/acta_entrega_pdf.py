@@ -14,6 +14,8 @@ pip install reportlab pypdf
 import io
 import os
 import json
+import hashlib
+import threading
 from datetime import date, datetime
 from pathlib import Path
 
@@ -101,6 +103,118 @@ POS = {
 }
 
 
+# ─────────────────────────────────────────────
+# CACHÉ DE PLANTILLA
+# ─────────────────────────────────────────────
+
+# Páginas que se conservan según el tipo de equipo. Los desktop / all-in-one
+# no llevan la página 2 (índice 1) del formato.
+VARIANTES_PLANTILLA = {
+    "portatil": None,            # todas las páginas
+    "escritorio": [0, 2, 3, 4],
+}
+
+# (ruta, mtime_ns, variante) -> (PdfReader ya filtrado, lock)
+_PLANTILLAS: dict[tuple[str, int, str], tuple[PdfReader, threading.Lock]] = {}
+_PLANTILLAS_LOCK = threading.Lock()
+
+
+def plantilla_acta_path() -> str | None:
+    """Ruta de la plantilla por defecto (Doc/Julian Castro Sena Acta.pdf)."""
+    repo_root = Path(__file__).resolve().parents[2]
+    default_tpl = repo_root / "Doc" / "Julian Castro Sena Acta.pdf"
+    return str(default_tpl) if default_tpl.exists() else None
+
+
+def version_plantilla(plantilla_path: str | None = None) -> str:
+    """Identificador de la versión actual de la plantilla (ruta + mtime)."""
+    plantilla_path = plantilla_path or plantilla_acta_path()
+    if not plantilla_path or not Path(plantilla_path).exists():
+        return ""
+    st = os.stat(plantilla_path)
+    return f"{Path(plantilla_path).name}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def invalidar_cache_plantillas(plantilla_path: str | None = None) -> None:
+    """Hook de recarga: descarta las variantes cacheadas (de una ruta o todas).
+
+    No suele hacer falta llamarlo: la clave incluye el mtime, así que un cambio
+    del archivo se detecta solo en la siguiente generación.
+    """
+    with _PLANTILLAS_LOCK:
+        if plantilla_path is None:
+            _PLANTILLAS.clear()
+            return
+        ruta = str(Path(plantilla_path).resolve())
+        for key in [k for k in _PLANTILLAS if k[0] == ruta]:
+            del _PLANTILLAS[key]
+
+
+def _cargar_variante(ruta: str, paginas: list[int] | None) -> PdfReader:
+    tpl = PdfReader(ruta)
+    writer = PdfWriter()
+    indices = range(len(tpl.pages)) if paginas is None else [i for i in paginas if i < len(tpl.pages)]
+    for i in indices:
+        writer.add_page(tpl.pages[i])
+    buf = io.BytesIO()
+    writer.write(buf)
+    buf.seek(0)
+    return PdfReader(buf)
+
+
+def _obtener_plantilla(plantilla_path: str, variante: str) -> tuple[PdfReader, threading.Lock]:
+    """Devuelve la plantilla ya filtrada para la variante, parseándola una sola vez."""
+    ruta = str(Path(plantilla_path).resolve())
+    mtime = os.stat(ruta).st_mtime_ns
+    key = (ruta, mtime, variante)
+    with _PLANTILLAS_LOCK:
+        cached = _PLANTILLAS.get(key)
+        if cached is not None:
+            return cached
+        # La plantilla cambió en disco: descartar versiones viejas de esa ruta
+        for old in [k for k in _PLANTILLAS if k[0] == ruta and k[1] != mtime]:
+            del _PLANTILLAS[old]
+        cached = (_cargar_variante(ruta, VARIANTES_PLANTILLA[variante]), threading.Lock())
+        _PLANTILLAS[key] = cached
+        return cached
+
+
+# ─────────────────────────────────────────────
+# HUELLA (caché por contenido)
+# ─────────────────────────────────────────────
+
+# Campos de la asignación que no afectan el PDF y cambian con cada guardado
+_CAMPOS_VOLATILES = {"acta_pdf", "hoja_vida_pdf", "created_at", "updated_at"}
+
+
+def huella_acta(
+    asignacion: dict,
+    *,
+    accesorios_entregados: list[str] | None = None,
+    plantilla_path: str | None = None,
+) -> str:
+    """SHA-256 determinista de todo lo que entra al render del acta.
+
+    Incluye la asignación ya enriquecida (usuarios, equipos, firmas), los
+    accesorios y la versión de la plantilla. Dos llamadas con los mismos
+    datos producen el mismo PDF, así que la misma huella permite reutilizarlo.
+    """
+    datos = {k: v for k, v in asignacion.items() if k not in _CAMPOS_VOLATILES}
+    firmas = datos.get("firmas")
+    if isinstance(firmas, (str, bytes, bytearray)):
+        try:
+            datos["firmas"] = json.loads(firmas)
+        except Exception:
+            pass
+    payload = {
+        "asignacion": datos,
+        "accesorios_entregados": list(accesorios_entregados or []),
+        "plantilla": version_plantilla(plantilla_path),
+    }
+    canon = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()
+
+
 # ─────────────────────────────────────────────
 # HELPERS
 # ─────────────────────────────────────────────
@@ -165,42 +279,16 @@ def generar_acta_entrega_pdf(
     entregado_por = entregado_por or ""
 
     if plantilla_path is None:
-        repo_root = Path(__file__).resolve().parents[2]
-        default_tpl = repo_root / "Doc" / "Julian Castro Sena Acta.pdf"
-        if default_tpl.exists():
-            plantilla_path = str(default_tpl)
+        plantilla_path = plantilla_acta_path()
 
     if not plantilla_path or not Path(plantilla_path).exists():
         raise FileNotFoundError("No se encontró la plantilla PDF")
-    
-    
-
-    tpl = PdfReader(plantilla_path)
 
-        # Determinar si es portátil
+    # Determinar si es portátil
     tipo_equipo = asignacion.get("tipo_equipo", "").lower()
     es_portatil = tipo_equipo in ("laptop", "portátil", "notebook")
-    
-    from pypdf import PdfWriter as PdfWriter2
-    temp_writer = PdfWriter2()
-    
-    if es_portatil:
-        # Conservar todas las páginas (índices 0,1,2,3,4)
-        for i in range(len(tpl.pages)):
-            temp_writer.add_page(tpl.pages[i])
-    else:
-        # Desktop o All-in-one: eliminar la página 2 (índice 1)
-        # Conservar índices 0, 2, 3, 4 (páginas 1,3,4,5)
-        paginas_a_conservar = [0, 2, 3, 4]
-        for i in paginas_a_conservar:
-            if i < len(tpl.pages):
-                temp_writer.add_page(tpl.pages[i])
-    
-    # Reemplazar la plantilla original por la nueva (con páginas filtradas)
-    temp_bytes = io.BytesIO()
-    temp_writer.write(temp_bytes)
-    temp_bytes.seek(0)
-    tpl = PdfReader(temp_bytes)
+    tpl, tpl_lock = _obtener_plantilla(plantilla_path, "portatil" if es_portatil else "escritorio")
+
     overlay = io.BytesIO()
     oc = Canvas(overlay, pagesize=LETTER)
 
@@ -336,11 +424,13 @@ def generar_acta_entrega_pdf(
     overlay.seek(0)
     overlay_pdf = PdfReader(overlay)
 
+    # add_page clona la página en el writer: el merge no toca la plantilla cacheada
     writer = PdfWriter()
-    for page in tpl.pages:
-        if overlay_pdf.pages:
-            page.merge_page(overlay_pdf.pages[0])
-        writer.add_page(page)
+    with tpl_lock:
+        for page in tpl.pages:
+            nueva = writer.add_page(page)
+            if overlay_pdf.pages:
+                nueva.merge_page(overlay_pdf.pages[0])
 
     out = io.BytesIO()
     writer.write(out)
@@ -0,0 +1,180 @@
+"""
+Almacén de archivos de documentos direccionado por contenido (SHA-256).
+
+La BD solo guarda hash y metadatos (``documentos_archivos.sha256``) y el
+conteo de referencias (``documentos_blobs``); los bytes viven en el backend
+configurado con ``ALMACEN_DOCUMENTOS`` (por ahora ``directorio``).
+
+Escribir un archivo tiene dos pasos:
+
+1. ``preparar(origen, limite=...)`` copia el contenido por bloques a un
+   temporal del propio almacén calculando el SHA-256 por el camino (bytes,
+   archivo abierto o ruta) y corta apenas se pasa del límite.
+2. ``confirmar(preparado)`` lo mueve a su ruta definitiva con ``os.replace``
+   (mismo sistema de archivos: sin copiar). Si el hash ya existe, el
+   temporal se descarta: mismo contenido, un solo archivo.
+
+``DocumentoModel`` hace el paso 2 dentro de la transacción que incrementa
+la referencia, así un borrado concurrente del mismo hash (que bloquea esa
+fila) no puede dejar el documento sin archivo.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+BLOQUE = 1024 * 1024
+
+
+class ArchivoDemasiadoGrande(Exception):
+    def __init__(self, limite: int):
+        super().__init__(f"El archivo excede {limite} bytes")
+        self.limite = limite
+
+
+@dataclass
+class BlobPreparado:
+    sha256: str
+    tamano: int
+    temporal: Path
+
+
+class AlmacenBlobs(ABC):
+    """Interfaz de un backend. Las rutas locales (``ruta``) permiten sendfile."""
+
+    @abstractmethod
+    async def preparar(self, origen: bytes | BinaryIO | Path, *, limite: int | None = None) -> BlobPreparado:
+        """Copia ``origen`` a un temporal calculando el hash; corta con
+        ``ArchivoDemasiadoGrande`` apenas se pasa de ``limite`` bytes."""
+        ...
+
+    @abstractmethod
+    async def confirmar(self, preparado: BlobPreparado) -> None:
+        ...
+
+    @abstractmethod
+    async def descartar(self, preparado: BlobPreparado) -> None:
+        ...
+
+    @abstractmethod
+    async def leer(self, sha256: str) -> bytes:
+        ...
+
+    @abstractmethod
+    async def existe(self, sha256: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def eliminar(self, sha256: str) -> None:
+        ...
+
+    def ruta(self, sha256: str) -> Path | None:
+        return None
+
+
+class AlmacenDirectorio(AlmacenBlobs):
+    """Un archivo por hash en ``raiz/ab/cd/<sha256>`` (dos niveles de 256 carpetas)."""
+
+    def __init__(self, raiz: Path):
+        self.raiz = Path(raiz)
+        self._tmp = self.raiz / ".tmp"
+
+    def ruta(self, sha256: str) -> Path:
+        if len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256):
+            raise ValueError(f"Hash inválido: {sha256!r}")
+        return self.raiz / sha256[:2] / sha256[2:4] / sha256
+
+    def _preparar(self, origen: bytes | BinaryIO | Path, limite: int | None = None) -> BlobPreparado:
+        self._tmp.mkdir(parents=True, exist_ok=True)
+        fd, temporal = tempfile.mkstemp(dir=self._tmp)
+        h, tamano = hashlib.sha256(), 0
+        try:
+            with os.fdopen(fd, "wb") as destino:
+                if isinstance(origen, (bytes, bytearray, memoryview)):
+                    bloques = [bytes(origen)]
+                    fuente = None
+                else:
+                    fuente = open(origen, "rb") if isinstance(origen, (str, Path)) else origen
+                    bloques = iter(lambda: fuente.read(BLOQUE), b"")
+                try:
+                    for bloque in bloques:
+                        tamano += len(bloque)
+                        if limite is not None and tamano > limite:
+                            raise ArchivoDemasiadoGrande(limite)
+                        h.update(bloque)
+                        destino.write(bloque)
+                finally:
+                    if fuente is not None and fuente is not origen:
+                        fuente.close()
+        except BaseException:
+            os.unlink(temporal)
+            raise
+        return BlobPreparado(h.hexdigest(), tamano, Path(temporal))
+
+    def _confirmar(self, preparado: BlobPreparado) -> None:
+        destino = self.ruta(preparado.sha256)
+        if destino.exists():
+            preparado.temporal.unlink(missing_ok=True)
+            return
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(preparado.temporal, destino)
+
+    async def preparar(self, origen: bytes | BinaryIO | Path, *, limite: int | None = None) -> BlobPreparado:
+        return await asyncio.to_thread(self._preparar, origen, limite)
+
+    async def confirmar(self, preparado: BlobPreparado) -> None:
+        await asyncio.to_thread(self._confirmar, preparado)
+
+    async def descartar(self, preparado: BlobPreparado) -> None:
+        await asyncio.to_thread(preparado.temporal.unlink, missing_ok=True)
+
+    async def leer(self, sha256: str) -> bytes:
+        return await asyncio.to_thread(self.ruta(sha256).read_bytes)
+
+    async def existe(self, sha256: str) -> bool:
+        return await asyncio.to_thread(self.ruta(sha256).exists)
+
+    async def eliminar(self, sha256: str) -> None:
+        await asyncio.to_thread(self.ruta(sha256).unlink, missing_ok=True)
+
+    def hashes(self):
+        """Hashes presentes en disco (para verificaciones y limpieza de huérfanos)."""
+        if not self.raiz.is_dir():
+            return
+        for path in self.raiz.glob("??/??/*"):
+            if path.is_file() and len(path.name) == 64:
+                yield path.name
+
+    def limpiar_temporales(self, antiguedad_seg: float = 3600) -> int:
+        """Borra temporales abandonados (p. ej. subidas interrumpidas)."""
+        if not self._tmp.is_dir():
+            return 0
+        limite, borrados = time.time() - antiguedad_seg, 0
+        for path in self._tmp.iterdir():
+            if path.is_file() and path.stat().st_mtime < limite:
+                path.unlink(missing_ok=True)
+                borrados += 1
+        return borrados
+
+
+BACKENDS: dict[str, type[AlmacenBlobs]] = {
+    "directorio": AlmacenDirectorio,
+}
+
+
+def crear_almacen() -> AlmacenBlobs:
+    tipo = os.getenv("ALMACEN_DOCUMENTOS", "directorio")
+    if tipo not in BACKENDS:
+        raise RuntimeError(f"ALMACEN_DOCUMENTOS desconocido: {tipo!r}. Opciones: {', '.join(BACKENDS)}")
+    return BACKENDS[tipo](Path(os.getenv("ALMACEN_DOCUMENTOS_DIR", "almacen_documentos")))
+
+
+almacen = crear_almacen()
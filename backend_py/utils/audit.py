@@ -1,7 +1,257 @@
+"""
+Registro de auditoría (tabla ``audit_log``) fuera del camino de la petición.
+
+``log_action`` solo encola la entrada y vuelve de inmediato.
+``ColaAuditoria`` la escribe en segundo plano con INSERT de varias filas
+cada ``AUDIT_LOTE`` entradas o cada ``AUDIT_INTERVALO_MS`` milisegundos, lo
+que ocurra primero; al apagar (lifespan) se vacía lo pendiente.
+
+Si MySQL no responde, el lote va a un archivo de derrame (JSON por línea,
+``AUDIT_DERRAME_FILE``) acotado a ``AUDIT_DERRAME_MAX_MB``; se reintenta
+cada ``AUDIT_REINTENTO_SEG`` segundos. Los ids se generan al encolar y
+``ON DUPLICATE KEY UPDATE`` hace que reintentar un lote ya escrito no lo
+duplique. Si MySQL rechaza una fila (p. ej. por una FK), el lote se reintenta
+fila a fila y solo esa se descarta, con error en el log.
+
+La fecha sigue siendo la del reloj de MySQL: cada lote lee ``NOW(6)`` y le
+resta lo que cada entrada esperó en la cola (o en el derrame).
+
+Sin la cola iniciada (scripts, pruebas) se escribe directo como antes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
 import uuid
+from collections import deque
+from datetime import timedelta
+from pathlib import Path
+
 from fastapi import Request
+from pymysql.err import IntegrityError
 from config.db import get_pool
 
+logger = logging.getLogger("itam.audit")
+
+_SQL_INSERT = """INSERT INTO audit_log
+                 (id, usuario_sistema_id, accion, modulo, entidad_id, detalle, ip, fecha)
+                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                 ON DUPLICATE KEY UPDATE id = id"""
+
+Entrada = tuple  # (id, usuario, accion, modulo, entidad_id, detalle, ip, encolada: time.time())
+
+
+async def _insertar(entradas: list[Entrada]) -> None:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT NOW(6) AS ahora")
+            ahora = (await cur.fetchone())["ahora"]
+            reloj = time.time()
+            filas = [
+                (*datos, ahora - timedelta(seconds=max(0.0, reloj - encolada)))
+                for *datos, encolada in entradas
+            ]
+            try:
+                # aiomysql convierte executemany de un INSERT ... VALUES en un solo INSERT multi-fila
+                await cur.executemany(_SQL_INSERT, filas)
+            except IntegrityError:
+                # Una fila inválida haría fallar el lote en cada reintento
+                for entrada, fila in zip(entradas, filas):
+                    try:
+                        await cur.execute(_SQL_INSERT, fila)
+                    except IntegrityError as e:
+                        logger.error("Entrada de auditoría rechazada por MySQL (%s): %s", e, entrada)
+
+
+def _a_linea(entrada: Entrada) -> str:
+    return json.dumps(list(entrada), ensure_ascii=False) + "\n"
+
+
+def _de_linea(linea: str) -> Entrada:
+    return tuple(json.loads(linea))
+
+
+class ColaAuditoria:
+    def __init__(
+        self,
+        *,
+        lote: int,
+        intervalo_ms: int,
+        max_pendientes: int,
+        derrame: Path,
+        derrame_max_bytes: int,
+        reintento_seg: float,
+    ):
+        self.lote = max(1, lote)
+        self.intervalo = max(0.01, intervalo_ms / 1000)
+        self.max_pendientes = max(self.lote, max_pendientes)
+        self.derrame = Path(derrame)
+        self.derrame_max_bytes = derrame_max_bytes
+        self.reintento_seg = reintento_seg
+        self._pendientes: deque[Entrada] = deque()
+        self._hay_lote = asyncio.Event()
+        self._lock_derrame = asyncio.Lock()
+        self._tarea: asyncio.Task | None = None
+        self._cerrando = False
+        self._proximo_reintento = 0.0
+        self._descartadas = 0
+
+    # ─── Ciclo de vida ────────────────────────────────────────────────────────
+
+    async def start(self) -> None:
+        if self._tarea:
+            return
+        # Un reintento interrumpido (caída del proceso) vuelve al derrame
+        en_curso = self._en_curso()
+        if en_curso.exists():
+            async with self._lock_derrame:
+                await asyncio.to_thread(self._anexar_archivo, en_curso)
+        self._cerrando = False
+        self._tarea = asyncio.create_task(self._bucle())
+
+    async def stop(self) -> None:
+        if not self._tarea:
+            return
+        # Sin cancel(): un lote a medio escribir terminaría perdido
+        self._cerrando = True
+        self._hay_lote.set()
+        await asyncio.gather(self._tarea, return_exceptions=True)
+        self._tarea = None
+        await self._vaciar()
+
+    # ─── Encolado ─────────────────────────────────────────────────────────────
+
+    async def registrar(self, entrada: Entrada) -> None:
+        if not self._tarea:
+            await _insertar([entrada])
+            return
+        if len(self._pendientes) >= self.max_pendientes:
+            # La escritura está trabada: se derrama en vez de crecer sin límite
+            await self._derramar([entrada])
+            return
+        self._pendientes.append(entrada)
+        if len(self._pendientes) >= self.lote:
+            self._hay_lote.set()
+
+    # ─── Escritura ────────────────────────────────────────────────────────────
+
+    async def _bucle(self) -> None:
+        while not self._cerrando:
+            try:
+                await asyncio.wait_for(self._hay_lote.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+            self._hay_lote.clear()
+            try:
+                await self._vaciar()
+                if time.monotonic() >= self._proximo_reintento:
+                    await self._reintentar_derrame()
+            except Exception as e:
+                logger.error("Error en la cola de auditoría: %s", e, exc_info=True)
+
+    async def _vaciar(self) -> None:
+        while self._pendientes:
+            lote = [self._pendientes.popleft() for _ in range(min(self.lote, len(self._pendientes)))]
+            try:
+                await _insertar(lote)
+            except Exception as e:
+                # MySQL no responde: el resto va al derrame sin esperar otro fallo por lote
+                lote.extend(self._pendientes)
+                self._pendientes.clear()
+                logger.warning("No se pudo escribir la auditoría (%s entradas al derrame): %s", len(lote), e)
+                self._proximo_reintento = time.monotonic() + self.reintento_seg
+                await self._derramar(lote)
+
+    # ─── Derrame ──────────────────────────────────────────────────────────────
+
+    def _en_curso(self) -> Path:
+        return self.derrame.with_name(self.derrame.name + ".reintento")
+
+    def _escribir_derrame(self, lineas: list[str]) -> int:
+        """Agrega ``lineas`` mientras quepan; devuelve cuántas no entraron."""
+        self.derrame.parent.mkdir(parents=True, exist_ok=True)
+        tamano = self.derrame.stat().st_size if self.derrame.exists() else 0
+        escritas = 0
+        with open(self.derrame, "a", encoding="utf-8") as f:
+            for linea in lineas:
+                tamano += len(linea.encode("utf-8"))
+                if tamano > self.derrame_max_bytes:
+                    break
+                f.write(linea)
+                escritas += 1
+        return len(lineas) - escritas
+
+    def _anexar_archivo(self, origen: Path) -> None:
+        # Sin tope: son entradas que ya estaban dentro del límite
+        with open(origen, encoding="utf-8") as entrada, open(self.derrame, "a", encoding="utf-8") as salida:
+            for linea in entrada:
+                salida.write(linea)
+        origen.unlink()
+
+    async def _derramar(self, entradas: list[Entrada]) -> None:
+        async with self._lock_derrame:
+            try:
+                perdidas = await asyncio.to_thread(self._escribir_derrame, [_a_linea(e) for e in entradas])
+            except OSError as e:
+                logger.error("No se pudo escribir el derrame de auditoría %s: %s", self.derrame, e)
+                perdidas = len(entradas)
+        if perdidas:
+            self._descartadas += perdidas
+            logger.error(
+                "Derrame de auditoría lleno: %s entradas descartadas (%s en total)",
+                perdidas, self._descartadas,
+            )
+
+    async def _reintentar_derrame(self) -> None:
+        en_curso = self._en_curso()
+        async with self._lock_derrame:
+            if not self.derrame.exists():
+                return
+            await asyncio.to_thread(os.replace, self.derrame, en_curso)
+
+        def leer_lotes():
+            with open(en_curso, encoding="utf-8") as f:
+                lote = []
+                for linea in f:
+                    if linea.strip():
+                        lote.append(_de_linea(linea))
+                    if len(lote) >= self.lote:
+                        yield lote
+                        lote = []
+                if lote:
+                    yield lote
+
+        escritas = 0
+        try:
+            for lote in leer_lotes():
+                await _insertar(lote)
+                escritas += len(lote)
+        except Exception as e:
+            logger.warning("El derrame de auditoría sigue pendiente: %s", e)
+            self._proximo_reintento = time.monotonic() + self.reintento_seg
+            # Se devuelve entero; ON DUPLICATE KEY salta lo que ya se escribió
+            async with self._lock_derrame:
+                await asyncio.to_thread(self._anexar_archivo, en_curso)
+            return
+        await asyncio.to_thread(en_curso.unlink)
+        logger.info("Derrame de auditoría recuperado: %s entradas", escritas)
+
+
+auditoria = ColaAuditoria(
+    lote=int(os.getenv("AUDIT_LOTE", "200")),
+    intervalo_ms=int(os.getenv("AUDIT_INTERVALO_MS", "500")),
+    max_pendientes=int(os.getenv("AUDIT_MAX_PENDIENTES", "10000")),
+    derrame=Path(os.getenv("AUDIT_DERRAME_FILE", "audit_derrame.jsonl")),
+    derrame_max_bytes=int(float(os.getenv("AUDIT_DERRAME_MAX_MB", "50")) * 1024 * 1024),
+    reintento_seg=float(os.getenv("AUDIT_REINTENTO_SEG", "30")),
+)
+
+
 async def log_action(
     user_id: str,
     accion: str,
@@ -10,18 +260,12 @@ async def log_action(
     detalle: str = None,
     ip: str = None
 ):
-    """Registra una acción en la tabla audit_log."""
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                """INSERT INTO audit_log
-                   (id, usuario_sistema_id, accion, modulo, entidad_id, detalle, ip)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s)""",
-                (str(uuid.uuid4()), user_id, accion, modulo, entidad_id, detalle, ip)
-            )
+    """Registra una acción en la tabla audit_log (encolada, no espera a MySQL)."""
+    await auditoria.registrar(
+        (str(uuid.uuid4()), user_id, accion, modulo, entidad_id, detalle, ip, time.time())
+    )
 
 async def log_request(request: Request, user_id: str, accion: str, modulo: str, entidad_id: str = None, detalle: str = None):
     """Versión que extrae automáticamente la IP del request."""
     client_ip = request.client.host if request.client else None
-    await log_action(user_id, accion, modulo, entidad_id, detalle, client_ip)
\ No newline at end of file
+    await log_action(user_id, accion, modulo, entidad_id, detalle, client_ip)
@@ -0,0 +1,157 @@
+"""
+Búsqueda de texto en listados: FULLTEXT (parser ngram) con respaldo a LIKE.
+
+``LIKE '%termino%'`` no puede usar índices y obliga a recorrer la tabla entera
+en cada tecla del buscador. Con los índices de ``migration_fulltext.sql`` la
+búsqueda se hace con ``MATCH ... AGAINST`` sobre un índice ngram, que también
+encuentra subcadenas (placas, seriales, partes de nombres).
+
+Modo (``SEARCH_MODE``):
+- ``auto`` (por defecto): usa FULLTEXT si el índice existe, si no LIKE.
+- ``fulltext`` / ``like``: fuerza uno de los dos.
+
+El respaldo a LIKE aplica también cuando el término es más corto que
+``NGRAM_TOKEN_SIZE`` (por defecto 2), que el índice ngram no puede resolver,
+y en MariaDB, que no tiene parser ngram (la migración falla y no hay índice).
+
+Un ``MATCH`` combinado con ``OR`` (con un LIKE o con otro ``MATCH`` de una
+tabla unida) impide que MySQL use el índice FULLTEXT. Cuando hay más de
+una condición, cada una va en su propia subconsulta que sí usa un índice y
+se combinan con ``UNION`` sobre el id de la tabla base. Las
+``columnas_like`` (clasificaciones) siguen usando ``LIKE '%...%'`` en su
+propia subconsulta, así el resultado es el mismo con o sin índice ngram y el
+``MATCH`` conserva su índice.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import NamedTuple
+
+from config.db import get_pool
+
+SEARCH_MODE = os.getenv("SEARCH_MODE", "auto").lower()
+NGRAM_TOKEN_SIZE = int(os.getenv("NGRAM_TOKEN_SIZE", "2"))
+
+
+class IndiceBusqueda(NamedTuple):
+    tabla: str                # tabla física que tiene el índice
+    nombre: str               # nombre del índice FULLTEXT
+    columnas: tuple[str, ...]  # columnas tal como van en el SQL (con alias si aplica)
+    # Columnas que siempre se comparan con LIKE: clasificaciones cortas que
+    # pueden ser ENUM y no admiten índice FULLTEXT
+    columnas_like: tuple[str, ...] = ()
+    # Columna de la tabla base que apunta al id de ``tabla`` ("id" si es la misma)
+    enlace: str = "id"
+
+
+_indices_disponibles: dict[tuple[str, str], bool] = {}
+
+
+async def _fulltext_disponible(indice: IndiceBusqueda) -> bool:
+    key = (indice.tabla, indice.nombre)
+    if key not in _indices_disponibles:
+        try:
+            pool = await get_pool()
+            async with pool.acquire() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        """SELECT 1 FROM information_schema.STATISTICS
+                           WHERE TABLE_SCHEMA = DATABASE()
+                             AND TABLE_NAME = %s AND INDEX_NAME = %s
+                             AND INDEX_TYPE = 'FULLTEXT'
+                           LIMIT 1""",
+                        [indice.tabla, indice.nombre],
+                    )
+                    _indices_disponibles[key] = (await cur.fetchone()) is not None
+        except Exception:
+            # Error pasajero: LIKE por esta vez, sin recordarlo
+            return False
+    return _indices_disponibles[key]
+
+
+def invalidar_indices() -> None:
+    """Olvida qué índices existen (llamar tras aplicar o revertir la migración)."""
+    _indices_disponibles.clear()
+
+
+def _termino_fulltext(busqueda: str) -> str | None:
+    # Dentro de una frase entre comillas los operadores de BOOLEAN MODE son
+    # literales; solo hay que quitar las comillas del propio usuario
+    limpio = " ".join(busqueda.replace('"', " ").split())
+    if len(limpio) < NGRAM_TOKEN_SIZE:
+        return None
+    # Con ngram, la frase equivale a buscar la subcadena
+    return f'"{limpio}"'
+
+
+def _columna(col: str) -> str:
+    return col.split(".")[-1]
+
+
+def _subconsultas_fulltext(
+    indice: IndiceBusqueda, base: str, termino: str, busqueda: str
+) -> list[tuple[str, list]]:
+    """Un SELECT de ids de ``base`` por condición, cada uno resuelto con un índice."""
+    if indice.enlace == "id" and indice.tabla == base:
+        origen, pref = indice.tabla, ""
+    else:
+        origen, pref = f"{base} b JOIN {indice.tabla} t ON t.id = b.{indice.enlace}", "t."
+    ids = "b.id" if pref else "id"
+    columnas = ", ".join(pref + _columna(c) for c in indice.columnas)
+    selects = [(f"SELECT {ids} FROM {origen} WHERE MATCH({columnas}) AGAINST (%s IN BOOLEAN MODE)", [termino])]
+    selects.extend(
+        (f"SELECT {ids} FROM {origen} WHERE {pref}{_columna(col)} LIKE %s", [f"%{busqueda}%"])
+        for col in indice.columnas_like
+    )
+    return selects
+
+
+async def condicion_busqueda(
+    busqueda: str, *indices: IndiceBusqueda, base: tuple[str, str] | None = None
+) -> tuple[str, list]:
+    """Devuelve ``(" AND (...)", params)`` para filtrar por ``busqueda``.
+
+    Con varios índices (p. ej. columnas de tablas unidas por JOIN) las
+    condiciones se combinan con OR, igual que el LIKE original. ``base`` es
+    ``(tabla, columna_id)`` de la consulta principal, p. ej.
+    ``("asignaciones", "a.id")``: con FULLTEXT permite armar el ``UNION``.
+    """
+    if not busqueda:
+        return "", []
+
+    termino_ft = _termino_fulltext(busqueda) if SEARCH_MODE != "like" else None
+    usar_ft = [
+        termino_ft is not None and (SEARCH_MODE == "fulltext" or await _fulltext_disponible(indice))
+        for indice in indices
+    ]
+
+    if all(usar_ft):
+        if len(indices) == 1 and not indices[0].columnas_like:
+            return f" AND MATCH({', '.join(indices[0].columnas)}) AGAINST (%s IN BOOLEAN MODE)", [termino_ft]
+        if base is not None:
+            selects = [
+                sub
+                for indice in indices
+                for sub in _subconsultas_fulltext(indice, base[0], termino_ft, busqueda)
+            ]
+            # La tabla derivada se materializa una vez; un IN directo sobre un
+            # UNION se evaluaría como subconsulta dependiente, fila por fila
+            return (
+                f" AND {base[1]} IN (SELECT id FROM ({' UNION '.join(sql for sql, _ in selects)}) busqueda)",
+                [p for _, ps in selects for p in ps],
+            )
+
+    # LIKE (sin índice) o mezcla de modos: condiciones en línea con OR
+    q = f"%{busqueda}%"
+    partes, params = [], []
+    for indice, ft in zip(indices, usar_ft):
+        if ft:
+            partes.append(f"MATCH({', '.join(indice.columnas)}) AGAINST (%s IN BOOLEAN MODE)")
+            params.append(termino_ft)
+            like = indice.columnas_like
+        else:
+            like = indice.columnas + indice.columnas_like
+        partes.extend(f"{col} LIKE %s" for col in like)
+        params.extend([q] * len(like))
+    return f" AND ({' OR '.join(partes)})", params
@@ -0,0 +1,139 @@
+"""
+Descargas de archivos con GET condicional y rangos (RFC 9110).
+
+- ``ETag`` fuerte = SHA-256 del contenido; ``If-None-Match`` que coincide
+  responde 304 sin leer el archivo.
+- ``Range: bytes=a-b`` (un solo rango) responde 206 con ``Content-Range``;
+  un rango fuera del archivo, 416. ``If-Range`` con otro ETag ignora el rango.
+- Archivo en disco sin rango: ``FileResponse`` (sendfile si el servidor lo
+  soporta). Con rango o contenido en la BD: ``StreamingResponse`` por trozos.
+
+Starlette 0.37 no trae soporte de Range en FileResponse, por eso se arma aquí.
+"""
+
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable
+from urllib.parse import quote
+
+import anyio
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+TROZO = 64 * 1024
+
+# Lee ``largo`` bytes desde ``inicio`` (contenido que no está en disco)
+LectorRango = Callable[[int, int], Awaitable[bytes]]
+
+_RANGO_RE = re.compile(r"^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$")
+
+
+def _etags(valor: str) -> list[str]:
+    return [e.strip().removeprefix("W/") for e in valor.split(",") if e.strip()]
+
+
+def no_modificado(request: Request, etag: str) -> bool:
+    valor = request.headers.get("if-none-match")
+    if not valor:
+        return False
+    # Comparación débil (RFC 9110 §13.1.2): W/"x" y "x" coinciden
+    return valor.strip() == "*" or etag.removeprefix("W/") in _etags(valor)
+
+
+def rango_solicitado(request: Request, etag: str, tamano: int) -> tuple[int, int] | None:
+    """``(inicio, fin)`` inclusivo, o ``None`` para enviar el archivo completo."""
+    valor = request.headers.get("range")
+    if not valor:
+        return None
+    if_range = request.headers.get("if-range")
+    # If-Range exige comparación fuerte: un ETag débil nunca valida el rango
+    if if_range and (if_range.strip() != etag or etag.startswith("W/")):
+        return None
+    m = _RANGO_RE.match(valor)
+    if not m or (not m.group(1) and not m.group(2)):
+        # Varios rangos o sintaxis no soportada: se puede ignorar y enviar todo
+        return None
+    if m.group(1):
+        inicio = int(m.group(1))
+        fin = min(int(m.group(2)), tamano - 1) if m.group(2) else tamano - 1
+    else:
+        sufijo = int(m.group(2))
+        inicio, fin = max(tamano - sufijo, 0), tamano - 1
+    if inicio >= tamano or inicio > fin:
+        raise HTTPException(
+            status_code=416,
+            detail="Rango no satisfacible.",
+            headers={"Content-Range": f"bytes */{tamano}"},
+        )
+    return inicio, fin
+
+
+def _content_disposition(filename: str) -> str:
+    codificado = quote(filename)
+    if codificado != filename:
+        return f"attachment; filename*=utf-8''{codificado}"
+    return f'attachment; filename="{filename}"'
+
+
+async def trozos_archivo(ruta: Path, inicio: int, largo: int) -> AsyncIterator[bytes]:
+    async with await anyio.open_file(ruta, "rb") as f:
+        await f.seek(inicio)
+        while largo > 0:
+            trozo = await f.read(min(TROZO, largo))
+            if not trozo:
+                break
+            largo -= len(trozo)
+            yield trozo
+
+
+async def trozos_lector(leer: LectorRango, inicio: int, largo: int, trozo: int) -> AsyncIterator[bytes]:
+    while largo > 0:
+        datos = await leer(inicio, min(trozo, largo))
+        if not datos:
+            break
+        inicio += len(datos)
+        largo -= len(datos)
+        yield datos
+
+
+def respuesta_archivo(
+    request: Request,
+    *,
+    tamano: int,
+    etag: str,
+    filename: str,
+    media_type: str,
+    ruta: Path | None = None,
+    leer: LectorRango | None = None,
+    trozo_lector: int = 1024 * 1024,
+    cache_control: str = "private, no-cache",
+) -> Response:
+    """Respuesta de descarga desde ``ruta`` (disco) o ``leer`` (p. ej. LONGBLOB por trozos)."""
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control,
+    }
+    if no_modificado(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    rango = rango_solicitado(request, etag, tamano)
+    if rango is None and ruta is not None:
+        return FileResponse(ruta, headers=headers, media_type=media_type, filename=filename)
+
+    inicio, fin = rango if rango else (0, tamano - 1)
+    largo = max(fin - inicio + 1, 0)
+    headers["Content-Length"] = str(largo)
+    headers["Content-Disposition"] = _content_disposition(filename)
+    if rango:
+        headers["Content-Range"] = f"bytes {inicio}-{fin}/{tamano}"
+    cuerpo = (
+        trozos_archivo(ruta, inicio, largo)
+        if ruta is not None
+        else trozos_lector(leer, inicio, largo, trozo_lector)
+    )
+    return StreamingResponse(
+        cuerpo, status_code=206 if rango else 200, media_type=media_type, headers=headers
+    )
@@ -0,0 +1,366 @@
+"""
+Carga masiva por lotes para ``POST /api/importar/{entidad}?bulk=true``.
+
+1. Las filas llegan como iterable (el archivo se lee en streaming) y se
+   validan a medida que pasan: campos obligatorios, conversiones de tipo y
+   claves repetidas dentro del mismo archivo.
+2. Las filas válidas se insertan en bloques de ``IMPORT_CHUNK_SIZE`` con
+   ``executemany`` dentro de una transacción explícita, sin releer cada fila.
+   En memoria solo vive el bloque actual (más las claves únicas ya vistas y
+   una muestra de a lo sumo ``IMPORT_MAX_ERRORES`` errores; del resto solo
+   se lleva la cuenta).
+3. Antes de insertar cada bloque, las placas (equipos) o correos (usuarios)
+   del bloque se resuelven contra la BD con una sola consulta ``IN``. Según
+   ``on_conflict`` las filas que ya existen se reportan como error sin
+   intentar el INSERT (``error``), se omiten (``skip``) o se actualizan en
+   lote con ``INSERT ... ON DUPLICATE KEY UPDATE`` sobre su id (``update``).
+4. Si aun así un bloque falla se repite fila a fila con SAVEPOINT: el error
+   queda en su fila y el resto del bloque se conserva.
+
+Todos los errores conservan el número de fila original del archivo; la
+fila que acompaña a cada error se recorta (``MAX_VALOR_ERROR`` caracteres por
+valor, ``MAX_CAMPOS_ERROR`` columnas).
+
+``antes_de_commit(cur, insertados, actualizados, errores)`` se ejecuta dentro de la misma
+transacción del bloque. ``importar_bulk`` lo usa para ``al_confirmar(cur,
+progreso, errores)``: los trabajos en segundo plano guardan ahí su avance
+(solo contadores) y agregan los errores nuevos del bloque, así lo persistido
+nunca se adelanta ni se atrasa a lo confirmado, se puede reanudar con
+``progreso`` desde la última fila confirmada y cada bloque escribe solo lo
+suyo, no la lista completa.
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+from typing import Awaitable, Callable, Iterable, Iterator
+
+from config.db import get_pool
+from models.accesorio import AccesorioModel
+from models.equipo import EquipoModel
+from models.suministro import SuministroModel
+from models.usuario import UsuarioModel
+from utils.search_index import search_index
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+IMPORT_MAX_ERRORES = int(os.getenv("IMPORT_MAX_ERRORES", "1000"))
+MAX_VALOR_ERROR = 200
+MAX_CAMPOS_ERROR = 40
+
+MODELOS = {
+    "equipos":     EquipoModel,
+    "usuarios":    UsuarioModel,
+    "suministros": SuministroModel,
+    "accesorios":  AccesorioModel,
+}
+
+# ── Campos requeridos por entidad ──────────────────────────────────────────────
+REQUIRED: dict[str, list[str]] = {
+    "equipos":     ["placa", "tipo_equipo", "criticidad", "confidencialidad"],
+    "usuarios":    ["nombre", "cargo", "proceso", "grupo_asignado", "area"],
+    "suministros": ["nombre", "tipo"],
+    "accesorios":  ["nombre"],
+}
+
+# Columna única por entidad (repetidas dentro del archivo = error de validación)
+CLAVES_UNICAS = {"equipos": "placa", "usuarios": "correo"}
+
+# Qué hacer con filas cuya clave única ya existe en la BD
+ON_CONFLICT = ("error", "skip", "update")
+
+# Conversiones numéricas por entidad
+_ENTEROS = {"suministros": ("cantidad", "cantidad_minima"), "accesorios": ("cantidad",)}
+_DECIMALES = {"suministros": ("costo",)}
+
+Fila = tuple[int, dict, dict]  # (número de fila, fila original, datos convertidos)
+AntesDeCommit = Callable[[object, list, list, list], Awaitable[None]]
+AlConfirmar = Callable[[object, dict, list], Awaitable[None]]
+DespuesDeBloque = Callable[[list], Awaitable[None]]
+
+
+def celda(v) -> str:
+    """Convierte cualquier valor de celda a str limpio."""
+    if v is None:
+        return ""
+    return str(v).strip()
+
+
+def convertir_fila(entidad: str, fila: dict) -> dict:
+    """Fila normalizada del archivo → dict listo para el modelo.
+
+    Lanza ValueError con un mensaje legible si algún valor no se puede convertir.
+    """
+    data = {k: (celda(v) if celda(v) != "" else None) for k, v in fila.items()}
+
+    if entidad == "equipos":
+        data["es_rentado"] = celda(fila.get("es_rentado", "0")).lower() in ("1", "true", "si", "sí")
+    elif entidad == "usuarios":
+        activo_raw = celda(data.get("activo") or "1").lower()
+        data["activo"] = activo_raw not in ("0", "false", "no")
+
+    for campo in _ENTEROS.get(entidad, ()):
+        if data.get(campo) is not None:
+            try:
+                data[campo] = int(float(data[campo]))
+            except ValueError:
+                raise ValueError(f"Valor numérico inválido en '{campo}': {data[campo]}")
+    for campo in _DECIMALES.get(entidad, ()):
+        if data.get(campo) is not None:
+            try:
+                data[campo] = float(data[campo])
+            except ValueError:
+                raise ValueError(f"Valor numérico inválido en '{campo}': {data[campo]}")
+    return data
+
+
+def mensaje_error(e: Exception) -> str:
+    msg = str(e)
+    if "Duplicate entry" in msg or "1062" in msg:
+        return "Registro duplicado (placa o correo ya existe)"
+    return msg
+
+
+def _error(num: int, fila: dict, mensaje: str) -> dict:
+    campos = {
+        k: (v[:MAX_VALOR_ERROR] if isinstance(v, str) else v)
+        for k, v in itertools.islice(fila.items(), MAX_CAMPOS_ERROR)
+    }
+    return {"fila": num, "campos": campos, "error": mensaje}
+
+
+def validar_fila(entidad: str, num: int, fila: dict, vistos: dict[str, int]) -> Fila | str | None:
+    """Valida una fila sin tocar la BD: devuelve la ``Fila``, el mensaje de
+    error o ``None`` si está vacía. ``vistos`` lleva las claves ya leídas."""
+    if all(celda(v) == "" for v in fila.values()):
+        return None
+    vacios = [c for c in REQUIRED[entidad] if not celda(fila.get(c, ""))]
+    if vacios:
+        return f"Campos obligatorios vacíos: {', '.join(vacios)}"
+    try:
+        data = convertir_fila(entidad, fila)
+    except ValueError as e:
+        return str(e)
+    clave = CLAVES_UNICAS.get(entidad)
+    if clave and data.get(clave):
+        k = data[clave].lower()
+        if k in vistos:
+            return f"{clave} repetido en el archivo (fila {vistos[k]})"
+        vistos[k] = num
+    return num, fila, data
+
+
+def validar_iter(entidad: str, filas: Iterable[tuple[int, dict]], errores: list[dict]) -> Iterator[Fila]:
+    """Valida fila a fila sin tocar la BD: produce las válidas y agrega los errores a ``errores``."""
+    vistos: dict[str, int] = {}
+    for num, fila in filas:
+        resultado = validar_fila(entidad, num, fila, vistos)
+        if isinstance(resultado, str):
+            errores.append(_error(num, fila, resultado))
+        elif resultado is not None:
+            yield resultado
+
+
+def validar(entidad: str, filas: Iterable[tuple[int, dict]]) -> tuple[list[Fila], list[dict]]:
+    """Valida todas las filas sin tocar la BD. Devuelve (válidas, errores)."""
+    errores: list[dict] = []
+    validas = list(validar_iter(entidad, filas, errores))
+    return validas, errores
+
+
+async def buscar_existentes(entidad: str, bloque: list[Fila]) -> dict[str, str]:
+    """Claves únicas del bloque que ya existen en la BD → id, con una sola consulta."""
+    clave = CLAVES_UNICAS.get(entidad)
+    if not clave:
+        return {}
+    valores = sorted({data[clave] for _, _, data in bloque if data.get(clave)})
+    if not valores:
+        return {}
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                f"SELECT id, {clave} FROM {entidad} WHERE {clave} IN ({', '.join(['%s'] * len(valores))})",
+                valores,
+            )
+            rows = await cur.fetchall()
+    return {r[clave].lower(): r["id"] for r in rows}
+
+
+def _columnas_archivo(fila: dict) -> set[str]:
+    return {k for k, v in fila.items() if celda(v) != ""}
+
+
+async def _fila_a_fila(
+    conn, cur, modelo, bloque: list[Fila], actualizar: list[tuple[Fila, str]],
+    antes_de_commit: AntesDeCommit | None = None,
+) -> tuple[list[tuple[Fila, str]], list[tuple[Fila, str]], list[dict]]:
+    insertados, actualizados, errores = [], [], []
+    await conn.begin()
+    try:
+        for (num, fila, data), existente in [(f, None) for f in bloque] + actualizar:
+            await cur.execute("SAVEPOINT fila_import")
+            try:
+                if existente:
+                    await modelo.upsert_many(cur, [(existente, data, _columnas_archivo(fila))])
+                else:
+                    [new_id] = await modelo.insert_many(cur, [data])
+            except Exception as e:
+                await cur.execute("ROLLBACK TO SAVEPOINT fila_import")
+                errores.append(_error(num, fila, mensaje_error(e)))
+                continue
+            if existente:
+                actualizados.append(((num, fila, data), existente))
+            else:
+                insertados.append(((num, fila, data), new_id))
+        if antes_de_commit:
+            await antes_de_commit(cur, insertados, actualizados, errores)
+        await conn.commit()
+    except Exception:
+        await conn.rollback()
+        raise
+    return insertados, actualizados, errores
+
+
+async def insertar_bloque(
+    entidad: str,
+    bloque: list[Fila],
+    *,
+    actualizar: list[tuple[Fila, str]] = (),
+    antes_de_commit: AntesDeCommit | None = None,
+) -> tuple[list[tuple[Fila, str]], list[tuple[Fila, str]], list[dict]]:
+    """Inserta ``bloque`` y actualiza ``actualizar`` ``[(fila, id existente)]`` en una transacción.
+
+    Devuelve ([(fila, id)] insertados, [(fila, id)] actualizados, errores).
+    """
+    modelo = MODELOS[entidad]
+    actualizar = list(actualizar)
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await conn.begin()
+            try:
+                ids = await modelo.insert_many(cur, [data for _, _, data in bloque]) if bloque else []
+                if actualizar:
+                    await modelo.upsert_many(cur, [
+                        (existente, data, _columnas_archivo(fila)) for (_, fila, data), existente in actualizar
+                    ])
+                insertados, actualizados, errores = list(zip(bloque, ids)), actualizar, []
+                if antes_de_commit:
+                    await antes_de_commit(cur, insertados, actualizados, errores)
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                insertados, actualizados, errores = await _fila_a_fila(
+                    conn, cur, modelo, bloque, actualizar, antes_de_commit
+                )
+
+    for (_, _, data), new_id in insertados:
+        search_index.actualizar(entidad, {**data, "id": new_id})
+    if actualizados:
+        # Las actualizaciones son parciales: se releen para el índice de búsqueda
+        filas = await modelo.find_by_ids([id for _, id in actualizados])
+        for row in filas.values():
+            search_index.actualizar(entidad, row)
+    return insertados, actualizados, errores
+
+
+async def importar_bulk(
+    entidad: str,
+    filas: Iterable[tuple[int, dict]],
+    *,
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    on_conflict: str = "error",
+    progreso: dict | None = None,
+    al_confirmar: AlConfirmar | None = None,
+    despues_de_bloque: DespuesDeBloque | None = None,
+    max_errores: int = IMPORT_MAX_ERRORES,
+) -> dict:
+    """Valida e inserta por bloques a medida que se leen las filas.
+
+    Devuelve el progreso final ``{fila, insertados, actualizados, omitidos,
+    n_errores, errores}`` (``fila`` es la última fila del archivo ya procesada;
+    ``errores`` es una muestra de los primeros ``max_errores`` y no forma parte
+    del progreso que recibe ``al_confirmar``). Con
+    ``progreso`` se reanuda: las filas hasta ``progreso["fila"]`` se validan
+    (para detectar repetidas) pero no se insertan ni se reportan otra vez. ``despues_de_bloque([(fila, id)])``
+    corre tras cada commit (p. ej. para adjuntar documentos).
+    """
+    if on_conflict not in ON_CONFLICT:
+        raise ValueError(f"on_conflict debe ser uno de: {', '.join(ON_CONFLICT)}")
+    chunk_size = max(1, chunk_size)
+    estado = {"fila": 0, "insertados": 0, "actualizados": 0, "omitidos": 0, "n_errores": 0, **(progreso or {})}
+    if "errores" in estado:
+        # Progreso guardado por versiones anteriores (lista completa de errores)
+        estado["n_errores"] = len(estado.pop("errores") or [])
+    muestra: list[dict] = []
+    clave = CLAVES_UNICAS.get(entidad)
+    desde = estado["fila"]
+    pendientes: list[dict] = []  # errores de validación aún no confirmados
+    ultima = desde
+
+    async def confirmar(bloque: list[Fila], corte: int) -> None:
+        nonlocal estado
+        previos = list(pendientes)
+        pendientes.clear()
+
+        # Pre-chequeo: una consulta IN por bloque en vez de un INSERT fallido por duplicado
+        existentes = await buscar_existentes(entidad, bloque) if bloque else {}
+        nuevos, actualizar, omitidos = [], [], 0
+        for f in bloque:
+            existente = existentes.get((f[2].get(clave) or "").lower()) if clave else None
+            if not existente:
+                nuevos.append(f)
+            elif on_conflict == "update":
+                actualizar.append((f, existente))
+            elif on_conflict == "skip":
+                omitidos += 1
+            else:
+                previos.append(_error(f[0], f[1], f"Registro duplicado: {clave} ya existe"))
+
+        def avance(ok: list, act: list, errs: list) -> dict:
+            return {
+                **estado,
+                "fila":         corte,
+                "insertados":   estado["insertados"] + len(ok),
+                "actualizados": estado["actualizados"] + len(act),
+                "omitidos":     estado["omitidos"] + omitidos,
+                "n_errores":    estado["n_errores"] + len(previos) + len(errs),
+            }
+
+        if nuevos or actualizar:
+            async def hook(cur, ok, act, errs):
+                await al_confirmar(cur, avance(ok, act, errs), previos + errs)
+            ok, act, errs = await insertar_bloque(
+                entidad, nuevos, actualizar=actualizar, antes_de_commit=hook if al_confirmar else None
+            )
+        else:
+            ok, act, errs = [], [], []
+            if al_confirmar:
+                await al_confirmar(None, avance(ok, act, errs), previos)
+        estado = avance(ok, act, errs)
+        if len(muestra) < max_errores:
+            muestra.extend((previos + errs)[: max_errores - len(muestra)])
+        if despues_de_bloque and ok:
+            await despues_de_bloque(ok)
+
+    bloque: list[Fila] = []
+    vistos: dict[str, int] = {}
+    for num, fila in filas:
+        ultima = max(ultima, num)
+        # Las filas ya importadas se validan solo para registrar sus claves
+        resultado = validar_fila(entidad, num, fila, vistos)
+        if num <= desde or resultado is None:
+            continue
+        if isinstance(resultado, str):
+            pendientes.append(_error(num, fila, resultado))
+        else:
+            bloque.append(resultado)
+        # También con muchos errores seguidos: la memoria queda acotada a un bloque
+        if len(bloque) >= chunk_size or len(pendientes) >= chunk_size:
+            await confirmar(bloque, num)
+            bloque = []
+    if bloque or pendientes or ultima > estado["fila"]:
+        await confirmar(bloque, ultima)
+
+    return {**estado, "errores": sorted(muestra, key=lambda e: e["fila"])}
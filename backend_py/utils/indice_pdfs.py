@@ -0,0 +1,101 @@
+"""
+Índice de los PDF de ``Doc/`` para el auto-adjunto de actas al importar equipos.
+
+Se recorre la carpeta una sola vez por importación. Después, cada fila se
+resuelve con búsquedas en diccionarios en lugar de dos ``rglob`` por fila:
+
+- ruta o nombre exacto (celdas que ya traen ``algo.pdf``),
+- placa: tokens del nombre y uniones de tokens consecutivos, así
+  "Acta EAC-0001 Juan.pdf" responde a la placa "EAC0001" o "EAC-0001",
+- nombre del usuario: el archivo que comparte más tokens con el nombre.
+
+Cada archivo se hashea (SHA-256) una sola vez; ``copias`` guarda a qué
+documento ya se subió cada contenido para no copiarlo de nuevo.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from collections import defaultdict
+from pathlib import Path
+
+from utils.search_index import normalizar
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Uniones de hasta N tokens consecutivos ("eac" + "0001" → "eac0001")
+_MAX_UNION = 4
+
+# Tokens del nombre de usuario más cortos que esto ("de", "la") no cuentan
+_MIN_TOKEN_USUARIO = 3
+
+
+def _tokens(texto: str) -> list[str]:
+    return _TOKEN_RE.findall(normalizar(texto))
+
+
+def _compacto(texto: str) -> str:
+    return "".join(_tokens(texto))
+
+
+class IndicePdfs:
+    def __init__(self, doc_dir: Path):
+        self.doc_dir = doc_dir
+        self._archivos: list[Path] = []
+        self._por_ruta: dict[str, Path] = {}
+        self._por_clave: dict[str, int] = {}           # placa / tokens unidos → archivo
+        self._por_token: dict[str, list[int]] = defaultdict(list)
+        self._hashes: dict[Path, str] = {}
+        # sha256 → (url, documento_id) del primer documento con ese contenido
+        self.copias: dict[str, tuple[str, str]] = {}
+
+        if not doc_dir.is_dir():
+            return
+        for i, path in enumerate(sorted(doc_dir.rglob("*.pdf"))):
+            self._archivos.append(path)
+            self._por_ruta.setdefault(path.relative_to(doc_dir).as_posix().lower(), path)
+            self._por_ruta.setdefault(path.name.lower(), path)
+            tokens = _tokens(path.stem)
+            for token in set(tokens):
+                self._por_token[token].append(i)
+            for n in range(1, _MAX_UNION + 1):
+                for j in range(len(tokens) - n + 1):
+                    self._por_clave.setdefault("".join(tokens[j:j + n]), i)
+
+    def __len__(self) -> int:
+        return len(self._archivos)
+
+    def buscar(self, fila: dict) -> Path | None:
+        for v in fila.values():
+            s = str(v or "").strip()
+            if s.lower().endswith(".pdf"):
+                path = self._por_ruta.get(s.replace("\\", "/").lower())
+                if path is not None:
+                    return path
+
+        placa = _compacto(fila.get("placa") or "")
+        if placa and placa in self._por_clave:
+            return self._archivos[self._por_clave[placa]]
+
+        usuario = fila.get("usuario_nombre") or fila.get("nombre") or ""
+        coincidencias: dict[int, int] = defaultdict(int)
+        for token in set(_tokens(usuario)):
+            if len(token) < _MIN_TOKEN_USUARIO:
+                continue
+            for i in self._por_token.get(token, ()):
+                coincidencias[i] += 1
+        if coincidencias:
+            # Más tokens en común primero; a igualdad, orden de la carpeta
+            mejor = min(coincidencias, key=lambda i: (-coincidencias[i], i))
+            return self._archivos[mejor]
+        return None
+
+    def sha256(self, path: Path) -> str:
+        if path not in self._hashes:
+            h = hashlib.sha256()
+            with path.open("rb") as f:
+                for bloque in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(bloque)
+            self._hashes[path] = h.hexdigest()
+        return self._hashes[path]
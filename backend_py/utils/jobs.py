@@ -0,0 +1,216 @@
+"""
+Cola de trabajos en segundo plano (en proceso, persistida en la tabla ``jobs``).
+
+- ``encolar(tipo, clave, payload)`` devuelve el id del trabajo de inmediato.
+- Las solicitudes pendientes con la misma ``(tipo, clave)`` se fusionan en un
+  solo trabajo: tres firmas seguidas sobre la misma asignación producen un
+  único render. ``JOBS_COALESCE_SECONDS`` es la ventana de espera antes de
+  ejecutar, para dar tiempo a que lleguen las solicitudes siguientes.
+- Una misma ``(tipo, clave)`` nunca corre dos veces a la vez, ni entre
+  procesos: si ya hay uno en proceso, el siguiente espera su turno.
+- Cada trabajo en proceso tiene un lease (``JOBS_LEASE_SECONDS``) que el
+  proceso renueva mientras lo ejecuta. Al arrancar y periódicamente se
+  reencolan los que quedaron sin terminar y cuyo lease venció (proceso
+  caído); los de otros procesos vivos no se tocan.
+- Cada tipo pertenece a un grupo con sus propios workers (``JOBS_WORKERS``
+  para ``general``, ``JOBS_WORKERS_IMPORTACION`` para importaciones), así
+  un trabajo largo no deja sin workers a los demás.
+- ``job_actual`` expone el id del trabajo en curso al handler (p. ej. para
+  guardar su progreso).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from contextvars import ContextVar
+from typing import Awaitable, Callable
+
+from models.job import NO_PENDIENTE, OCUPADO, JobModel
+
+logger = logging.getLogger("itam.jobs")
+
+Handler = Callable[[str, dict], Awaitable[dict | None]]
+
+job_actual: ContextVar[str | None] = ContextVar("job_actual", default=None)
+
+
+class JobQueue:
+    def __init__(self, *, grupos: dict[str, int], coalesce_seconds: float, lease_seconds: int):
+        self.grupos = {grupo: max(1, n) for grupo, n in grupos.items()}
+        self.coalesce_seconds = max(0.0, coalesce_seconds)
+        self.lease_seconds = max(5, lease_seconds)
+        # Identifica a este proceso en jobs.propietario
+        self.propietario = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._handlers: dict[str, Handler] = {}
+        self._grupo_de: dict[str, str] = {}
+        self._queues: dict[str, asyncio.Queue[tuple[str, str, str]]] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._lock = asyncio.Lock()
+
+    def registrar(self, tipo: str, handler: Handler, *, grupo: str = "general") -> None:
+        """Asocia un tipo de trabajo con la corrutina ``handler(clave, payload)``."""
+        if grupo not in self.grupos:
+            raise ValueError(f"Grupo de trabajos desconocido: {grupo}")
+        self._handlers[tipo] = handler
+        self._grupo_de[tipo] = grupo
+
+    # ─── Ciclo de vida ────────────────────────────────────────────────────────
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._queues = {grupo: asyncio.Queue() for grupo in self.grupos}
+        self._tasks = [
+            asyncio.create_task(self._worker(grupo, i))
+            for grupo, n in self.grupos.items()
+            for i in range(n)
+        ]
+        self._tasks.append(asyncio.create_task(self._vigilar_leases()))
+        try:
+            pendientes = await JobModel.recuperar_pendientes()
+        except Exception as e:
+            logger.error("No se pudieron recuperar los trabajos pendientes: %s", e)
+            pendientes = []
+        for job in pendientes:
+            self._put((job["id"], job["tipo"], job["clave"]))
+        if pendientes:
+            logger.info("Reencolados %s trabajos pendientes", len(pendientes))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queues = {}
+        try:
+            # Lo interrumpido queda disponible de inmediato, sin esperar al lease
+            await JobModel.soltar(self.propietario)
+        except Exception as e:
+            logger.error("No se pudieron liberar los trabajos en proceso: %s", e)
+
+    # ─── Encolado ─────────────────────────────────────────────────────────────
+
+    async def encolar(self, tipo: str, clave: str, payload: dict | None = None) -> str:
+        """Registra el trabajo (o se une a uno pendiente) y devuelve su id."""
+        if tipo not in self._handlers:
+            raise ValueError(f"Tipo de trabajo no registrado: {tipo}")
+        async with self._lock:
+            existente = await JobModel.find_pendiente(tipo, clave)
+            if existente:
+                # El trabajo aún no empezó: se ejecutará con los datos más recientes
+                await JobModel.update_payload(existente["id"], payload or {})
+                return existente["id"]
+            job_id = await JobModel.create(tipo, clave, payload)
+
+        if not self._queues:
+            # Sin lifespan (scripts): ejecutar en línea
+            await self._ejecutar(job_id, tipo, clave)
+        elif self.coalesce_seconds:
+            asyncio.get_running_loop().call_later(
+                self.coalesce_seconds, self._put, (job_id, tipo, clave)
+            )
+        else:
+            self._put((job_id, tipo, clave))
+        return job_id
+
+    async def reencolar(self, job_id: str, tipo: str, clave: str) -> None:
+        """Vuelve a poner en cola un trabajo ya existente (en estado 'pendiente')."""
+        if not self._queues:
+            await self._ejecutar(job_id, tipo, clave)
+        else:
+            self._put((job_id, tipo, clave))
+
+    def _put(self, item: tuple[str, str, str]) -> None:
+        queue = self._queues.get(self._grupo_de.get(item[1], "general"))
+        if queue is not None:
+            queue.put_nowait(item)
+
+    # ─── Ejecución ────────────────────────────────────────────────────────────
+
+    async def _worker(self, grupo: str, n: int) -> None:
+        queue = self._queues[grupo]
+        while True:
+            job_id, tipo, clave = await queue.get()
+            try:
+                await self._ejecutar(job_id, tipo, clave)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Worker %s-%s: error inesperado en trabajo %s: %s", grupo, n, job_id, e, exc_info=True)
+            finally:
+                queue.task_done()
+
+    async def _ejecutar(self, job_id: str, tipo: str, clave: str) -> None:
+        estado = await JobModel.reclamar(job_id, self.propietario, self.lease_seconds)
+        if estado == NO_PENDIENTE:
+            return  # ya lo tomó otro worker / proceso
+        if estado == OCUPADO:
+            # La misma clave está corriendo: se reintenta cuando probablemente terminó
+            if self._queues:
+                asyncio.get_running_loop().call_later(
+                    max(1.0, self.coalesce_seconds), self._put, (job_id, tipo, clave)
+                )
+            else:
+                logger.warning("Trabajo %s (%s %s) en espera: la clave está en proceso", job_id, tipo, clave)
+            return
+        job = await JobModel.find_by_id(job_id)
+        payload = (job or {}).get("payload") or {}
+        if not isinstance(payload, dict):
+            payload = {}
+        latido = asyncio.create_task(self._renovar_lease(job_id))
+        token = job_actual.set(job_id)
+        try:
+            resultado = await self._handlers[tipo](clave, payload)
+        except Exception as e:
+            logger.error("Trabajo %s (%s %s) falló: %s", job_id, tipo, clave, e)
+            await JobModel.finalizar(job_id, error=str(e) or e.__class__.__name__)
+            return
+        finally:
+            job_actual.reset(token)
+            latido.cancel()
+        await JobModel.finalizar(job_id, resultado=resultado or {})
+
+    # ─── Leases ───────────────────────────────────────────────────────────────
+
+    async def _renovar_lease(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not await JobModel.renovar_lease(job_id, self.propietario, self.lease_seconds):
+                    logger.warning("Trabajo %s: se perdió el lease (lo recuperó otro proceso)", job_id)
+                    return
+            except Exception as e:
+                logger.error("Trabajo %s: no se pudo renovar el lease: %s", job_id, e)
+
+    async def _vigilar_leases(self) -> None:
+        """Reencola los trabajos de procesos caídos mientras este sigue vivo."""
+        while True:
+            await asyncio.sleep(self.lease_seconds)
+            try:
+                liberados = await JobModel.liberar_vencidos()
+            except Exception as e:
+                logger.error("No se pudieron revisar los leases vencidos: %s", e)
+                continue
+            for job in liberados:
+                self._put((job["id"], job["tipo"], job["clave"]))
+            if liberados:
+                logger.info("Reencolados %s trabajos con lease vencido", len(liberados))
+
+
+job_queue = JobQueue(
+    grupos={
+        "general": int(os.getenv("JOBS_WORKERS", "2")),
+        "importacion": int(os.getenv("JOBS_WORKERS_IMPORTACION", "1")),
+    },
+    coalesce_seconds=float(os.getenv("JOBS_COALESCE_SECONDS", "2")),
+    lease_seconds=int(os.getenv("JOBS_LEASE_SECONDS", "60")),
+)
+
+
+async def encolar(tipo: str, clave: str, payload: dict | None = None) -> str:
+    """Atajo sobre la cola global."""
+    return await job_queue.encolar(tipo, clave, payload)
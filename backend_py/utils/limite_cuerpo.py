@@ -0,0 +1,89 @@
+"""
+Middleware ASGI que corta los cuerpos demasiado grandes antes de parsearlos.
+
+FastAPI lee y parsea todo el multipart antes de llamar al endpoint, así que
+un límite validado en el handler llega tarde: el archivo ya se recibió
+completo. Aquí se responde 413 en cuanto se sabe:
+
+- ``Content-Length`` mayor al límite: sin leer nada del cuerpo.
+- Cuerpo sin longitud (chunked) o que miente: al recibir el bloque que
+  cruza el límite se deja de leer y se reemplaza la respuesta por un 413.
+"""
+
+from __future__ import annotations
+
+from utils.serializer import dumps
+
+
+class _CuerpoExcedido(Exception):
+    pass
+
+
+class LimiteCuerpoMiddleware:
+    def __init__(self, app, *, limite: int, prefijos: tuple[str, ...], metodos: tuple[str, ...] = ("POST", "PUT")):
+        self.app = app
+        self.limite = limite
+        self.prefijos = prefijos
+        self.metodos = metodos
+
+    async def _responder_413(self, send) -> None:
+        cuerpo = dumps({"detail": f"El archivo excede el tamaño máximo de {self.limite // (1024 * 1024)} MB"})
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(cuerpo)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": cuerpo})
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in self.metodos
+            or not scope["path"].startswith(self.prefijos)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        longitud = dict(scope["headers"]).get(b"content-length")
+        if longitud and longitud.isdigit() and int(longitud) > self.limite:
+            await self._responder_413(send)
+            return
+
+        recibidos = 0
+        estado = {"excedido": False, "iniciada": False}
+
+        async def receive_limitado():
+            nonlocal recibidos
+            if estado["excedido"]:
+                raise _CuerpoExcedido()
+            mensaje = await receive()
+            if mensaje["type"] == "http.request":
+                recibidos += len(mensaje.get("body", b""))
+                if recibidos > self.limite:
+                    estado["excedido"] = True
+                    raise _CuerpoExcedido()
+            return mensaje
+
+        async def send_controlado(mensaje):
+            if estado["excedido"]:
+                # El parser convirtió el corte en otro error (400/500): se reemplaza por 413
+                if mensaje["type"] == "http.response.start" and not estado["iniciada"]:
+                    estado["iniciada"] = True
+                    await self._responder_413(send)
+                return
+            if mensaje["type"] == "http.response.start":
+                estado["iniciada"] = True
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive_limitado, send_controlado)
+        except Exception:
+            # _CuerpoExcedido o el error con que la app lo haya envuelto
+            if not estado["excedido"]:
+                raise
+            if not estado["iniciada"]:
+                await self._responder_413(send)
@@ -0,0 +1,63 @@
+"""
+Cargadores por lotes (estilo DataLoader) para evitar consultas N+1.
+
+Cada ``load(id)`` pedido durante la misma vuelta del event loop se acumula y se
+resuelve con una sola consulta ``WHERE id IN (...)``. Los resultados quedan
+cacheados en la instancia, así que un ``Loaders`` debe vivir solo lo que dura
+una petición o un proceso de enriquecimiento (no se comparte entre requests).
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable, Hashable, Iterable
+
+BatchFn = Callable[[list], Awaitable[dict]]
+
+
+class DataLoader:
+    def __init__(self, batch_fn: BatchFn):
+        self._batch_fn = batch_fn
+        self._cache: dict[Hashable, asyncio.Future] = {}
+        self._queue: list[Hashable] = []
+        self._scheduled = False
+
+    def load(self, key: Hashable) -> Awaitable[dict | None]:
+        if key in self._cache:
+            return self._cache[key]
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._cache[key] = future
+        self._queue.append(key)
+        if not self._scheduled:
+            self._scheduled = True
+            loop.call_soon(lambda: asyncio.ensure_future(self._dispatch()))
+        return future
+
+    async def load_many(self, keys: Iterable[Hashable]) -> list[dict | None]:
+        return list(await asyncio.gather(*(self.load(k) for k in keys)))
+
+    async def _dispatch(self) -> None:
+        keys, self._queue, self._scheduled = self._queue, [], False
+        try:
+            rows = await self._batch_fn(keys)
+        except Exception as e:
+            for k in keys:
+                if not self._cache[k].done():
+                    self._cache[k].set_exception(e)
+                self._cache.pop(k, None)
+            return
+        for k in keys:
+            if not self._cache[k].done():
+                self._cache[k].set_result(rows.get(k))
+
+
+class Loaders:
+    """Conjunto de cargadores de una petición."""
+
+    def __init__(self):
+        from models.equipo import EquipoModel
+        from models.usuario import UsuarioModel
+
+        self.usuarios = DataLoader(UsuarioModel.find_by_ids)
+        self.equipos = DataLoader(EquipoModel.find_by_ids)
@@ -0,0 +1,24 @@
+"""Cursores opacos para paginación por keyset (``WHERE (col, id) < (...)``)."""
+
+import base64
+import json
+from datetime import date, datetime
+
+
+def encode_cursor(*values) -> str:
+    """Serializa la clave de la última fila de la página como token URL-safe."""
+    plano = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values]
+    raw = json.dumps(plano, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """Inverso de encode_cursor. Lanza ValueError si el token no es válido."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as e:
+        raise ValueError("Cursor inválido.") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Cursor inválido.")
+    return values
@@ -0,0 +1,181 @@
+"""
+Servicio de renderizado de PDFs fuera del event loop.
+
+Las actas y hojas de vida son trabajo 100 % CPU (reportlab + pypdf + base64).
+Ejecutarlas dentro de un handler async bloquea al worker de uvicorn completo,
+así que se delegan a un ``ProcessPoolExecutor`` con:
+
+- cola acotada (``PDF_RENDER_MAX_QUEUE``): si se llena se rechaza el trabajo;
+  un trabajo ocupa su lugar hasta que el proceso termina, aunque el cliente
+  ya haya recibido el timeout,
+- timeout por trabajo (``PDF_RENDER_TIMEOUT`` en segundos),
+- métricas básicas del pool (ver ``PdfRenderer.metrics``).
+
+``PDF_RENDER_WORKERS=0`` desactiva el pool y ejecuta en un hilo (útil para
+depurar o en entornos donde no se pueden crear procesos).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+logger = logging.getLogger("itam.pdf_renderer")
+
+
+class RenderQueueFull(RuntimeError):
+    """La cola de renderizado alcanzó su límite."""
+
+
+class RenderTimeout(RuntimeError):
+    """El trabajo de renderizado superó el tiempo máximo permitido."""
+
+
+class PdfRenderer:
+    def __init__(self, *, workers: int, max_queue: int, timeout: float):
+        self.workers = max(0, workers)
+        self.max_queue = max(1, max_queue)
+        self.timeout = timeout
+        self._executor: Executor | None = None
+        self._pending = 0
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "timeouts": 0,
+            "rejected": 0,
+            "pool_restarts": 0,
+            "total_seconds": 0.0,
+            "max_seconds": 0.0,
+        }
+
+    # ─── Ciclo de vida ────────────────────────────────────────────────────────
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.workers == 0:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-render")
+                logger.info("Renderizado PDF en hilo (sin pool de procesos)")
+            else:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                logger.info("Pool de renderizado PDF iniciado (%s procesos)", self.workers)
+        return self._executor
+
+    def _submit(self, fn: Callable[..., bytes], args: tuple, kwargs: dict) -> Future:
+        try:
+            return self._get_executor().submit(_call, fn, args, kwargs)
+        except BrokenProcessPool:
+            self._restart()
+            return self._get_executor().submit(_call, fn, args, kwargs)
+
+    def _liberar(self) -> None:
+        self._pending -= 1
+
+    def start(self) -> None:
+        self._get_executor()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _restart(self) -> None:
+        logger.warning("Pool de renderizado PDF roto; se recrea")
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._stats["pool_restarts"] += 1
+
+    # ─── Ejecución ────────────────────────────────────────────────────────────
+
+    async def render(self, fn: Callable[..., bytes], *args: Any, timeout: float | None = None, **kwargs: Any) -> bytes:
+        """Ejecuta ``fn(*args, **kwargs)`` en el pool y devuelve sus bytes.
+
+        ``fn`` debe ser una función de módulo (picklable) y sus argumentos
+        también deben serlo: dicts/listas/str planos.
+        """
+        if self._pending >= self.max_queue:
+            self._stats["rejected"] += 1
+            raise RenderQueueFull(
+                f"Cola de renderizado llena ({self.max_queue} trabajos pendientes). Intenta de nuevo."
+            )
+
+        loop = asyncio.get_running_loop()
+        timeout = self.timeout if timeout is None else timeout
+        self._pending += 1
+        self._stats["submitted"] += 1
+        inicio = time.perf_counter()
+        try:
+            future = self._submit(fn, args, kwargs)
+        except BaseException:
+            self._pending -= 1
+            raise
+
+        def _terminado(_: Future) -> None:
+            # Corre en el hilo del executor: el contador se toca desde el loop
+            try:
+                loop.call_soon_threadsafe(self._liberar)
+            except RuntimeError:
+                pass  # loop ya cerrado (apagado)
+
+        # El lugar en la cola se libera cuando el trabajo termina de verdad,
+        # no cuando el cliente deja de esperar
+        future.add_done_callback(_terminado)
+        try:
+            try:
+                result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+            except asyncio.TimeoutError:
+                # El proceso sigue ocupado hasta terminar; solo se libera al cliente.
+                self._stats["timeouts"] += 1
+                raise RenderTimeout(f"El renderizado superó {timeout:.0f} s")
+            except BrokenProcessPool:
+                self._restart()
+                self._stats["failed"] += 1
+                raise
+            except Exception:
+                self._stats["failed"] += 1
+                raise
+            self._stats["completed"] += 1
+            return result
+        finally:
+            duracion = time.perf_counter() - inicio
+            self._stats["total_seconds"] += duracion
+            self._stats["max_seconds"] = max(self._stats["max_seconds"], duracion)
+
+    def metrics(self) -> dict:
+        terminados = self._stats["completed"] + self._stats["failed"] + self._stats["timeouts"]
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "timeout_seconds": self.timeout,
+            "pending": self._pending,
+            "submitted": self._stats["submitted"],
+            "completed": self._stats["completed"],
+            "failed": self._stats["failed"],
+            "timeouts": self._stats["timeouts"],
+            "rejected": self._stats["rejected"],
+            "pool_restarts": self._stats["pool_restarts"],
+            "avg_seconds": round(self._stats["total_seconds"] / terminados, 4) if terminados else 0.0,
+            "max_seconds": round(self._stats["max_seconds"], 4),
+        }
+
+
+def _call(fn: Callable[..., bytes], args: tuple, kwargs: dict) -> bytes:
+    return fn(*args, **kwargs)
+
+
+renderer = PdfRenderer(
+    workers=int(os.getenv("PDF_RENDER_WORKERS", "2")),
+    max_queue=int(os.getenv("PDF_RENDER_MAX_QUEUE", "16")),
+    timeout=float(os.getenv("PDF_RENDER_TIMEOUT", "30")),
+)
+
+
+async def render_pdf(fn: Callable[..., bytes], *args: Any, **kwargs: Any) -> bytes:
+    """Atajo sobre el renderer global."""
+    return await renderer.render(fn, *args, **kwargs)
@@ -0,0 +1,179 @@
+"""
+Snapshots de saldo por suministro (kárdex).
+
+``suministros_saldos_snapshot`` guarda el saldo de cierre de cada día con
+movimientos: ``saldo`` = suma de entradas − salidas hasta el final de
+``periodo``. Así el saldo en cualquier instante es
+
+    último snapshot anterior al día + movimientos de ese día hasta el instante
+
+sin recorrer todo el historial. Los snapshots se mantienen en la misma
+transacción que escribe los movimientos (``aplicar_efectos``): se crea la fila del
+día, si falta, a partir del cierre anterior y luego se desplaza el efecto a
+ese día y a los posteriores (normalmente solo el de hoy).
+
+``verificar_saldos`` recalcula los cierres desde ``movimientos_suministros``,
+informa las diferencias y, con ``reparar=True``, reconstruye la tabla.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime
+
+from config.db import get_pool
+
+EFECTO_SQL = "CASE WHEN tipo_movimiento = 'entrada' THEN cantidad ELSE -cantidad END"
+
+# Cierres diarios esperados, calculados desde los movimientos
+_SQL_CIERRES = f"""
+    SELECT suministro_id, periodo,
+           CAST(SUM(delta) OVER (PARTITION BY suministro_id ORDER BY periodo) AS SIGNED) AS saldo
+    FROM (
+        SELECT suministro_id, DATE(fecha) AS periodo, SUM({EFECTO_SQL}) AS delta
+        FROM movimientos_suministros
+        {{where}}
+        GROUP BY suministro_id, DATE(fecha)
+    ) d
+"""
+
+
+def efecto(tipo: str, cantidad: int) -> int:
+    return cantidad if tipo == "entrada" else -cantidad
+
+
+async def aplicar_efectos(cur, fecha, deltas: dict[str, int]) -> None:
+    """Suma a cada suministro su delta en el cierre del día de ``fecha`` (``None`` = hoy) y posteriores.
+
+    Dos sentencias para todo el lote. No hace commit: va en la transacción
+    de los movimientos que lo originan.
+    """
+    deltas = {sid: d for sid, d in deltas.items() if d}
+    if not deltas:
+        return
+    ids = list(deltas)
+    marcas = ", ".join(["%s"] * len(ids))
+    # MySQL permite INSERT ... SELECT sobre la misma tabla (usa una temporal)
+    await cur.execute(
+        f"""INSERT IGNORE INTO suministros_saldos_snapshot (suministro_id, periodo, saldo)
+            SELECT su.id, DATE(COALESCE(%s, NOW())), COALESCE((
+                SELECT s.saldo FROM suministros_saldos_snapshot s
+                WHERE s.suministro_id = su.id AND s.periodo < DATE(COALESCE(%s, NOW()))
+                ORDER BY s.periodo DESC LIMIT 1
+            ), 0)
+            FROM suministros su
+            WHERE su.id IN ({marcas})""",
+        [fecha, fecha, *ids],
+    )
+    caso = "CASE suministro_id " + "WHEN %s THEN %s " * len(ids) + "END"
+    await cur.execute(
+        f"""UPDATE suministros_saldos_snapshot SET saldo = saldo + {caso}
+            WHERE suministro_id IN ({marcas}) AND periodo >= DATE(COALESCE(%s, NOW()))""",
+        [x for sid in ids for x in (sid, deltas[sid])] + ids + [fecha],
+    )
+
+
+async def aplicar_efecto(cur, suministro_id: str, fecha, delta: int) -> None:
+    """``aplicar_efectos`` para un solo suministro."""
+    await aplicar_efectos(cur, fecha, {suministro_id: delta})
+
+
+async def saldo_al(cur, suministro_id: str, instante) -> int:
+    """Saldo del kárdex justo antes de ``instante`` (fecha u hora)."""
+    await cur.execute(
+        f"""SELECT
+               COALESCE((
+                   SELECT s.saldo FROM suministros_saldos_snapshot s
+                   WHERE s.suministro_id = %s AND s.periodo < DATE(%s)
+                   ORDER BY s.periodo DESC LIMIT 1
+               ), 0)
+               + COALESCE((
+                   SELECT SUM({EFECTO_SQL}) FROM movimientos_suministros
+                   WHERE suministro_id = %s AND fecha >= DATE(%s) AND fecha < %s
+               ), 0) AS saldo""",
+        (suministro_id, instante, suministro_id, instante, instante),
+    )
+    row = await cur.fetchone()
+    return int(row["saldo"] or 0) if row else 0
+
+
+def _fecha(valor) -> date:
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor)[:10])
+
+
+async def verificar_saldos(suministro_id: str | None = None, *, reparar: bool = False) -> dict:
+    """Compara los snapshots con los cierres recalculados desde los movimientos.
+
+    Devuelve ``{"revisados", "diferencias": [...], "reparado"}``. Cada
+    diferencia es ``{"suministro_id", "periodo", "esperado", "registrado"}``;
+    ``registrado`` es ``None`` si falta el snapshot de un día con movimientos.
+    Un snapshot de un día sin movimientos (p. ej. tras eliminar los de ese
+    día) es válido si coincide con el cierre anterior.
+    """
+    where, params = ("WHERE suministro_id = %s", [suministro_id]) if suministro_id else ("", [])
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(_SQL_CIERRES.format(where=where), params)
+            esperados = await cur.fetchall()
+            await cur.execute(
+                f"SELECT suministro_id, periodo, saldo FROM suministros_saldos_snapshot {where}", params
+            )
+            registrados = await cur.fetchall()
+
+            cierres: dict[str, tuple[list[date], list[int]]] = defaultdict(lambda: ([], []))
+            for row in sorted(esperados, key=lambda r: (r["suministro_id"], _fecha(r["periodo"]))):
+                periodos, saldos = cierres[row["suministro_id"]]
+                periodos.append(_fecha(row["periodo"]))
+                saldos.append(int(row["saldo"]))
+
+            diferencias = []
+            vistos = set()
+            for row in registrados:
+                periodo = _fecha(row["periodo"])
+                vistos.add((row["suministro_id"], periodo))
+                periodos, saldos = cierres.get(row["suministro_id"], ([], []))
+                i = bisect_right(periodos, periodo)
+                esperado = saldos[i - 1] if i else 0
+                if int(row["saldo"]) != esperado:
+                    diferencias.append({
+                        "suministro_id": row["suministro_id"],
+                        "periodo": periodo.isoformat(),
+                        "esperado": esperado,
+                        "registrado": int(row["saldo"]),
+                    })
+            for sid, (periodos, saldos) in cierres.items():
+                for periodo, saldo in zip(periodos, saldos):
+                    if (sid, periodo) not in vistos:
+                        diferencias.append({
+                            "suministro_id": sid,
+                            "periodo": periodo.isoformat(),
+                            "esperado": saldo,
+                            "registrado": None,
+                        })
+            diferencias.sort(key=lambda d: (d["suministro_id"], d["periodo"]))
+
+            if reparar and diferencias:
+                await conn.begin()
+                try:
+                    await cur.execute(f"DELETE FROM suministros_saldos_snapshot {where}", params)
+                    await cur.execute(
+                        "INSERT INTO suministros_saldos_snapshot (suministro_id, periodo, saldo) "
+                        + _SQL_CIERRES.format(where=where),
+                        params,
+                    )
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+
+    return {
+        "revisados": len(registrados),
+        "diferencias": diferencias,
+        "reparado": bool(reparar and diferencias),
+    }
@@ -0,0 +1,255 @@
+"""
+Índice invertido en memoria para la búsqueda global (``GET /api/search``).
+
+Cubre equipos, usuarios, accesorios, suministros, licencias y documentos:
+
+- cada campo indexado se normaliza (minúsculas, sin tildes) y se parte en
+  tokens; los postings guardan qué registros contienen cada token,
+- el vocabulario se mantiene ordenado, así que los tokens con un prefijo
+  dado se ubican con ``bisect`` ("EAC-00" encuentra "EAC-0012") sin
+  recorrer el vocabulario completo,
+- varias palabras se combinan con AND.
+
+Se construye al arrancar (``reconstruir``) y los modelos lo mantienen al día
+llamando ``actualizar`` / ``eliminar`` desde sus ``create``, ``update`` y
+``delete``. Las consultas no tocan MySQL.
+"""
+
+from __future__ import annotations
+
+import bisect
+import heapq
+import logging
+import re
+import time
+import unicodedata
+from typing import Iterable, Iterator
+
+from config.db import get_pool
+
+logger = logging.getLogger("itam.search_index")
+
+# tipo → tabla, campos indexados, campo título y campos del subtítulo
+ENTIDADES: dict[str, dict] = {
+    "equipos": {
+        "tabla": "equipos",
+        "campos": ("placa", "serial", "marca", "modelo", "tipo_equipo", "nombre_equipo"),
+        "titulo": "placa",
+        "subtitulo": ("tipo_equipo", "marca", "modelo"),
+    },
+    "usuarios": {
+        "tabla": "usuarios",
+        "campos": ("nombre", "correo", "cargo", "area"),
+        "titulo": "nombre",
+        "subtitulo": ("cargo", "area"),
+    },
+    "accesorios": {
+        "tabla": "accesorios",
+        "campos": ("nombre", "placa", "serial"),
+        "titulo": "nombre",
+        "subtitulo": ("placa", "serial"),
+    },
+    "suministros": {
+        "tabla": "suministros",
+        "campos": ("nombre", "referencia", "marca", "modelo"),
+        "titulo": "nombre",
+        "subtitulo": ("referencia", "marca"),
+    },
+    "licencias": {
+        "tabla": "licencias",
+        "campos": ("nombre", "marca", "modelo", "serial"),
+        "titulo": "nombre",
+        "subtitulo": ("marca", "modelo"),
+    },
+    "documentos": {
+        "tabla": "documentos",
+        "campos": ("nombre", "tipo"),
+        "titulo": "nombre",
+        "subtitulo": ("tipo",),
+    },
+}
+
+# Coincidencias que se ordenan por relevancia; con prefijos muy comunes
+# ("a", "eq") se corta aquí en lugar de recorrer todo el índice
+MAX_CANDIDATOS = 500
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalizar(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", str(texto))
+    return "".join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def tokenizar(texto) -> list[str]:
+    if texto is None or texto == "":
+        return []
+    partes = _TOKEN_RE.findall(normalizar(texto))
+    if len(partes) > 1:
+        # Identificadores como "EAC-0012" o "SN 44-A" también como una sola pieza
+        compacto = "".join(partes)
+        if len(compacto) <= 64:
+            partes.append(compacto)
+    return partes
+
+
+class SearchIndex:
+    def __init__(self):
+        self._docs: dict[tuple[str, str], dict] = {}
+        self._postings: dict[str, set[tuple[str, str]]] = {}
+        # Vocabulario ordenado: los tokens con un prefijo dado forman un rango
+        # contiguo que se ubica con bisect (O(log n), como bajar por un trie)
+        self._vocab: list[str] = []
+        self.listo = False
+        self.construido_en: float | None = None
+
+    # ─── Vocabulario ─────────────────────────────────────────────────────────
+
+    def _rango(self, prefijo: str) -> tuple[int, int]:
+        # "{" es el carácter siguiente a "z": cierra el rango de [a-z0-9]+
+        return (
+            bisect.bisect_left(self._vocab, prefijo),
+            bisect.bisect_left(self._vocab, prefijo + "{"),
+        )
+
+    def _estimar(self, prefijo: str) -> int:
+        """Cantidad aproximada de registros que coinciden con el prefijo."""
+        lo, hi = self._rango(prefijo)
+        muestra = self._vocab[lo:min(hi, lo + 32)]
+        return sum(len(self._postings[t]) for t in muestra) + max(0, hi - lo - 32)
+
+    # ─── Mantenimiento ───────────────────────────────────────────────────────
+
+    def actualizar(self, tipo: str, row: dict | None, *, _ordenar: bool = True) -> None:
+        """Indexa (o reindexa) un registro completo tal como lo devuelve el modelo."""
+        if not row or tipo not in ENTIDADES or not row.get("id"):
+            return
+        spec = ENTIDADES[tipo]
+        key = (tipo, str(row["id"]))
+        self.eliminar(tipo, key[1])
+
+        tokens: set[str] = set()
+        for campo in spec["campos"]:
+            tokens.update(tokenizar(row.get(campo)))
+        if not tokens:
+            return
+        titulo = str(row.get(spec["titulo"]) or "")
+        self._docs[key] = {
+            "tipo": tipo,
+            "id": key[1],
+            "titulo": titulo,
+            "subtitulo": " · ".join(str(row[c]) for c in spec["subtitulo"] if row.get(c)),
+            "_titulo": normalizar(titulo),
+            "_tokens": frozenset(tokens),
+        }
+        for token in tokens:
+            docs = self._postings.get(token)
+            if docs is None:
+                self._postings[token] = docs = set()
+                if _ordenar:
+                    bisect.insort(self._vocab, token)
+            docs.add(key)
+
+    def eliminar(self, tipo: str, id: str) -> None:
+        key = (tipo, str(id))
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        for token in doc["_tokens"]:
+            docs = self._postings.get(token)
+            if docs is None:
+                continue
+            docs.discard(key)
+            if not docs:
+                del self._postings[token]
+                i = bisect.bisect_left(self._vocab, token)
+                if i < len(self._vocab) and self._vocab[i] == token:
+                    del self._vocab[i]
+
+    async def reconstruir(self) -> None:
+        """Carga todas las entidades desde MySQL y reemplaza el índice."""
+        inicio = time.perf_counter()
+        nuevo = SearchIndex()
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                for tipo, spec in ENTIDADES.items():
+                    try:
+                        await cur.execute(f"SELECT * FROM {spec['tabla']}")
+                        for row in await cur.fetchall():
+                            nuevo.actualizar(tipo, row, _ordenar=False)
+                    except Exception as e:
+                        logger.warning("No se pudo indexar %s: %s", tipo, e)
+        self._docs, self._postings = nuevo._docs, nuevo._postings
+        self._vocab = sorted(nuevo._postings)
+        self.listo = True
+        self.construido_en = time.time()
+        logger.info(
+            "Índice de búsqueda construido: %s registros, %s tokens en %.2f s",
+            len(self._docs), len(self._postings), time.perf_counter() - inicio,
+        )
+
+    # ─── Consulta ────────────────────────────────────────────────────────────
+
+    def _candidatos(self, termino: str) -> Iterator[tuple[str, str]]:
+        """Registros con algún token que empieza por ``termino``; coincidencias exactas primero."""
+        lo, hi = self._rango(termino)
+        for i in range(lo, hi):
+            yield from self._postings[self._vocab[i]]
+
+    def buscar(self, q: str, *, tipos: Iterable[str] | None = None, limit: int = 20) -> list[dict]:
+        terminos = list(dict.fromkeys(_TOKEN_RE.findall(normalizar(q or ""))))
+        if not terminos:
+            return []
+        tipos = set(tipos) if tipos else None
+
+        # El término más selectivo genera candidatos; los demás solo filtran
+        terminos.sort(key=self._estimar)
+        guia, resto = terminos[0], terminos[1:]
+        vistos: set[tuple[str, str]] = set()
+        keys: list[tuple[str, str]] = []
+        for key in self._candidatos(guia):
+            if key in vistos or (tipos is not None and key[0] not in tipos):
+                continue
+            vistos.add(key)
+            tokens = self._docs[key]["_tokens"]
+            if all(any(t.startswith(r) for t in tokens) for r in resto):
+                keys.append(key)
+                if len(keys) >= MAX_CANDIDATOS:
+                    break
+
+        q_norm = " ".join(normalizar(q).split())
+        orden_tipos = {t: i for i, t in enumerate(ENTIDADES)}
+
+        def puntaje(key):
+            doc = self._docs[key]
+            exactos = sum(1 for t in terminos if t in doc["_tokens"])
+            titulo = doc["_titulo"]
+            return (
+                titulo != q_norm,
+                not titulo.startswith(q_norm),
+                -exactos,
+                orden_tipos[doc["tipo"]],
+                titulo,
+            )
+
+        resultados = heapq.nsmallest(limit, keys, key=puntaje)
+        return [
+            {k: v for k, v in self._docs[key].items() if not k.startswith("_")}
+            for key in resultados
+        ]
+
+    def stats(self) -> dict:
+        por_tipo: dict[str, int] = {t: 0 for t in ENTIDADES}
+        for tipo, _ in self._docs:
+            por_tipo[tipo] += 1
+        return {
+            "listo": self.listo,
+            "registros": len(self._docs),
+            "tokens": len(self._postings),
+            "por_tipo": por_tipo,
+            "construido_en": self.construido_en,
+        }
+
+
+search_index = SearchIndex()
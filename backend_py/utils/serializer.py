@@ -1,18 +1,62 @@
-"""Convierte tipos de Python no serializables (date, datetime, Decimal) a tipos JSON-safe."""
-from datetime import date, datetime
+"""Serialización JSON de las respuestas (date, datetime y Decimal incluidos)."""
+import json
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
+from typing import Any
+from uuid import UUID
 
+from fastapi.responses import JSONResponse
 
-def serialize(obj):
-    """Convierte recursivamente un dict/list con tipos MySQL a tipos serializables."""
-    if isinstance(obj, list):
-        return [serialize(item) for item in obj]
-    if isinstance(obj, dict):
-        return {k: serialize(v) for k, v in obj.items()}
-    if isinstance(obj, datetime):
-        return obj.isoformat()
-    if isinstance(obj, date):
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+
+def json_default(obj):
+    """``default=`` para json.dumps/orjson: tipos de MySQL sin copiar la estructura.
+
+    Conserva las conversiones que antes hacían serialize y jsonable_encoder
+    (TIME de MySQL llega como timedelta y se expone en segundos).
+    """
+    if isinstance(obj, (datetime, date, time)):
         return obj.isoformat()
     if isinstance(obj, Decimal):
         return float(obj)
-    return obj
+    if isinstance(obj, timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if isinstance(obj, UUID):
+        return str(obj)
+    raise TypeError(f"Tipo no serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    """Codifica en una sola pasada (orjson si está instalado, si no json estándar)."""
+    if orjson is not None:
+        # orjson maneja date/datetime de forma nativa; Decimal pasa por json_default
+        return orjson.dumps(obj, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        obj, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=json_default
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse que codifica con ``dumps`` (respuesta por defecto de la app)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def serialize(obj, status_code: int = 200) -> FastJSONResponse:
+    """Envuelve el contenido en una FastJSONResponse.
+
+    Ya no recorre ni copia la estructura: ``dumps`` convierte los tipos de
+    MySQL al codificar, y al devolver una Response FastAPI no vuelve a pasar
+    el contenido por ``jsonable_encoder``. Como la Response se devuelve tal
+    cual, los endpoints con ``status_code`` en el decorador deben pasarlo aquí.
+    """
+    return FastJSONResponse(obj, status_code=status_code)
@@ -0,0 +1,44 @@
+"""Utilidades SQL compartidas por los modelos."""
+
+from __future__ import annotations
+
+from collections import defaultdict
+
+
+async def insert_many(cur, tabla: str, filas: list[tuple[list[str], list]]) -> None:
+    """Inserta varias filas ``(columnas, valores)`` con ``executemany``.
+
+    Las filas se agrupan por conjunto de columnas (los modelos omiten las
+    opcionales vacías para que apliquen los DEFAULT de la tabla), así que cada
+    grupo viaja como un único INSERT multi-fila. No hace commit: la
+    transacción la controla quien abre ``cur``.
+    """
+    grupos: dict[tuple[str, ...], list[list]] = defaultdict(list)
+    for columnas, valores in filas:
+        grupos[tuple(columnas)].append(valores)
+    for columnas, valores in grupos.items():
+        placeholders = ", ".join(["%s"] * len(columnas))
+        await cur.executemany(
+            f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({placeholders})", valores
+        )
+
+
+async def upsert_many(cur, tabla: str, filas: list[tuple[list[str], list, list[str]]]) -> None:
+    """``INSERT ... ON DUPLICATE KEY UPDATE`` por lotes.
+
+    Cada fila es ``(columnas, valores, columnas_a_actualizar)``. Pensado para
+    filas cuyo ``id`` ya existe (resuelto antes con una consulta IN): el
+    INSERT choca con la PRIMARY KEY y solo se actualizan las columnas
+    indicadas, en un único statement multi-fila por grupo. No hace commit.
+    """
+    grupos: dict[tuple[tuple[str, ...], tuple[str, ...]], list[list]] = defaultdict(list)
+    for columnas, valores, actualizar in filas:
+        grupos[(tuple(columnas), tuple(actualizar))].append(valores)
+    for (columnas, actualizar), valores in grupos.items():
+        placeholders = ", ".join(["%s"] * len(columnas))
+        sets = ", ".join(f"{c} = VALUES({c})" for c in actualizar) or "id = id"
+        await cur.executemany(
+            f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({placeholders}) "
+            f"ON DUPLICATE KEY UPDATE {sets}",
+            valores,
+        )
@@ -0,0 +1,84 @@
+"""
+Respuestas NDJSON en streaming para listados grandes.
+
+Modo opcional: ``?stream=1`` o ``Accept: application/x-ndjson``. Las filas se
+leen con un cursor de servidor (``SSDictCursor``, sin buffer en el cliente) en
+lotes de ``STREAM_BATCH_SIZE`` y cada lote se serializa y se escribe apenas
+llega, así que la memoria no crece con el tamaño del resultado.
+
+Cada línea es un registro JSON; no hay envoltorio ``{"data": ...}`` ni totales.
+
+El cursor de servidor ocupa su conexión mientras dure el recorrido (y un
+cliente lento lo alarga), así que no se toma del pool: cada recorrido abre
+una conexión propia, con un máximo de ``STREAM_MAX_CONEXIONES`` a la vez.
+Las consultas que el consumidor haga entre lotes usan el pool sin competir
+con el cursor.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import AsyncIterator
+
+import aiomysql
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from config.db import conectar_dedicada
+from utils.serializer import dumps
+
+logger = logging.getLogger("itam.streaming")
+
+NDJSON = "application/x-ndjson"
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+STREAM_MAX_CONEXIONES = int(os.getenv("STREAM_MAX_CONEXIONES", "4"))
+# Segundos que MySQL espera a que el cliente lea (el cursor avanza al ritmo del cliente HTTP)
+STREAM_NET_WRITE_TIMEOUT = int(os.getenv("STREAM_NET_WRITE_TIMEOUT", "600"))
+
+_conexiones_stream = asyncio.Semaphore(max(1, STREAM_MAX_CONEXIONES))
+
+Lotes = AsyncIterator[list[dict]]
+
+
+def quiere_stream(request: Request, stream: bool = False) -> bool:
+    return stream or NDJSON in request.headers.get("accept", "")
+
+
+async def iter_lotes(sql: str, params: list | None = None, size: int = STREAM_BATCH_SIZE) -> Lotes:
+    """Ejecuta ``sql`` con cursor de servidor y entrega las filas por lotes.
+
+    Usa una conexión dedicada (fuera del pool) que se cierra al terminar. Si
+    el consumidor se detiene antes (cliente desconectado), se cierra sin
+    leer el resto del resultado.
+    """
+    async with _conexiones_stream:
+        conn = await conectar_dedicada()
+        try:
+            cur = await conn.cursor(aiomysql.SSDictCursor)
+            await cur.execute(f"SET SESSION net_write_timeout = {STREAM_NET_WRITE_TIMEOUT:d}")
+            await cur.execute(sql, params or [])
+            while True:
+                rows = await cur.fetchmany(size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            # Cerrar el cursor de servidor obligaría a leer todo lo pendiente
+            conn.close()
+
+
+def ndjson_response(lotes: Lotes) -> StreamingResponse:
+    """Convierte un iterador de lotes en una respuesta ``application/x-ndjson``."""
+
+    async def cuerpo():
+        try:
+            async for rows in lotes:
+                yield b"".join(dumps(row) + b"\n" for row in rows)
+        except Exception as e:
+            # Los encabezados ya se enviaron: solo queda registrar y cortar
+            logger.error("Error durante el streaming NDJSON: %s", e, exc_info=True)
+            raise
+
+    return StreamingResponse(cuerpo(), media_type=NDJSON)
@@ -0,0 +1,103 @@
+"""
+ZIP armado en streaming: cada entrada se escribe y se entrega apenas se lee.
+
+``zipfile`` escribe sobre un destino sin ``seek`` usando descriptores de
+datos (tamaño y CRC van después del contenido), así que el archivo nunca se
+arma completo: lo que produce cada bloque se entrega al cliente y se suelta.
+Solo queda en memoria el directorio central (un ``ZipInfo`` por entrada),
+que el formato exige escribir al final.
+
+Modos: ``deflate`` (por defecto) o ``store`` (sin compresión, para PDF e
+imágenes que ya vienen comprimidos y no ganan nada). Con ``deflate`` la
+compresión corre en un hilo para no bloquear el event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import zipfile
+from datetime import date, datetime
+from typing import AsyncIterator
+
+MODOS = {
+    "deflate": zipfile.ZIP_DEFLATED,
+    "store": zipfile.ZIP_STORED,
+}
+
+
+class _Salida:
+    """Destino sin ``seek``: acumula lo escrito hasta que se vacía."""
+
+    def __init__(self):
+        self._partes: list[bytes] = []
+        self._posicion = 0
+
+    def write(self, datos) -> int:
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self) -> int:
+        return self._posicion
+
+    def flush(self) -> None:
+        pass
+
+    def vaciar(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def _fecha_zip(fecha: date | datetime | None) -> tuple[int, int, int, int, int, int]:
+    if isinstance(fecha, datetime):
+        valor = fecha.timetuple()[:6]
+    elif isinstance(fecha, date):
+        valor = (fecha.year, fecha.month, fecha.day, 0, 0, 0)
+    else:
+        valor = time.localtime()[:6]
+    # El formato ZIP no representa fechas anteriores a 1980
+    return valor if valor[0] >= 1980 else (1980, 1, 1, 0, 0, 0)
+
+
+class ZipEnStreaming:
+    def __init__(self, modo: str = "deflate"):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de compresión desconocido: {modo!r}. Opciones: {', '.join(MODOS)}")
+        self._metodo = MODOS[modo]
+        self._salida = _Salida()
+        self._zip = zipfile.ZipFile(self._salida, "w", compression=self._metodo, allowZip64=True)
+
+    async def agregar(
+        self,
+        nombre: str,
+        trozos: AsyncIterator[bytes],
+        *,
+        tamano: int | None = None,
+        fecha: date | datetime | None = None,
+    ) -> AsyncIterator[bytes]:
+        """Escribe la entrada ``nombre`` y va entregando los bytes del ZIP."""
+        info = zipfile.ZipInfo(nombre, date_time=_fecha_zip(fecha))
+        info.compress_type = self._metodo
+        info.external_attr = 0o644 << 16
+        if tamano is not None:
+            info.file_size = tamano
+        # Sin tamaño conocido se reserva ZIP64 por si la entrada pasa de 4 GB
+        with self._zip.open(info, "w", force_zip64=tamano is None) as destino:
+            async for trozo in trozos:
+                if self._metodo == zipfile.ZIP_STORED:
+                    destino.write(trozo)
+                else:
+                    await asyncio.to_thread(destino.write, trozo)
+                datos = self._salida.vaciar()
+                if datos:
+                    yield datos
+        datos = self._salida.vaciar()
+        if datos:
+            yield datos
+
+    def cerrar(self) -> bytes:
+        """Escribe el directorio central y devuelve los últimos bytes."""
+        self._zip.close()
+        return self._salida.vaciar()
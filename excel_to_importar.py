@@ -23,11 +23,22 @@ Columnas EXACTAS del Excel (fila de encabezados):
   18: CANTIDAD                  → (referencia)
   19: PLACA                     → equipo.placa (Otro Dispositivo)
 
+La conversión es vectorizada: los cuatro bloques de equipo (BLOQUES) se
+"derriten" a formato largo con un DataFrame por bloque + concat, las
+observaciones se arman con operaciones de texto por columna y los usuarios
+repetidos (mismo nombre) se deduplican.
+
 Uso:
   pip install pandas openpyxl
   python excel_to_importar.py "ruta/al/inventario.xlsx"
+
+  # Sin CSV intermedios: directo al pipeline de carga masiva del backend
+  # (usa la BD configurada en backend_py/.env)
+  python excel_to_importar.py "ruta/al/inventario.xlsx" --importar [--on-conflict skip]
 """
 
+import argparse
+import asyncio
 import sys
 import re
 from pathlib import Path
@@ -53,6 +64,21 @@ def vc(cell):
     return "" if s.lower() in ("nan", "none", "") else s
 
 
+def norm_serie(s: pd.Series) -> pd.Series:
+    """norm() aplicado a una columna completa."""
+    return (
+        s.astype(str).str.strip().str.lower()
+        .str.replace(r"\s+", "_", regex=True)
+        .str.replace(r"[^a-z0-9_]", "", regex=True)
+    )
+
+
+def limpiar(s: pd.Series) -> pd.Series:
+    """vc() aplicado a una columna completa."""
+    s = s.astype(str).str.strip()
+    return s.mask(s.str.lower().isin(["nan", "none"]), "")
+
+
 # ─── Cabeceras de salida ──────────────────────────────────────────────────────
 
 EQUIPOS_HEADERS = [
@@ -68,6 +94,8 @@ USUARIOS_HEADERS = [
     "correo", "ubicacion", "sede", "activo",
 ]
 
+ACCESORIOS_HEADERS = ["nombre", "placa", "serial", "cantidad", "estado", "observaciones"]
+
 # Columnas globales: col_index → (destino, campo)
 # destino: "usuario" | "equipo" | "obs"
 # NOTA: col 0 = ITEM (numero de fila), el resto desplazado +1
@@ -112,37 +140,38 @@ HEADER_KEYWORDS = {
 }
 
 
-def es_fila_encabezado(row_cells: list) -> bool:
-    """Devuelve True si la fila parece un encabezado (contiene marcadores conocidos)."""
-    normed = [norm(str(c)) for c in row_cells]
-    raw    = [str(c).strip().lower() for c in row_cells]
-    for kw in HEADER_KEYWORDS:
-        kw_norm = norm(kw)
-        if kw_norm in normed or kw in raw:
-            return True
+_KW_NORM = sorted({norm(kw) for kw in HEADER_KEYWORDS})
+_KW_RE = "|".join(re.escape(kw) for kw in _KW_NORM)
+
+# Tipos por defecto de los bloques: sin placa no bastan para crear un accesorio
+_TIPOS_DEFAULT = {blk["tipo_default"] for blk in BLOQUES if blk["tipo_default"]}
+
+
+def filas_encabezado(df: pd.DataFrame) -> pd.Series:
+    """Por fila: True si parece un encabezado (contiene marcadores conocidos)."""
+    celdas = df.stack().dropna().astype(str)
+    raw = celdas.str.strip().str.lower()
+    normed = norm_serie(celdas)
+    hit = (
+        normed.isin(_KW_NORM)
+        | raw.isin(HEADER_KEYWORDS)
         # Búsqueda parcial
-        if any(kw_norm in n for n in normed if len(n) > 3):
-            return True
-    return False
+        | ((normed.str.len() > 3) & normed.str.contains(_KW_RE, regex=True))
+    )
+    return hit.groupby(level=0).any().reindex(df.index, fill_value=False)
 
 
 def leer_excel(path):
     df_raw = pd.read_excel(str(path), header=None, dtype=str).fillna("")
     header_row = None
 
-    for ri in range(min(15, len(df_raw))):
-        row_cells = df_raw.iloc[ri].tolist()
-        if es_fila_encabezado(row_cells):
-            header_row = ri
-            # Si la fila anterior TAMBIÉN es encabezado (grupos), preferir la más baja
-            # Seguir buscando hasta encontrar la última fila de encabezado consecutiva
-            while header_row + 1 < min(15, len(df_raw)):
-                next_cells = df_raw.iloc[header_row + 1].tolist()
-                if es_fila_encabezado(next_cells):
-                    header_row += 1
-                else:
-                    break
-            break
+    cabecera = filas_encabezado(df_raw.head(15))
+    marcadas = cabecera.to_numpy().nonzero()[0]
+    if len(marcadas):
+        header_row = int(marcadas[0])
+        # Si la fila siguiente TAMBIÉN es encabezado (grupos), preferir la más baja
+        while header_row + 1 < len(cabecera) and cabecera.iloc[header_row + 1]:
+            header_row += 1
 
     if header_row is None:
         print("Advertencia: no se detectaron filas de encabezado en las primeras 5 filas.")
@@ -161,93 +190,122 @@ def leer_excel(path):
 
 # ─── Procesamiento ────────────────────────────────────────────────────────────
 
+def convertir(data: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Filas del Excel → (usuarios, equipos, accesorios) sin recorrer fila a fila."""
+    vacia = pd.Series("", index=data.index)
+    limpias: dict[int, pd.Series] = {}
+
+    def col(ci):
+        # Solo se limpian las columnas que se usan, una vez cada una
+        if ci is None or ci >= len(data.columns):
+            return vacia
+        if ci not in limpias:
+            limpias[ci] = limpiar(data[ci])
+        return limpias[ci]
+
+    base = pd.DataFrame(
+        {campo: col(ci) for ci, (dest, campo) in GLOBAL_COLS.items() if dest in ("usuario", "equipo")},
+        index=data.index,
+    )
+
+    # Observaciones: "peso: x | sitio: y | lugar: z" solo con las partes no vacías
+    observaciones = vacia
+    for ci, (dest, campo) in GLOBAL_COLS.items():
+        if dest != "obs":
+            continue
+        parte = (campo + ": " + col(ci)).where(col(ci) != "", "")
+        separador = pd.Series(" | ", index=data.index).where((observaciones != "") & (parte != ""), "")
+        observaciones = observaciones + separador + parte
+
+    # Filtrar filas sin usuario o que son encabezados que se colaron como datos
+    nombre_norm = norm_serie(base["nombre"])
+    validas = ~nombre_norm.isin(["usuario_asignado", "nombre", "usuario", "item", ""]) & (base["nombre"] != "")
+    base = base[validas]
+
+    usuarios = base.reindex(columns=USUARIOS_HEADERS, fill_value="")
+    clave_usuario = usuarios["nombre"].str.lower().str.split().str.join(" ")
+    usuarios = usuarios[~clave_usuario.duplicated()].reset_index(drop=True)
+
+    compartido = base.reindex(columns=EQUIPOS_HEADERS, fill_value="")
+    compartido["observaciones"] = observaciones[validas]
+
+    # Bloques de equipo → formato largo: una fila por (fila del Excel, bloque)
+    largo = []
+    for n, blk in enumerate(BLOQUES):
+        tipo = col(blk["tipo_col"])
+        if blk["tipo_default"]:
+            tipo = tipo.mask(tipo == "", blk["tipo_default"])
+        largo.append(pd.DataFrame({
+            "bloque":   n,
+            "tipo":     tipo,
+            "placa":    col(blk["placa_col"]),
+            "forma":    col(blk["forma_col"]),
+            "pantalla": col(blk["pantalla_col"]),
+        }))
+    largo = pd.concat(largo).rename_axis("fila").reset_index()
+    largo = largo[largo["fila"].isin(base.index)].sort_values(["fila", "bloque"], kind="stable")
+
+    # Con placa → equipo
+    con_placa = largo[largo["placa"] != ""]
+    equipos = compartido.loc[con_placa["fila"]].reset_index(drop=True)
+    equipos["tipo_equipo"] = con_placa["tipo"].to_numpy()
+    equipos["placa"] = con_placa["placa"].to_numpy()
+    forma = pd.Series(con_placa["forma"].to_numpy())
+    equipos["modelo"] = equipos["modelo"].mask(forma != "", forma)
+    pantalla = pd.Series(con_placa["pantalla"].to_numpy())
+    con_pantalla = pantalla != ""
+    equipos.loc[con_pantalla, "observaciones"] = (
+        equipos["observaciones"] + " | pantalla: " + pantalla
+    )[con_pantalla].str.lstrip(" |")
+
+    # Sin placa pero con tipo real → accesorio (nombre = tipo_equipo)
+    sin_placa = largo[(largo["placa"] == "") & (largo["tipo"] != "") & ~largo["tipo"].isin(_TIPOS_DEFAULT)]
+    duenos = base.loc[sin_placa["fila"]]
+    accesorios = pd.DataFrame({
+        "nombre":        sin_placa["tipo"].to_numpy(),
+        "placa":         "",
+        "serial":        "",
+        "cantidad":      "1",
+        "estado":        "Disponible",
+        "observaciones": ("usuario: " + duenos["nombre"] + " | area: " + duenos["area"]).to_numpy(),
+    }, columns=ACCESORIOS_HEADERS)
+
+    return usuarios, equipos, accesorios
+
+
 def procesar(path):
-    data = leer_excel(path)
-    ncols = len(data.columns)
-    rows_u, rows_e, rows_a = [], [], []
+    return convertir(leer_excel(path))
 
-    for ri in range(len(data)):
-        row = data.iloc[ri]
-        if all(vc(row.iloc[i]) == "" for i in range(min(ncols, 20))):
-            continue
 
-        usr = {h: "" for h in USUARIOS_HEADERS}
-        shared = {h: "" for h in EQUIPOS_HEADERS}
-        obs = []
-
-        for ci, (dest, campo) in GLOBAL_COLS.items():
-            if ci >= ncols:
-                continue
-            val = vc(row.iloc[ci])
-            if not val:
-                continue
-            if dest == "usuario" and campo in usr:
-                usr[campo] = val
-            elif dest == "equipo" and campo in shared:
-                shared[campo] = val
-            elif dest == "obs":
-                obs.append(f"{campo}: {val}")
-
-        shared["observaciones"] = " | ".join(obs)
-
-        # Filtrar filas que son encabezados que se colaron como datos
-        nombre_norm = norm(usr["nombre"])
-        if nombre_norm in ("usuario_asignado", "nombre", "usuario", "item", ""):
-            continue
-        # Filtrar filas donde col 0 tiene solo un numero (es el ITEM, pero col 1 esta vacia)
-        if not usr["nombre"]:
-            continue
-        rows_u.append(dict(usr))
-
-        for blk in BLOQUES:
-            eq = dict(shared)
-
-            # tipo_equipo
-            tipo = ""
-            if blk["tipo_col"] is not None and blk["tipo_col"] < ncols:
-                tipo = vc(row.iloc[blk["tipo_col"]])
-            if not tipo and blk["tipo_default"]:
-                tipo = blk["tipo_default"]
-            eq["tipo_equipo"] = tipo
-
-            # placa
-            if blk["placa_col"] is not None and blk["placa_col"] < ncols:
-                eq["placa"] = vc(row.iloc[blk["placa_col"]])
-
-            # modelo (forma)
-            if blk["forma_col"] is not None and blk["forma_col"] < ncols:
-                forma = vc(row.iloc[blk["forma_col"]])
-                if forma:
-                    eq["modelo"] = forma
-
-            # pantalla → observaciones
-            if blk["pantalla_col"] is not None and blk["pantalla_col"] < ncols:
-                pant = vc(row.iloc[blk["pantalla_col"]])
-                if pant:
-                    eq["observaciones"] = (eq["observaciones"] + f" | pantalla: {pant}").lstrip(" | ")
-
-            # Agregar solo si tiene placa O tipo definido (no default genérico)
-            has_placa = bool(eq.get("placa"))
-            has_tipo = bool(tipo) and tipo not in ("Computador", "Otro Dispositivo")
-            if has_placa:
-                rows_e.append(eq)
-            elif has_tipo:
-                # Sin placa → va a accesorios (nombre = tipo_equipo)
-                rows_a.append({
-                    "nombre":       tipo,
-                    "placa":        "",
-                    "serial":       "",
-                    "cantidad":     "1",
-                    "estado":       "Disponible",
-                    "observaciones": f"usuario: {usr.get('nombre','')} | area: {usr.get('area','')}",
-                })
-
-    return rows_u, rows_e, rows_a
+# ─── Importación directa ──────────────────────────────────────────────────────
+
+def importar_directo(usuarios, equipos, accesorios, on_conflict="error"):
+    """Envía las filas al pipeline de carga masiva del backend, sin CSV intermedios."""
+    sys.path.insert(0, str(Path(__file__).resolve().parent / "backend_py"))
+    from config.db import close_pool
+    from utils.importacion import importar_bulk
+
+    async def run():
+        try:
+            for entidad, df in (("usuarios", usuarios), ("equipos", equipos), ("accesorios", accesorios)):
+                if df.empty:
+                    continue
+                # Mismos números de fila que tendría el CSV equivalente (fila 1 = cabecera)
+                filas = enumerate(df.to_dict("records"), start=2)
+                r = await importar_bulk(entidad, filas, on_conflict=on_conflict)
+                print(f"{entidad:<11}-> insertados={r['insertados']} actualizados={r['actualizados']} "
+                      f"omitidos={r['omitidos']} errores={len(r['errores'])}")
+                for e in r["errores"][:5]:
+                    print(f"   fila {e['fila']}: {e['error']}")
+        finally:
+            await close_pool()
+
+    asyncio.run(run())
 
 
 # ─── Main ─────────────────────────────────────────────────────────────────────
 
-def main(path_in):
+def main(path_in, importar=False, on_conflict="error"):
     p = Path(path_in)
     if not p.exists():
         for ext in (".xlsx", ".xls", ".xlsm"):
@@ -263,41 +321,51 @@ def main(path_in):
             return
 
     print(f"Procesando: {p.name}")
-    rows_u, rows_e, rows_a = procesar(p)
+    usuarios, equipos, accesorios = procesar(p)
     print()
     print()
 
-    if rows_u:
+    if importar:
+        importar_directo(usuarios, equipos, accesorios, on_conflict)
+        print("\nListo.")
+        return
+
+    if len(usuarios):
         out = p.with_name(p.stem + "_usuarios.csv")
-        pd.DataFrame(rows_u, columns=USUARIOS_HEADERS).to_csv(str(out), index=False, encoding="utf-8-sig")
-        print(f"Usuarios  -> {out.name}  ({len(rows_u)} filas)")
-        print(f"   Primeras filas: nombre='{rows_u[0]['nombre']}' | area='{rows_u[0]['area']}' | proceso='{rows_u[0]['proceso']}'")
-        if len(rows_u) > 1:
-            print(f"                  nombre='{rows_u[1]['nombre']}' | area='{rows_u[1]['area']}'")
+        usuarios.to_csv(str(out), index=False, encoding="utf-8-sig")
+        u = usuarios.to_dict("records")
+        print(f"Usuarios  -> {out.name}  ({len(u)} filas)")
+        print(f"   Primeras filas: nombre='{u[0]['nombre']}' | area='{u[0]['area']}' | proceso='{u[0]['proceso']}'")
+        if len(u) > 1:
+            print(f"                  nombre='{u[1]['nombre']}' | area='{u[1]['area']}'")
     else:
         print("Sin usuarios detectados (columna USUARIO ASIGNADO no encontrada o vacia).")
 
-    if rows_e:
+    if len(equipos):
         out = p.with_name(p.stem + "_equipos.csv")
-        pd.DataFrame(rows_e, columns=EQUIPOS_HEADERS).to_csv(str(out), index=False, encoding="utf-8-sig")
-        print(f"Equipos   -> {out.name}  ({len(rows_e)} filas)")
-        print(f"   Primeras filas: tipo='{rows_e[0]['tipo_equipo']}' | placa='{rows_e[0]['placa']}' | modelo='{rows_e[0]['modelo']}'")
-        if len(rows_e) > 1:
-            print(f"                  tipo='{rows_e[1]['tipo_equipo']}' | placa='{rows_e[1]['placa']}'")
+        equipos.to_csv(str(out), index=False, encoding="utf-8-sig")
+        e = equipos.head(2).to_dict("records")
+        print(f"Equipos   -> {out.name}  ({len(equipos)} filas)")
+        print(f"   Primeras filas: tipo='{e[0]['tipo_equipo']}' | placa='{e[0]['placa']}' | modelo='{e[0]['modelo']}'")
+        if len(e) > 1:
+            print(f"                  tipo='{e[1]['tipo_equipo']}' | placa='{e[1]['placa']}'")
     else:
         print("Sin equipos detectados.")
 
-    if rows_a:
-        ACCESORIOS_HEADERS = ["nombre","placa","serial","cantidad","estado","observaciones"]
+    if len(accesorios):
         out = p.with_name(p.stem + "_accesorios.csv")
-        pd.DataFrame(rows_a, columns=ACCESORIOS_HEADERS).to_csv(str(out), index=False, encoding="utf-8-sig")
-        print(f"Accesorios-> {out.name}  ({len(rows_a)} filas)  [sin placa, ej: ADAPTADOR RED]")
+        accesorios.to_csv(str(out), index=False, encoding="utf-8-sig")
+        print(f"Accesorios-> {out.name}  ({len(accesorios)} filas)  [sin placa, ej: ADAPTADOR RED]")
 
     print("\nListo. Sube los .csv desde el menu Importar CSV del sistema.")
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Uso: python excel_to_importar.py ruta/inventario.xlsx")
-    else:
-        main(sys.argv[1])
+    parser = argparse.ArgumentParser(description="Conversor de inventario Excel → CSVs del sistema ITAM")
+    parser.add_argument("archivo", help="ruta/inventario.xlsx")
+    parser.add_argument("--importar", action="store_true",
+                        help="cargar directo en la BD con el pipeline de carga masiva (sin CSV)")
+    parser.add_argument("--on-conflict", choices=("error", "skip", "update"), default="error",
+                        help="qué hacer con placas/correos que ya existen (solo con --importar)")
+    args = parser.parse_args()
+    main(args.archivo, args.importar, args.on_conflict)